@@ -12,4 +12,4 @@ import os
 import sys
 
 sys.path.append("../src")
-
+sys.path.append("../../RL_Learning/LLRFLibs/20250621/LLRFLibsPy")   # the llrflibs package
@@ -0,0 +1,75 @@
+###################################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+###################################################################################
+'''
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Benchmark the cold import time of the llrflibs modules. Each module is imported
+in a fresh Python interpreter several times (with the bytecode compiled), the 
+median of the total time and the time beyond importing numpy (needed by all 
+modules) are reported.
+
+Usage:
+    python bench_import.py [--repeat N] [--max-ms T] [modules ...]
+
+The exit status is 1 if the import time (beyond numpy) of any module exceeds
+the limit given by "--max-ms".
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+import os
+import sys
+import argparse
+import subprocess
+import numpy as np
+
+# code executed in the fresh interpreter
+_code = '''
+import time
+t0 = time.perf_counter()
+import numpy
+t1 = time.perf_counter()
+import {module}
+t2 = time.perf_counter()
+print(t2 - t0, t2 - t1)
+'''
+
+def bench_import(module, repeat = 5):
+    '''
+    Measure the cold import time of a module, return the median total time and
+    the median time beyond numpy in ms.
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'),
+                                         env.get('PYTHONPATH', '')])
+    env.pop('PYTHONDONTWRITEBYTECODE', None)    # measure with the compiled bytecode as installed
+
+    # the first run compiles the bytecode and is not counted
+    t = []
+    for _ in range(repeat + 1):
+        out = subprocess.run([sys.executable, '-c', _code.format(module = module)],
+                             env = env, capture_output = True, text = True, check = True)
+        t.append([float(v) for v in out.stdout.split()])
+    return np.median(np.array(t[1:]) * 1e3, axis = 0)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Cold import time of llrflibs modules')
+    parser.add_argument('modules', nargs = '*',
+                        default = ['llrflibs', 'llrflibs.rf_sim', 'llrflibs.rf_control',
+                                   'llrflibs.rf_det_act', 'llrflibs.rf_noise', 'llrflibs.rf_calib',
+                                   'llrflibs.rf_sysid', 'llrflibs.rf_fit', 'llrflibs.rf_misc',
+                                   'llrflibs.rf_archive', 'llrflibs.rf_pipeline'])
+    parser.add_argument('--repeat', type = int,   default = 5,     help = 'number of fresh interpreters per module')
+    parser.add_argument('--max-ms', type = float, default = 100.0, help = 'limit of the import time beyond numpy, ms')
+    args = parser.parse_args()
+
+    t_np = bench_import('numpy', args.repeat)[0]
+    print('{:24s} {:>10s} {:>14s}'.format('module', 'total (ms)', 'w/o numpy (ms)'))
+    print('{:24s} {:10.1f} {:>14s}'.format('numpy', t_np, '-'))
+    failed = False
+    for module in args.modules:
+        t_tot, t_mod = bench_import(module, args.repeat)
+        flag   = '' if t_mod <= args.max_ms else '  > {:.0f} ms'.format(args.max_ms)
+        failed = failed or (t_mod > args.max_ms)
+        print('{:24s} {:10.1f} {:14.1f}{}'.format(module, t_tot, t_mod, flag))
+    sys.exit(1 if failed else 0)
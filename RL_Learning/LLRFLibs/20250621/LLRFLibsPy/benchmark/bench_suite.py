@@ -0,0 +1,600 @@
+###################################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+###################################################################################
+'''
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Benchmark the hot paths of the llrflibs modules with realistic data sizes
+(pulses of 1-16k samples, 16 channels, 10^6-sample noise series). The
+pipeline cases run in the calling process (n_proc = 1), so that the results
+do not depend on the number of CPU cores.
+
+Each case prepares its data once and returns the function to be timed. The
+function is called in loops lasting at least "--min-time" seconds, repeated
+"--repeat" times; the median, minimum and interquartile range of the time per
+call are recorded. The results are written to a JSON file and optionally
+compared with a baseline file (e.g., the results of the last release):
+
+    python bench_suite.py --out results.json --baseline baseline.json
+
+A case is reported as regression if its median time exceeds the baseline by
+more than "--tol" (relative), the exit status is then 1. The baseline is only
+meaningful on the same machine, regenerate it with "--out baseline.json".
+
+Usage:
+    python bench_suite.py [--filter REGEX] [--list] [--repeat N] [--min-time T]
+                          [--out FILE] [--baseline FILE] [--tol TOL]
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+import os
+import re
+import gc
+import atexit
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from llrflibs.rf_sim import *
+from llrflibs.rf_control import *
+from llrflibs.rf_det_act import *
+from llrflibs.rf_noise import *
+from llrflibs.rf_sysid import *
+from llrflibs.rf_calib import *
+from llrflibs.rf_fit import *
+from llrflibs.rf_pipeline import *
+from llrflibs.rf_archive import *
+
+# common parameters of the cavity
+_fs    = 1e6                        # sampling frequency, Hz
+_Ts    = 1.0 / _fs                  # sampling time, s
+_f0    = 1.3e9                      # RF frequency, Hz
+_QL    = 3e6                        # loaded quality factor
+_wh    = np.pi * _f0 / _QL          # half-bandwidth, rad/s
+_dw    = 0.5 * _wh                  # detuning, rad/s
+_npul  = 2048                       # samples per pulse
+_nch   = 16                         # number of channels (cavities)
+_nnois = 1000000                    # samples of noise series
+_tmp_dir = None                     # temporary directory of the archive cases
+
+# ---------------------------------------------------------
+# data generation
+# ---------------------------------------------------------
+def _rng():
+    return np.random.default_rng(2023)
+
+def _cav_model():
+    '''
+    Discrete cavity model with a passband mode, used by the simulation cases.
+    '''
+    pb_modes = {'freq_offs': [-800e3], 'gain_rel': [-1], 'half_bw': [2*np.pi*216*0.5]}
+    _, Arf, Brf, Crf, Drf, Abm, Bbm, Cbm, Dbm = cav_ss(_wh, detuning = _dw, passband_modes = pb_modes)
+    _, Arfd, Brfd, Crfd, Drfd, _ = ss_discrete(Arf, Brf, Crf, Drf, _Ts, method = 'zoh')
+    _, Abmd, Bbmd, Cbmd, Dbmd, _ = ss_discrete(Abm, Bbm, Cbm, Dbm, _Ts, method = 'bilinear')
+    return (Arf, Brf, Crf, Drf, Abm, Bbm, Cbm, Dbm), (Arfd, Brfd, Crfd, Drfd, Abmd, Bbmd, Cbmd, Dbmd)
+
+def _pulses(n_ch = _nch, n = _npul, noise = 1e-3):
+    '''
+    Cavity probe/forward/reflected waveforms of n_ch cavities (filling, flattop
+    and decay, constant half-bandwidth and detuning) with measurement noise.
+    '''
+    rng = _rng()
+    t_fill, t_flat = n // 4, n // 2
+    _, vc_sp, vf, vb, T = cav_sp_ff(_wh, t_fill, t_flat, _Ts, vc0 = 1.0, detuning = _dw, pno = n)
+    vf = np.where(np.arange(n) < t_fill + t_flat, vf, 0.0)
+    vc = np.zeros(n, dtype = complex)
+    a  = np.exp((-_wh + 1j*_dw) * _Ts)
+    for i in range(1, n):
+        vc[i] = a * vc[i-1] + (1 - a) * vf[i-1]
+    vr = vc - vf
+    nz = lambda: noise * (rng.standard_normal((n_ch, n)) + 1j * rng.standard_normal((n_ch, n)))
+    return vc + nz(), vf * 0.9 * np.exp(0.1j) + nz(), vr * 1.1 + nz(), t_fill, t_fill + t_flat
+
+def _raw_pulses(n_pul = 1, n = 16384, n_ch = _nch):
+    '''
+    Raw ADC waveforms (pulses x channels x samples) of RF pulses at the non-I/Q
+    IF (3 cycles in 14 samples) with noise.
+    '''
+    k   = np.arange(n)
+    env = np.where((k > n // 8) & (k < 7 * n // 8), 1.0, 0.0)
+    raw = env * np.cos(2*np.pi*3/14*k + 0.3)
+    return raw + 1e-3 * _rng().standard_normal((n_pul, n_ch, n))
+
+def _tmp_path(name):
+    '''
+    Path in a temporary directory removed when Python exits.
+    '''
+    global _tmp_dir
+    if _tmp_dir is None:
+        _tmp_dir = tempfile.mkdtemp(prefix = 'llrflibs_bench_')
+        atexit.register(shutil.rmtree, _tmp_dir, ignore_errors = True)
+    return os.path.join(_tmp_dir, name)
+
+# ---------------------------------------------------------
+# benchmark cases: each returns the function to time and the parameters
+# ---------------------------------------------------------
+def case_sim_cav_model():
+    def run():
+        _cav_model()
+    return run, {}
+
+def case_sim_ncav_pulse():
+    (Arf, Brf, Crf, Drf, Abm, Bbm, Cbm, Dbm), _ = _cav_model()
+    vf = np.ones(_npul, dtype = complex)
+    vb = np.zeros(_npul, dtype = complex)
+    def run():
+        sim_ncav_pulse(Arf, Brf, Crf, Drf, vf, _Ts, Abmc = Abm, Bbmc = Bbm, Cbmc = Cbm, Dbmc = Dbm, vb = vb)
+    return run, {'n': _npul}
+
+def case_sim_ncav_step():
+    _, (Arfd, Brfd, Crfd, Drfd, Abmd, Bbmd, Cbmd, Dbmd) = _cav_model()
+    def run():
+        state_rf = np.matrix(np.zeros(Brfd.shape), dtype = complex)
+        state_bm = np.matrix(np.zeros(Bbmd.shape), dtype = complex)
+        for i in range(_npul):
+            _, vc, _, state_rf, state_bm = sim_ncav_step(Arfd, Brfd, Crfd, Drfd, 1.0, state_rf,
+                                                         Abmd = Abmd, Bbmd = Bbmd, Cbmd = Cbmd, Dbmd = Dbmd,
+                                                         vb_step = 0.0, state_bm0 = state_bm)
+    return run, {'n_step': _npul}
+
+def case_sim_scav_step():
+    def run():
+        vc, dw = 0.0, 0.0
+        for i in range(_npul):
+            _, vc, _, dw, _ = sim_scav_step(_wh, dw, _dw, 1.0, 0.0, vc, _Ts)
+    return run, {'n_step': _npul}
+
+def case_loop_closed():
+    _, (Arfd, Brfd, Crfd, Drfd, Abmd, Bbmd, Cbmd, Dbmd) = _cav_model()
+    _, Akc, Bkc, Ckc, Dkc     = basic_rf_controller(30, 1e5, notch_conf = {'freq_offs': [5e3],
+                                                                           'gain':      [1000],
+                                                                           'half_bw':   [2*np.pi*20]})
+    _, Akd, Bkd, Ckd, Dkd, _  = ss_discrete(Akc, Bkc, Ckc, Dkc, _Ts, method = 'bilinear')
+    _, fbank                  = design_filter_bank(_fs, notches = [(200e3, 4)])
+    _, vc_sp, vf_ff, _, _     = cav_sp_ff(_wh, 510, 800, _Ts, vc0 = 1.0, detuning = 0, pno = _npul)
+    def run():
+        state_rf = np.matrix(np.zeros(Brfd.shape), dtype = complex)
+        state_bm = np.matrix(np.zeros(Bbmd.shape), dtype = complex)
+        state_k  = np.matrix(np.zeros(Bkd.shape),  dtype = complex)
+        state_f  = None
+        vf_all   = 0.0
+        for i in range(_npul):
+            _, vc, _, state_rf, state_bm = sim_ncav_step(Arfd, Brfd, Crfd, Drfd, vf_all, state_rf,
+                                                         Abmd = Abmd, Bbmd = Bbmd, Cbmd = Cbmd, Dbmd = Dbmd,
+                                                         vb_step = 0.0, state_bm0 = state_bm)
+            _, vc_f, state_f     = filt_bank_step(fbank, vc, state_f)
+            _, vf_all, _, state_k = control_step(Akd, Bkd, Ckd, Dkd, vc_sp[i] - vc_f, state_k, ff_step = vf_ff[i])
+    return run, {'n_step': _npul}
+
+def case_demod_noniq():
+    raw = _rng().standard_normal((_nch, 10000))
+    def run():
+        noniq_demod_stream(raw, 14, 3)              # all channels at once
+    return run, {'n_ch': _nch, 'n': 10000}
+
+def case_demod_twop():
+    raw = _rng().standard_normal((_nch, 10000))
+    def run():
+        twop_demod_stream(raw, 25e6, 100e6)         # all channels at once
+    return run, {'n_ch': _nch, 'n': 10000}
+
+def case_demod_asyn():
+    n   = 10000
+    ref = np.cos(2*np.pi*0.123*np.arange(n))
+    raw = _rng().standard_normal((_nch, n)) + ref
+    def run():
+        for ch in raw:
+            asyn_demod(ch, ref)
+    return run, {'n_ch': _nch, 'n': n}
+
+def case_demod_pulse_info():
+    vc = np.abs(_pulses()[0])
+    def run():
+        for ch in vc:
+            pulse_info(ch)
+    return run, {'n_ch': _nch, 'n': _npul}
+
+def case_noise_calc_psd():
+    data = _rng().standard_normal(_nnois)
+    def run():
+        calc_psd(data, _fs)
+    return run, {'n': _nnois}
+
+def case_noise_calc_psd_coherent():
+    data = _rng().standard_normal(_nnois)
+    def run():
+        calc_psd_coherent(data, _fs)
+    return run, {'n': _nnois}
+
+def case_noise_gen_from_psd():
+    freq = np.array([10.0, 1e2, 1e3, 1e4, 1e5, 5e5])
+    pn   = np.array([-80.0, -100, -120, -130, -140, -150])
+    def run():
+        gen_noise_from_psd(freq, pn, _fs, _nnois, seed = 1)
+    return run, {'n': _nnois}
+
+def case_noise_psd_accum():
+    data = _rng().standard_normal(_nnois)
+    def run():
+        state = None
+        for chunk in np.array_split(data, 16):
+            _, state = psd_accum(chunk, _fs, 2**14, state = state)
+        psd_accum_result(state)
+    return run, {'n': _nnois, 'nfft': 2**14, 'n_chunk': 16}
+
+def case_noise_gen_from_psd_stream():
+    freq = np.array([10.0, 1e2, 1e3, 1e4, 1e5, 5e5])
+    pn   = np.array([-80.0, -100, -120, -130, -140, -150])
+    _, _, state = gen_noise_from_psd_stream(freq, pn, _fs, 2**16, n_real = 4, seed = 1)
+    def run():
+        gen_noise_from_psd_stream(freq, pn, _fs, 2**16, state = state)
+    return run, {'n': 2**16, 'n_real': 4}
+
+def case_noise_filt_bank():
+    _, fbank = design_filter_bank(_fs, notches = [(50e3, 10), (200e3, 4)], lowpass = [(300e3, 2)])
+    data     = _rng().standard_normal((_nch, 10000))
+    def run():
+        filt_bank(fbank, data)
+    return run, {'n_ch': _nch, 'n': 10000}
+
+def case_sysid_prbs():
+    def run():
+        prbs(_nnois)
+    return run, {'n': _nnois}
+
+def case_sysid_prbs_seq():
+    def run():
+        prbs_seq(20, _nnois, offset = 12345)
+    return run, {'nbit': 20, 'n': _nnois}
+
+def _etfe_data(r = 16):
+    u = np.tile(prbs_seq(12, 4095)[1], r)           # r periods of PRBS12
+    y = np.convolve(u, np.exp(-np.arange(50) / 10.0))[:u.size]
+    return u, y
+
+def case_sysid_etfe():
+    u, y = _etfe_data()
+    def run():
+        etfe(u, y, r = 16, fs = _fs)
+    return run, {'n': u.size, 'r': 16}
+
+def case_sysid_etfe_accum():
+    u, y = _etfe_data()
+    u, y = u.reshape(16, -1), y.reshape(16, -1)
+    def run():
+        _, state = etfe_accum(u, y, fs = _fs)
+        etfe_result(state)
+    return run, {'n': u.size, 'r': 16}
+
+def case_sysid_iden_impulse():
+    rng = _rng()
+    h   = np.exp((-_wh + 1j*_dw) * _Ts * np.arange(20)) * (1 - np.exp(-_wh * _Ts))
+    U   = rng.standard_normal((_nch, _npul)) + 1j * rng.standard_normal((_nch, _npul))
+    Y   = np.array([np.convolve(u, h)[:_npul] for u in U])
+    def run():
+        iden_impulse(U, Y, order = 20)
+    return run, {'n_wf': _nch, 'n': _npul, 'order': 20}
+
+def case_sysid_cav_par_pulse():
+    vc, vf, _, _, _ = _pulses()
+    def run():
+        cav_par_pulse(vc, vf, _wh, _Ts)
+    return run, {'n_ch': _nch, 'n': _npul}
+
+def case_sysid_cav_par_pulse_obs():
+    vc, vf, _, _, _ = _pulses(n_ch = 1)
+    def run():
+        cav_par_pulse_obs(vc[0], vf[0], _wh, _Ts)
+    return run, {'n': _npul}
+
+def case_sysid_cav_observer():
+    vc, vf, _, _, _ = _pulses(n_ch = 1)
+    def run():
+        cav_observer(vc[0], vf[0], _wh, _Ts)
+    return run, {'n': _npul}
+
+def _ilc_h(n = 1000):
+    # impulse response of the cavity over the pulse (needed by AFF_ilc_design)
+    return np.exp((-_wh + 1j*_dw) * _Ts * np.arange(n)) * (1 - np.exp(-_wh * _Ts))
+
+def case_control_ilc_design():
+    h = _ilc_h()
+    def run():
+        AFF_ilc_design(h, 1000)
+    return run, {'pulw': 1000}
+
+def case_control_ilc():
+    h    = _ilc_h()
+    _, L = AFF_ilc_design(h, 1000)
+    err  = _rng().standard_normal(1000) + 0j
+    def run():
+        AFF_ilc(err, L)
+    return run, {'pulw': 1000}
+
+def case_calib_vprobe_batch():
+    vc, vf, vr, _, _ = _pulses()
+    def run():
+        calib_vprobe_batch(vc, vf, vr)
+    return run, {'n_ch': _nch, 'n': _npul}
+
+def case_calib_for_ref_batch():
+    vc, vf, vr, ids, ide = _pulses()
+    def run():
+        calib_for_ref_batch(vc, vf, vr, ids, ide, _wh, _dw, _Ts)
+    return run, {'n_ch': _nch, 'n': _npul}
+
+def case_calib_iqmod():
+    rng  = _rng()
+    vdac = rng.standard_normal(10000) + 1j * rng.standard_normal(10000)
+    viqm = 0.9 * vdac + 0.05 * np.conj(vdac) + 1e-3 * rng.standard_normal(10000)
+    def run():
+        calib_iqmod(vdac, viqm)
+    return run, {'n': 10000}
+
+def case_calib_delay():
+    vc, _, _, _, _ = _pulses()
+    sig = np.array([shift_wf(wf, 3.4)[1] for wf in vc])
+    def run():
+        calib_delay(vc, sig)
+    return run, {'n_ch': _nch, 'n': _npul}
+
+def case_calib_delay_phase():
+    rng = _rng()
+    vc, _, _, _, _ = _pulses()
+    sig = np.array([shift_wf(wf, 3.4)[1] for wf in vc])
+    sig = sig + 0.05 * (rng.standard_normal(sig.shape) + 1j * rng.standard_normal(sig.shape))
+    def run():
+        calib_delay(vc, sig, method = 'phase')
+    return run, {'n_ch': _nch, 'n': _npul, 'noise': 0.05}
+
+def case_fit_ellipse():
+    t = np.linspace(0, 2*np.pi, 100)
+    X, Y = 2*np.cos(t) + 0.5, np.sin(t) - 0.2
+    def run():
+        for _ in range(100):
+            fit_ellipse(X, Y)
+    return run, {'n_fit': 100, 'n': 100}
+
+def case_fit_Gaussian():
+    X = np.linspace(-5, 5, 64)
+    Y = 2 * np.exp(-0.5 * (X - 0.3)**2)
+    def run():
+        for _ in range(100):
+            fit_Gaussian(X, Y)
+    return run, {'n_fit': 100, 'n': 64}
+
+def case_fit_sincos_batch():
+    rng = _rng()
+    X   = np.tile(np.linspace(0, 2*np.pi, 20, endpoint = False), (10000, 1))
+    Y   = np.cos(X + rng.uniform(-3, 3, (10000, 1))) + 0.01 * rng.standard_normal(X.shape)
+    def run():
+        fit_sincos_batch(X, Y)
+    return run, {'n_fit': 10000, 'n': 20}
+
+def case_fit_ellipse_batch():
+    rng = _rng()
+    t   = np.tile(np.linspace(0, 2*np.pi, 20, endpoint = False), (10000, 1))
+    X   = 2 * np.cos(t) + 0.01 * rng.standard_normal(t.shape)
+    Y   = np.sin(t) + 0.01 * rng.standard_normal(t.shape)
+    def run():
+        fit_ellipse_batch(X, Y)
+    return run, {'n_fit': 10000, 'n': 20}
+
+def case_fit_Gaussian_batch():
+    rng = _rng()
+    X   = np.tile(np.linspace(-10, 10, 64), (1000, 1))
+    Y   = rng.uniform(1, 5, (1000, 1)) * np.exp(-0.5 * ((X - rng.uniform(-3, 3, (1000, 1))) / 1.5)**2)
+    Y  += 0.02 * rng.standard_normal(X.shape)
+    def run():
+        fit_Gaussian_batch(X, Y)
+    return run, {'n_fit': 1000, 'n': 64}
+
+def case_pipeline_demod():
+    raw = _raw_pulses(n_pul = 4)
+    def run():
+        demod_pipeline(raw, 'noniq', {'n': 14, 'm': 3}, n_proc = 1)
+    return run, {'n_pul': 4, 'n_ch': _nch, 'n': 16384}
+
+def case_pipeline_cav_par():
+    vc, vf, _, ids, ide = _pulses(n_ch = 256)
+    def run():
+        cav_par_pipeline(vc, ide + 10, ide + 400, _Ts, vf = vf, pul_ids = ids, pul_ide = ide, n_proc = 1)
+    return run, {'n_pul': 256, 'n': _npul}
+
+def _archive_data(n_pul):
+    vc, vf, vr, _, _ = _pulses(n_ch = n_pul)
+    return {'vc': vc.astype(np.complex64), 'vf': vf.astype(np.complex64), 'vr': vr.astype(np.complex64)}
+
+def case_archive_append():
+    data = _archive_data(256)
+    path = _tmp_path('arc_append')
+    def run():
+        shutil.rmtree(path, ignore_errors = True)
+        _, arc = archive_open(path, chunk = 128)
+        for i in range(256):                        # pulse by pulse, 2 chunks sealed
+            archive_append(arc, {key: val[i] for key, val in data.items()}, timestamp = float(i))
+        archive_close(arc)
+    return run, {'n_pul': 256, 'n_chan': 3, 'n': _npul, 'chunk': 128}
+
+def case_archive_read():
+    data = _archive_data(1024)
+    _, arc = archive_open(_tmp_path('arc_read'), chunk = 256, n_cache = 0)
+    archive_append(arc, data, timestamp = np.arange(1024.0))
+    ids  = np.arange(0, 1024, 4)
+    def run():
+        archive_read(arc, 'vc', ids)                # decompress the 4 sealed chunks
+    return run, {'n_pul': 256, 'n': _npul, 'chunk': 256}
+
+# all cases (name: group.case)
+_cases = {'sim.cav_model':             case_sim_cav_model,
+          'sim.ncav_pulse':            case_sim_ncav_pulse,
+          'sim.ncav_step':             case_sim_ncav_step,
+          'sim.scav_step':             case_sim_scav_step,
+          'loop.closed':               case_loop_closed,
+          'demod.noniq':               case_demod_noniq,
+          'demod.twop':                case_demod_twop,
+          'demod.asyn':                case_demod_asyn,
+          'demod.pulse_info':          case_demod_pulse_info,
+          'noise.calc_psd':            case_noise_calc_psd,
+          'noise.calc_psd_coherent':   case_noise_calc_psd_coherent,
+          'noise.gen_from_psd':        case_noise_gen_from_psd,
+          'noise.psd_accum':           case_noise_psd_accum,
+          'noise.gen_from_psd_stream': case_noise_gen_from_psd_stream,
+          'noise.filt_bank':           case_noise_filt_bank,
+          'sysid.prbs':                case_sysid_prbs,
+          'sysid.prbs_seq':            case_sysid_prbs_seq,
+          'sysid.etfe':                case_sysid_etfe,
+          'sysid.etfe_accum':          case_sysid_etfe_accum,
+          'sysid.iden_impulse':        case_sysid_iden_impulse,
+          'sysid.cav_par_pulse':       case_sysid_cav_par_pulse,
+          'sysid.cav_par_pulse_obs':   case_sysid_cav_par_pulse_obs,
+          'sysid.cav_observer':        case_sysid_cav_observer,
+          'control.ilc_design':        case_control_ilc_design,
+          'control.ilc':               case_control_ilc,
+          'calib.vprobe_batch':        case_calib_vprobe_batch,
+          'calib.for_ref_batch':       case_calib_for_ref_batch,
+          'calib.iqmod':               case_calib_iqmod,
+          'calib.delay':               case_calib_delay,
+          'calib.delay_phase':         case_calib_delay_phase,
+          'fit.ellipse':               case_fit_ellipse,
+          'fit.Gaussian':              case_fit_Gaussian,
+          'fit.sincos_batch':          case_fit_sincos_batch,
+          'fit.ellipse_batch':         case_fit_ellipse_batch,
+          'fit.Gaussian_batch':        case_fit_Gaussian_batch,
+          'pipeline.demod':            case_pipeline_demod,
+          'pipeline.cav_par':          case_pipeline_cav_par,
+          'archive.append':            case_archive_append,
+          'archive.read':              case_archive_read}
+
+# ---------------------------------------------------------
+# timing, comparison and reporting
+# ---------------------------------------------------------
+def bench_time(func, repeat = 5, min_time = 0.2):
+    '''
+    Time a function, return the statistics of the time per call in s.
+    '''
+    func()                                          # warm up (lazy imports, caches)
+
+    # number of calls per loop lasting at least min_time
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            func()
+        dt = time.perf_counter() - t0
+        if dt >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(dt, 1e-9) * 1.2))
+
+    # repeated loops with the garbage collector disabled (as timeit)
+    t = []
+    gc_on = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                func()
+            t.append((time.perf_counter() - t0) / loops)
+    finally:
+        if gc_on:
+            gc.enable()
+    q1, q3 = np.percentile(t, [25, 75])
+    return {'median': float(np.median(t)), 'min': float(np.min(t)), 'iqr': float(q3 - q1),
+            'loops': loops, 'repeat': repeat}
+
+def bench_meta():
+    '''
+    Information of the machine and software versions.
+    '''
+    import scipy
+    return {'time':     time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python':   platform.python_version(),
+            'numpy':    np.__version__,
+            'scipy':    scipy.__version__,
+            'machine':  platform.machine(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+def bench_compare(results, baseline, tol = 0.25):
+    '''
+    Compare the results with the baseline, return a dict of the ratio of the
+    median times and the status ('ok', 'faster', 'REGRESSION', 'new') per case.
+    '''
+    comp = {}
+    for name, r in results.items():
+        if name not in baseline:
+            comp[name] = (np.nan, 'new')
+            continue
+        ratio = r['median'] / baseline[name]['median']
+        comp[name] = (ratio, 'REGRESSION' if ratio > 1.0 + tol else
+                             'faster'     if ratio < 1.0 / (1.0 + tol) else 'ok')
+    return comp
+
+def _fmt_time(t):
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if t >= scale:
+            return '{:8.3f} {:2s}'.format(t / scale, unit)
+    return '{:8.3f} {:2s}'.format(t / 1e-9, 'ns')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the hot paths of llrflibs')
+    parser.add_argument('--filter',   default = '.*',             help = 'regular expression selecting the cases')
+    parser.add_argument('--list',     action = 'store_true',      help = 'list the cases and exit')
+    parser.add_argument('--repeat',   type = int,   default = 5,   help = 'number of repeated loops')
+    parser.add_argument('--min-time', type = float, default = 0.2, help = 'minimum duration of a loop, s')
+    parser.add_argument('--out',      default = None,             help = 'JSON file to write the results')
+    parser.add_argument('--baseline', default = None,             help = 'JSON file of the baseline results')
+    parser.add_argument('--tol',      type = float, default = 0.25, help = 'relative slow-down reported as regression')
+    args = parser.parse_args()
+    np.seterr(all = 'ignore')                       # e.g., division by the zero waveform before the pulse
+
+    names = [name for name in _cases if re.search(args.filter, name)]
+    if args.list:
+        print('\n'.join(names))
+        sys.exit(0)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    # run the cases
+    results = {}
+    print('{:26s} {:>11s} {:>11s} {:>9s}  {}'.format('case', 'median', 'min', 'iqr (%)',
+                                                    'vs. baseline' if baseline else ''))
+    for name in names:
+        func, params    = _cases[name]()
+        results[name]   = bench_time(func, repeat = args.repeat, min_time = args.min_time)
+        results[name]['params'] = params
+        r    = results[name]
+        line = '{:26s} {} {} {:9.1f}'.format(name, _fmt_time(r['median']), _fmt_time(r['min']),
+                                             100.0 * r['iqr'] / r['median'])
+        if baseline:
+            ratio, status = bench_compare({name: r}, baseline, args.tol)[name]
+            line += '  {:6.2f}x {}'.format(ratio, status) if status != 'new' else '  new'
+        print(line, flush = True)
+
+    # save the results
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump({'meta': bench_meta(), 'results': results}, f, indent = 1)
+
+    # report the regressions
+    if baseline:
+        comp    = bench_compare(results, baseline, args.tol)
+        regress = [name for name, (_, status) in comp.items() if status == 'REGRESSION']
+        missing = [name for name in baseline if name not in results and re.search(args.filter, name)]
+        if missing:
+            print('Cases in baseline but not run: ' + ', '.join(missing))
+        if regress:
+            print('Regressions (> {:.0f}% slower): '.format(100 * args.tol) + ', '.join(regress))
+            sys.exit(1)
+        print('No regression found')
@@ -0,0 +1,53 @@
+###################################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+###################################################################################
+'''
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example code to archive the waveforms of many pulses and read them back
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+import os
+import time
+import tempfile
+import numpy as np
+import matplotlib.pyplot as plt
+
+from llrflibs.rf_archive import *
+
+# create the archive in a temporary directory (removed at the end)
+tmp_dir = tempfile.TemporaryDirectory()
+status, arc = archive_open(os.path.join(tmp_dir.name, 'data_archive'), chunk = 256, compress = True)
+
+# import the example file as the first pulse
+status, ids = archive_from_mat(arc, 'data_Gun_wfs.mat', timestamp = 0.0, cavity = 0)
+
+# append 2000 pulses of 4 cavities (as from the acquisition) with random jitters
+wfs = {name: np.array(archive_read(arc, name, 0)[1]) for name in arc['meta']['channels']}
+t0  = time.time()
+for i in range(1, 2001):
+    data = dict(wfs)
+    data['vc_amp'] = wfs['vc_amp'] * (1.0 + 0.01 * np.random.randn())
+    archive_append(arc, data, timestamp = i * 0.01, cavity = i % 4)
+print('Appended 2000 pulses in %.3f s' % (time.time() - t0))
+
+# find the pulses of cavity 2 in the time range of 5-10 s and read one channel
+status, ids = archive_query(arc, t_start = 5.0, t_end = 10.0, cavity = 2)
+status, vc_amp = archive_read(arc, 'vc_amp', ids)
+print('Found %d pulses of cavity 2' % ids.size)
+
+# export them into a Matlab file
+file_name = os.path.join(tmp_dir.name, 'data_archive_cav2.mat')
+archive_to_mat(arc, file_name, channels = ['vc_amp', 'vc_pha'], ids = ids)
+print('Exported %d bytes' % os.path.getsize(file_name))
+archive_close(arc)
+tmp_dir.cleanup()
+
+plt.figure()
+plt.plot(vc_amp.T)
+plt.grid()
+plt.xlabel('Sample Id')
+plt.ylabel('Amplitude (arb. units)')
+plt.title('Cavity Amplitude of Cavity 2 in 5-10 s')
+plt.show()
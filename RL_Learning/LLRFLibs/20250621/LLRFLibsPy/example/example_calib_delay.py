@@ -0,0 +1,49 @@
+###################################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+###################################################################################
+'''
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example code to calibrate the relative delays between waveforms with noise. A 
+band-limited complex waveform is delayed by known fractional delays, noise is 
+added and the delays are estimated with both refinement methods of "calib_delay"
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+import numpy as np
+import matplotlib.pyplot as plt
+
+from scipy.signal import firwin
+
+from llrflibs.rf_calib import *
+
+# band-limited complex waveform (low-pass filtered white noise)
+rng = np.random.default_rng(1234)
+N   = 2048
+ref  = np.convolve(rng.standard_normal(N) + 1j * rng.standard_normal(N), firwin(63, 0.3), 'same')
+
+# delayed copies of the waveform with noise (relative to the peak amplitude)
+delays = np.arange(0.5, 10.6, 0.35)
+status, sig = shift_wf(np.tile(ref, (delays.size, 1)), delays)
+
+noise_list = [0.0, 0.01, 0.05]
+err = {}
+for noise in noise_list:
+    sig_n = sig + noise * np.max(np.abs(ref)) * (rng.standard_normal(sig.shape) +
+                                                 1j * rng.standard_normal(sig.shape))
+    for method in ('parabolic', 'phase'):
+        status, delay, corr = calib_delay(ref, sig_n, method = method)
+        err[(noise, method)] = delay - delays
+        print('noise {:5.2f}, {:9s}: max. abs. error {:.4f} points'.format(
+              noise, method, np.max(np.abs(err[(noise, method)]))))
+
+# plot the errors
+plt.figure()
+for noise in noise_list:
+    for method, mk in (('parabolic', 'o'), ('phase', 'x')):
+        plt.plot(delays, err[(noise, method)], mk + '-', label = '{}, noise {}'.format(method, noise))
+plt.xlabel('Delay (points)')
+plt.ylabel('Error of the delay (points)')
+plt.legend()
+plt.grid()
+plt.show()
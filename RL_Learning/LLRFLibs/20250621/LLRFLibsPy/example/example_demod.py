@@ -89,3 +89,16 @@ plt.show(block = False)
 
 
 
+
+# demodulate the same waveform chunk by chunk as it would arrive from a streaming DAQ
+stream_I  = []
+stream_Q  = []
+state_niq = None
+for raw_chunk in np.array_split(boc_raw, 10):
+    status, Ic, Qc, state_niq = noniq_demod_stream(raw_chunk, n, m, state = state_niq)
+    stream_I.append(Ic)
+    stream_Q.append(Qc)
+
+stream_I = np.hstack(stream_I)
+stream_Q = np.hstack(stream_Q)
+print('Max. difference between streaming and batch non-I/Q demod: %e' % np.max(np.abs(stream_I + 1j*stream_Q - (I + 1j*Q))))
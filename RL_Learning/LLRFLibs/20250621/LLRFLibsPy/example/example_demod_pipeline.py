@@ -0,0 +1,47 @@
+###################################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+###################################################################################
+'''
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+Example code to demodulate many channels and pulses in parallel
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+from llrflibs.rf_misc import *
+from llrflibs.rf_pipeline import *
+
+# the process pool needs the main guard (worker processes import this file)
+if __name__ == '__main__':
+    # load the data
+    data = load_mat('data_adcraw_wfs.mat')
+    n    = data['noniq_n']              # non-I/Q parameters: n sample covers m IF cycles
+    m    = data['noniq_m']
+
+    # build a data set of 100 pulses x 4 channels by repeating the raw waveforms
+    chs  = np.vstack((data['ref_raw'], data['vm_raw'], data['kly_raw'], data['boc_raw']))
+    raw  = np.tile(chs, (100, 1, 1))
+
+    # demodulate all records and get the pulse information
+    t0     = time.time()
+    result = demod_pipeline(raw, method = 'noniq', demod_par = {'n': n, 'm': m})
+    print('Processed %d records in %.3f s' % (raw.shape[0] * raw.shape[1], time.time() - t0))
+    print('Pulse width of channels (first pulse): ', result['pulw'][0])
+
+    plt.figure()
+    plt.subplot(2,1,1)
+    plt.plot(result['A'][0].T)
+    plt.grid()
+    plt.xlabel('Sample Id')
+    plt.ylabel('Amplitude (arb. units)')
+    plt.subplot(2,1,2)
+    plt.plot(result['P'][0].T)
+    plt.grid()
+    plt.xlabel('Sample Id')
+    plt.ylabel('Phase (deg)')
+    plt.suptitle('Demodulation Pipeline Results')
+    plt.show()
@@ -98,7 +98,7 @@ status2, Abmd, Bbmd, Cbmd, Dbmd, _ = ss_discrete(Abm, Bbm, Cbm, Dbm, Ts,
 # Note: this notch filter is only applied to the cavity output measurement to
 #       avoid the instability caused by passband modes. It should be distingished
 #       from the notch filter in the feedback controller (see below)
-status, Afd, Bfd, Cfd, Dfd = design_notch_filter(200e3, 4, fs)
+status, fbank = design_filter_bank(fs, notches = [(200e3, 4)])
 
 # ---------------------------------------------------------
 # define the general feedback controller
@@ -131,7 +131,7 @@ vf2 = np.zeros(simN, dtype = complex)                       # overall cavity dri
 state_rf = np.matrix(np.zeros(Brfd.shape), dtype = complex) # state of cavity model of RF response
 state_bm = np.matrix(np.zeros(Bbmd.shape), dtype = complex) # state of cavity model of beam response
 state_k  = np.matrix(np.zeros(Bkd.shape),  dtype = complex) # state of the controller
-state_f  = np.matrix(np.zeros(Bfd.shape),  dtype = complex) # state of the notch filter for measurement
+state_f  = None                                             # state of the notch filter for measurement
 vf_all = 0.0 + 1j*0.0                                       # overall cavity drive of the time step
 
 for i in range(simN):
@@ -148,7 +148,7 @@ for i in range(simN):
                                                           state_bm0 = state_bm)
 
     # notch-filter the output
-    status, vc_f, state_f = filt_step(Afd, Bfd, Cfd, Dfd, vc2[i], state_f)
+    status, vc_f, state_f = filt_bank_step(fbank, vc2[i], state_f)
 
     # calculate the error
     vc_err = vc_sp[i] - vc_f            # feedback based on notch filter output
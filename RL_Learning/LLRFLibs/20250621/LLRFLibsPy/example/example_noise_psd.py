@@ -39,9 +39,20 @@ result2 = calc_psd(signal,
                    bit  = bit, 
                    plot = True)                # for general sampling (with blackman windowing)
 
+# average the PSD of shorter segments (Welch), feeding the data chunk by chunk
+state = None
+for chunk in np.array_split(signal, 8):
+    status, state = psd_accum(chunk, 
+                              fs    = fs, 
+                              nfft  = 1024, 
+                              state = state, 
+                              bit   = bit)
+result3 = psd_accum_result(state)
+
 plt.figure()
 plt.plot(result1['freq'], result1['amp_resp'], label = 'Coherent')
 plt.plot(result2['freq'], result2['amp_resp'], label = 'Windowing')
+plt.plot(result3['freq'], result3['amp_resp'], label = 'Averaged (%d segments)' % result3['n_seg'])
 plt.xlabel('Frequency (Hz)')
 plt.ylabel('Magnitude (dBFS/Hz)')
 plt.grid()
@@ -64,7 +64,26 @@ plt.xscale('log')
 plt.grid()
 plt.show(block = False)
 
+# generate a long noise series block by block (bounded memory) with 4 independent 
+# realizations, and accumulate the PSD of the first realization to verify
+state_n = None
+state_p = None
+for i in range(50):
+    status, noise_blk, state_n = gen_noise_from_psd_stream(freq_vector, psd_vector, fs, 
+                                                           n      = 100000, 
+                                                           state  = state_n,
+                                                           n_real = 4,
+                                                           seed   = 1234)
+    status, state_p = psd_accum(noise_blk[0], fs, nfft = 2**16, state = state_p)
 
+result_s = psd_accum_result(state_p)
 
-
-
+plt.figure()
+plt.plot(result_s['freq'], result_s['amp_resp'], label = 'PSD of Streamed Time Series')
+plt.plot(freq_p, pn_p,                           label = 'Input PSD Points')
+plt.xscale('log')
+plt.grid()
+plt.legend()
+plt.xlabel('Frequency (Hz)')
+plt.ylabel(r'DSB PSD $(dBrad^2/Hz)$')
+plt.show(block = False)
@@ -35,13 +35,10 @@ status, amplts, phases, psds = gen_rand_sine_from_psd(freq_vector,
                                                      psd_vector, 
                                                      freqs)     # gen sine waves
 
-ts    = np.linspace(0, (N-1)/fs, N)                             # time array of pulse 1, s
-ts2   = ts + 30e-3                                              # time array of pulse 2, s
-data  = np.zeros(N)
-data2 = np.zeros(N)
-for i in range(n_sine):
-    data  = data  + amplts[i] * np.sin(2 * np.pi * freqs[i] * ts  + phases[i])
-    data2 = data2 + amplts[i] * np.sin(2 * np.pi * freqs[i] * ts2 + phases[i])
+status, data,  _ = sum_sine_stream(amplts, freqs, phases, fs, N)   # pulse 1 starting at 0
+status, data2, _ = sum_sine_stream(amplts, freqs, 
+                                   phases + 2 * np.pi * freqs * 30e-3, 
+                                   fs, N)                       # pulse 2 starting at 30 ms
 
 result1 = calc_psd(data,  fs = fs)                              # calculate PSDs to verify
 result2 = calc_psd(data2, fs = fs)
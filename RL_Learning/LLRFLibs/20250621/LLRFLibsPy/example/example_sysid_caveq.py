@@ -132,3 +132,30 @@ plt.show(block = False)
 
 
 
+
+# estimate the intra-pulse half bandwidth and detuning sample by sample (e.g., 
+# for real-time compensation), the results are the same as cav_par_pulse_obs
+status, obs = design_cav_observer(half_bw, Ts, pole_scale = 80)
+wh_stp = np.zeros(vc.shape)
+dw_stp = np.zeros(vc.shape)
+state  = None
+for i in range(vc.shape[0]):
+    status, wh_stp[i], dw_stp[i], _, _, state = cav_par_step(obs, vc[i], vd[i], 
+                                                             state   = state, 
+                                                             vb_step = vb[i])
+
+plt.figure()
+plt.subplot(2,1,1)
+plt.plot(wh_pul,         label = 'Batch')
+plt.plot(wh_stp, '--',   label = 'Step')
+plt.grid()
+plt.legend()
+plt.ylabel('Half-bandwidth (rad/s)')
+plt.subplot(2,1,2)
+plt.plot(dw_pul,         label = 'Batch')
+plt.plot(dw_stp, '--',   label = 'Step')
+plt.grid()
+plt.legend()
+plt.xlabel('Sample Id')
+plt.ylabel('Detuning (rad/s)')
+plt.show(block = False)
@@ -108,3 +108,32 @@ plt.show(block = False)
 
 
 
+
+# estimate the frequency response online by accumulating the spectra period 
+# by period (the first period is excluded as transient)
+K     = u.size // r     # period of the PRBS
+state = None
+for i in range(1, r):
+    status, state = etfe_accum(u[i*K:(i+1)*K], y[i*K:(i+1)*K], state = state, fs = fs)
+    if not status:
+        print('Failed to accumulate the period %d' % i)
+
+result = etfe_result(state)
+if not result['status']:
+    raise SystemExit('Failed to estimate the frequency response')
+
+plt.figure()
+plt.subplot(2,1,1)
+plt.plot(result['freq'], 20.0 * np.log10(np.abs(result['G'])),  label = 'Average')
+plt.plot(result['freq'], 20.0 * np.log10(np.abs(result['H1'])), label = 'H1')
+plt.plot(result['freq'], 20.0 * np.log10(np.abs(result['H2'])), label = 'H2')
+plt.grid()
+plt.legend()
+plt.xlabel('Frequency (Hz)')
+plt.ylabel('Estimated TF Mag. (dB)')
+plt.subplot(2,1,2)
+plt.plot(result['freq'], result['coh'])
+plt.grid()
+plt.xlabel('Frequency (Hz)')
+plt.ylabel('Coherence')
+plt.show(block = False)
@@ -11,5 +11,5 @@ Set the path so that the library can be used
 import os
 import sys
 
-sys.path.append("../src")
+sys.path.append("..")                # the llrflibs package
 
@@ -0,0 +1,72 @@
+"""LLRF algorithm libraries in Python."""
+#############################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+#############################################################################
+'''
+#########################################################################
+The modules are loaded when they are first accessed as attributes of the
+package (e.g., ``llrflibs.rf_sim``) or imported explicitly (e.g.,
+``from llrflibs.rf_sim import *``). The heavy dependencies (the subpackages
+of scipy) are loaded with ``_lazy_import`` when they are first used, so that
+importing the modules needs only numpy.
+
+Setting the environment variable ``LLRFLIBS_PROF=1`` profiles the calls of
+the library functions (see ``rf_prof``).
+#########################################################################
+'''
+import os
+import sys
+import importlib
+import importlib.util
+
+__all__ = ['rf_archive',
+           'rf_calib',
+           'rf_control',
+           'rf_det_act',
+           'rf_fit',
+           'rf_misc',
+           'rf_noise',
+           'rf_pipeline',
+           'rf_plot',
+           'rf_prof',
+           'rf_sim',
+           'rf_sysid']
+
+def _lazy_import(name):
+    '''
+    Import a module which is only loaded at the first access of its attributes.
+    The module already imported is returned directly.
+
+    Parameters:
+        name:   string, full name of the module, e.g., 'scipy.signal'
+
+    Returns:
+        module: the (lazy) module
+    '''
+    if name in sys.modules:
+        return sys.modules[name]
+    spec   = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+def __getattr__(name):
+    '''
+    Load the modules when they are accessed as attributes (PEP 562).
+    '''
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+# profile the library functions if requested (nothing is instrumented otherwise)
+if os.environ.get('LLRFLIBS_PROF', '0') not in ('', '0'):
+    from llrflibs import rf_prof
+    rf_prof._prof_from_env()
@@ -0,0 +1,468 @@
+"""Archive RF waveforms of many pulses in chunked, memory-mapped columns."""
+#############################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+#############################################################################
+'''
+#########################################################################
+Here collects routines for archiving large amount of RF waveforms
+
+Implemented:
+    - archive_open     : open (or create) a waveform archive in a directory
+    - archive_close    : close the archive and clear the cached chunks
+    - archive_append   : append waveforms of one or more pulses to the archive
+    - archive_index    : get the pulse index (timestamp and cavity) of the archive
+    - archive_query    : find the pulses in a time range and/or of given cavities
+    - archive_read     : read the waveforms of a channel for selected pulses
+    - archive_from_mat : import a Matlab .mat file (see ``save_mat``) into the archive
+    - archive_to_mat   : export selected pulses/channels into a Matlab .mat file
+
+Note:
+    The archive is a directory with the layout below:
+        meta.json        : chunk size, compression and channel definitions
+        index.bin        : pulse index, one record (timestamp, cavity) per pulse
+        <channel>/<k>.bin: raw waveforms of the chunk k of a channel
+        <channel>/<k>.npz: compressed waveforms of the chunk k (sealed chunk)
+    Each channel is stored as an own column, so reading one channel does not
+    touch the data of the others. The pulses are stored in chunks of ``chunk``
+    pulses. The chunk being filled is a raw binary file appended by the writer
+    and accessed by memory mapping. When a chunk is full, it is sealed: it is
+    compressed into a .npz file if the archive is created with ``compress = True``,
+    otherwise it stays as the raw file. Reading the raw chunks returns views of
+    the memory-mapped files, while the compressed chunks are decompressed when
+    accessed and a few of them are cached. The archive is append-only: the
+    waveforms are written before the index, so that only complete pulses are
+    seen by the readers (also in other processes).
+#########################################################################
+'''
+import os
+import json
+import time
+import collections
+import numpy as np
+
+from llrflibs.rf_misc import *
+
+# data type of the pulse index
+_arc_index_dtype = np.dtype([('timestamp', '<f8'), ('cavity', '<i4')])
+
+def _arc_chunk_file(arc, channel, k, ext = '.bin'):
+    '''
+    File of the chunk k of a channel.
+    '''
+    return os.path.join(arc['path'], channel, str(k) + ext)
+
+def _arc_save_meta(arc):
+    '''
+    Write the meta data of the archive.
+    '''
+    file_name = os.path.join(arc['path'], 'meta.json')
+    with open(file_name + '.tmp', 'w') as f:
+        json.dump(arc['meta'], f, indent = 1)
+    os.replace(file_name + '.tmp', file_name)
+
+def _arc_n_pulse(arc):
+    '''
+    Number of complete pulses in the archive.
+    '''
+    file_name = os.path.join(arc['path'], 'index.bin')
+    if not os.path.exists(file_name):
+        return 0
+    return os.path.getsize(file_name) // _arc_index_dtype.itemsize
+
+def _arc_chunk(arc, channel, k, n_row):
+    '''
+    Get the waveforms of the chunk k of a channel (n_row valid rows), either as
+    memory-mapped raw file or decompressed from the sealed chunk.
+    '''
+    ch    = arc['meta']['channels'][channel]
+    shape = tuple(ch['shape'])
+
+    # sealed compressed chunk (cached after decompression)
+    key = (channel, k)
+    if key in arc['cache']:
+        arc['cache'].move_to_end(key)
+        return arc['cache'][key][:n_row]
+    file_name = _arc_chunk_file(arc, channel, k, '.npz')
+    if os.path.exists(file_name):
+        with np.load(file_name) as f:
+            data = f['wf']
+        data.flags.writeable = False                # read-only as the raw chunks
+        arc['cache'][key] = data
+        while len(arc['cache']) > arc['n_cache']:
+            arc['cache'].popitem(last = False)
+        return data[:n_row]
+
+    # raw chunk
+    return np.memmap(_arc_chunk_file(arc, channel, k),
+                     dtype = np.dtype(ch['dtype']),
+                     mode  = 'r',
+                     shape = (n_row,) + shape)
+
+def _arc_seal(arc, k):
+    '''
+    Seal the full chunk k of all channels, compress it if required. The channels
+    already sealed (e.g., before an interruption) are skipped.
+    '''
+    if not arc['meta']['compress']:
+        return
+    for channel in arc['meta']['channels']:
+        file_raw = _arc_chunk_file(arc, channel, k)
+        file_npz = _arc_chunk_file(arc, channel, k, '.npz')
+        if not os.path.exists(file_npz):
+            if not os.path.exists(file_raw):
+                continue
+            data = _arc_chunk(arc, channel, k, arc['meta']['chunk'])
+            with open(file_npz + '.tmp', 'wb') as f:
+                np.savez_compressed(f, wf = data)
+            del data
+            os.replace(file_npz + '.tmp', file_npz)
+        if os.path.exists(file_raw):
+            os.remove(file_raw)
+
+def _arc_recover(arc):
+    '''
+    Clean up the incomplete writes of an interrupted writer: truncate the raw
+    chunk files to the pulses in the index and remove the sealed raw files.
+    '''
+    n     = _arc_n_pulse(arc)
+    chunk = arc['meta']['chunk']
+    for channel, ch in arc['meta']['channels'].items():
+        size = np.dtype(ch['dtype']).itemsize * int(np.prod(ch['shape']))
+        for k in range((n + chunk - 1) // chunk + 1):
+            file_raw = _arc_chunk_file(arc, channel, k)
+            if not os.path.exists(file_raw):
+                continue
+            if os.path.exists(_arc_chunk_file(arc, channel, k, '.npz')):
+                os.remove(file_raw)
+            else:
+                n_row = min(max(n - k * chunk, 0), chunk)
+                if os.path.getsize(file_raw) > n_row * size:
+                    os.truncate(file_raw, n_row * size)
+
+    # full chunks not sealed yet (checked per channel)
+    for k in range(n // chunk):
+        _arc_seal(arc, k)
+
+def archive_open(path, mode = 'a', chunk = 1024, compress = True, n_cache = 4):
+    '''
+    Open a waveform archive. A new archive is created if the directory does not
+    contain an archive and the mode is 'a'.
+
+    Parameters:
+        path:     string, directory of the archive
+        mode:     string, 'a' for appending (and reading), 'r' for reading only
+        chunk:    int, number of pulses per chunk (only for new archive)
+        compress: boolean, True to compress the full chunks (only for new archive)
+        n_cache:  int, number of decompressed chunks kept in memory
+
+    Returns:
+        status:   boolean, success (True) or fail (False)
+        arc:      dict, the archive handle used by the other functions
+    '''
+    # check the input
+    if (mode not in ('a', 'r')) or (chunk < 1):
+        return False, None
+
+    # read the meta data or create a new archive
+    arc = {'path':    path,
+           'mode':    mode,
+           'n_cache': max(int(n_cache), 0),
+           'cache':   collections.OrderedDict()}
+    file_name = os.path.join(path, 'meta.json')
+    if os.path.exists(file_name):
+        with open(file_name) as f:
+            arc['meta'] = json.load(f)
+    elif mode == 'a':
+        os.makedirs(path, exist_ok = True)
+        arc['meta'] = {'version':  1,
+                       'chunk':    int(chunk),
+                       'compress': bool(compress),
+                       'channels': {},
+                       'attrs':    {}}
+        _arc_save_meta(arc)
+    else:
+        return False, None
+
+    # recover from an interrupted writer
+    if mode == 'a':
+        _arc_recover(arc)
+    return True, arc
+
+def archive_close(arc):
+    '''
+    Close the archive and release the cached chunks.
+
+    Parameters:
+        arc: dict, the archive handle
+    '''
+    arc['cache'].clear()
+
+def archive_append(arc, data, timestamp = None, cavity = 0):
+    '''
+    Append the waveforms of one or more pulses to the archive. The channels are
+    defined by the first appending, the later appending must contain the same
+    channels with the same waveform shape. The data type is converted to the one
+    of the channel.
+
+    Parameters:
+        arc:       dict, the archive handle
+        data:      dict, waveforms of the channels, each is an array of one pulse
+                    or an array of pulses stacked along the first dimension (at
+                    the first appending, the latter requires array of ``timestamp``
+                    or ``cavity`` to define the waveform shape)
+        timestamp: float or numpy array, timestamp of the pulses, current time
+                    if None
+        cavity:    int or numpy array, index of the cavity of the pulses
+
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        ids:       numpy array, indices of the appended pulses in the archive
+    '''
+    # check the input
+    if (arc['mode'] != 'a') or (not isinstance(data, dict)) or (not data):
+        return False, None
+    timestamp = np.atleast_1d(time.time() if timestamp is None else timestamp).astype('<f8')
+    cavity    = np.atleast_1d(cavity).astype('<i4')
+    n_pul     = max(timestamp.size, cavity.size)
+    if (timestamp.ndim != 1) or (cavity.ndim != 1) or \
+       (timestamp.size not in (1, n_pul)) or (cavity.size not in (1, n_pul)):
+        return False, None
+
+    # define the channels at the first appending
+    channels = arc['meta']['channels']
+    if not channels:
+        for channel, wf in data.items():
+            wf = np.asarray(wf)
+            if (not isinstance(channel, str)) or (not channel) or (os.sep in channel) or \
+               (wf.dtype.kind not in 'biufc'):
+                return False, None
+            shape = wf.shape[1:] if (n_pul > 1) or (timestamp.size + cavity.size > 2) else wf.shape
+            channels[channel] = {'dtype': wf.dtype.newbyteorder('<').str, 'shape': list(shape)}
+            os.makedirs(os.path.join(arc['path'], channel), exist_ok = True)
+        _arc_save_meta(arc)
+
+    # check the waveforms
+    if set(data.keys()) != set(channels.keys()):
+        return False, None
+    wfs = {}
+    for channel, ch in channels.items():
+        wf = np.asarray(data[channel])
+        if wf.shape == tuple(ch['shape']):
+            wf = wf[np.newaxis]
+        if wfs and (wf.shape[0] != n_pul):                     # all channels same pulses
+            return False, None
+        if (wf.shape[1:] != tuple(ch['shape'])) or \
+           (timestamp.size + cavity.size > 2 and wf.shape[0] != n_pul):
+            return False, None
+        n_pul = wf.shape[0]
+        wfs[channel] = np.ascontiguousarray(wf, dtype = np.dtype(ch['dtype']))
+
+    # write the waveforms chunk by chunk
+    chunk = arc['meta']['chunk']
+    n0    = _arc_n_pulse(arc)
+    i     = 0
+    while i < n_pul:
+        k  = (n0 + i) // chunk
+        nw = min(chunk - (n0 + i) % chunk, n_pul - i)
+        for channel, wf in wfs.items():
+            with open(_arc_chunk_file(arc, channel, k), 'ab') as f:
+                f.write(wf[i:i+nw].tobytes())
+
+        # then the index
+        index = np.empty(nw, dtype = _arc_index_dtype)
+        index['timestamp'] = timestamp[i:i+nw] if timestamp.size > 1 else timestamp[0]
+        index['cavity']    = cavity[i:i+nw]    if cavity.size    > 1 else cavity[0]
+        with open(os.path.join(arc['path'], 'index.bin'), 'ab') as f:
+            f.write(index.tobytes())
+
+        # seal the full chunk
+        i += nw
+        if (n0 + i) % chunk == 0:
+            _arc_seal(arc, k)
+    return True, np.arange(n0, n0 + n_pul)
+
+def archive_index(arc):
+    '''
+    Get the pulse index of the archive as memory-mapped (read-only) arrays.
+
+    Parameters:
+        arc:       dict, the archive handle
+
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        timestamp: numpy array, timestamp of the pulses
+        cavity:    numpy array, cavity index of the pulses
+    '''
+    n = _arc_n_pulse(arc)
+    if n == 0:
+        return True, np.zeros(0), np.zeros(0, dtype = int)
+    index = np.memmap(os.path.join(arc['path'], 'index.bin'),
+                      dtype = _arc_index_dtype,
+                      mode  = 'r',
+                      shape = (n,))
+    return True, index['timestamp'], index['cavity']
+
+def archive_query(arc, t_start = None, t_end = None, cavity = None):
+    '''
+    Find the pulses in the time range ``[t_start, t_end)`` and of the given cavities.
+
+    Parameters:
+        arc:     dict, the archive handle
+        t_start: float, start time (None for no limit)
+        t_end:   float, end time (None for no limit)
+        cavity:  int or list, cavity indices to select (None for all)
+
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        ids:     numpy array, indices of the found pulses
+    '''
+    _, ts, cav = archive_index(arc)
+
+    # time range, use binary search if the timestamps are monotonic
+    if np.all(ts[1:] >= ts[:-1]):
+        ids = np.arange(0 if t_start is None else np.searchsorted(ts, t_start, side = 'left'),
+                        ts.size if t_end is None else np.searchsorted(ts, t_end, side = 'left'))
+    else:
+        sel = np.ones(ts.size, dtype = bool)
+        if t_start is not None: sel &= ts >= t_start
+        if t_end   is not None: sel &= ts <  t_end
+        ids = np.flatnonzero(sel)
+
+    # cavities
+    if cavity is not None:
+        ids = ids[np.isin(cav[ids], np.atleast_1d(cavity))]
+    return True, ids
+
+def archive_read(arc, channel, ids = None):
+    '''
+    Read the waveforms of a channel for selected pulses. If the pulses are in a
+    single uncompressed chunk and selected with a slice, a view of the
+    memory-mapped file is returned, otherwise the waveforms are copied into a
+    new array.
+
+    Parameters:
+        arc:     dict, the archive handle
+        channel: string, name of the channel
+        ids:     slice, int or numpy array, indices of the pulses (None for all)
+
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        data:    numpy array, waveforms of the pulses (pulses x waveform shape)
+    '''
+    # check the input
+    if channel not in arc['meta']['channels']:
+        return False, None
+    ch    = arc['meta']['channels'][channel]
+    chunk = arc['meta']['chunk']
+    n     = _arc_n_pulse(arc)
+    if ids is None:
+        ids = slice(0, n)
+
+    # slice inside one chunk: return a view
+    if isinstance(ids, slice):
+        start, stop, step = ids.indices(n)
+        if (step == 1) and (stop > start) and (start // chunk == (stop - 1) // chunk):
+            k = start // chunk
+            return True, _arc_chunk(arc, channel, k, min(n - k * chunk, chunk))[start - k * chunk:stop - k * chunk]
+        ids = np.arange(start, stop, step)
+
+    # collect the pulses chunk by chunk
+    ids = np.asarray(ids)
+    if ids.ndim == 0:
+        status, data = archive_read(arc, channel, np.array([ids]))
+        return status, (data[0] if status else None)
+    ids = np.where(ids < 0, ids + n, ids)
+    if (ids.size > 0) and ((ids.min() < 0) or (ids.max() >= n)):
+        return False, None
+    data = np.empty((ids.size,) + tuple(ch['shape']), dtype = np.dtype(ch['dtype']))
+    kid  = ids // chunk
+    for k in np.unique(kid):
+        sel       = kid == k
+        wf        = _arc_chunk(arc, channel, k, min(n - k * chunk, chunk))
+        data[sel] = wf[ids[sel] - k * chunk]
+    return True, data
+
+def archive_from_mat(arc, file_name, channels = None, pulse_axis = None, timestamp = None, cavity = 0):
+    '''
+    Import the waveforms in a Matlab .mat file (e.g., saved by ``save_mat``). The
+    numeric arrays are imported as channels and the scalars are kept as the
+    attributes of the archive (exported again by ``archive_to_mat``).
+
+    Parameters:
+        arc:        dict, the archive handle
+        file_name:  string, full file name including path
+        channels:   list, names of the variables to import (None for all arrays)
+        pulse_axis: int, axis of the arrays along which the pulses are stacked
+                     (None if the file contains a single pulse)
+        timestamp:  float or numpy array, timestamp of the pulses, modification
+                     time of the file if None
+        cavity:     int or numpy array, index of the cavity of the pulses
+
+    Returns:
+        status:     boolean, success (True) or fail (False)
+        ids:        numpy array, indices of the imported pulses in the archive
+    '''
+    # load the file
+    try:
+        mat = load_mat(file_name)
+    except Exception:
+        return False, None
+
+    # separate the waveforms and the attributes
+    data = {}
+    for name, value in mat.items():
+        if name.startswith('__'):
+            continue
+        if isinstance(value, np.ndarray) and (value.ndim > 0) and (value.dtype.kind in 'biufc'):
+            if (channels is None) or (name in channels):
+                data[name] = value if pulse_axis is None else np.moveaxis(value, pulse_axis, 0)
+        elif isinstance(value, (int, float, np.integer, np.floating)):
+            arc['meta']['attrs'].setdefault(name, value.item() if hasattr(value, 'item') else value)
+    if not data:
+        return False, None
+
+    # append the pulses
+    if timestamp is None:
+        timestamp = os.path.getmtime(file_name)
+    if pulse_axis is not None:
+        n_pul     = next(iter(data.values())).shape[0]
+        timestamp = np.broadcast_to(timestamp, (n_pul,))
+    status, ids = archive_append(arc, data, timestamp = timestamp, cavity = cavity)
+    if status:
+        _arc_save_meta(arc)
+    return status, ids
+
+def archive_to_mat(arc, file_name, channels = None, ids = None):
+    '''
+    Export the selected pulses/channels into a Matlab .mat file with ``save_mat``.
+    The waveforms of a single pulse are saved as they were appended, for more
+    pulses they are stacked along the first dimension. The pulse index is saved
+    as the variables ``timestamp`` and ``cavity``.
+
+    Parameters:
+        arc:       dict, the archive handle
+        file_name: string, full file name including path
+        channels:  list, names of the channels to export (None for all)
+        ids:       slice, int or numpy array, indices of the pulses (None for all)
+
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    # collect the data
+    data = dict(arc['meta']['attrs'])
+    for channel in (arc['meta']['channels'] if channels is None else channels):
+        status, data[channel] = archive_read(arc, channel, ids)
+        if not status:
+            return False
+        data[channel] = np.asarray(data[channel])
+        if (data[channel].ndim > 1) and (data[channel].shape[0] == 1):
+            data[channel] = data[channel][0]
+
+    # pulse index
+    _, ts, cav = archive_index(arc)
+    sel = np.arange(ts.size)[slice(None) if ids is None else ids]
+    data['timestamp'] = np.asarray(ts[sel])
+    data['cavity']    = np.asarray(cav[sel])
+    return save_mat(data, file_name)
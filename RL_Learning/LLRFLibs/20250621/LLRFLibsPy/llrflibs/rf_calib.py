@@ -12,9 +12,25 @@ Implemented:
     - calib_vprobe       : calib. cavity virtual probe with forward/reflected signals
     - calib_dac_offs     : calib. DAC offset with I/Q modulator direct upconversion
     - calib_iqmod        : calib. I/Q modulator imbalance with direct upconversion
+    - calib_iqmod_accum  : accumulate the normal equations of ``calib_iqmod`` chunk by chunk
+    - calib_iqmod_result : solve the accumulated ``calib_iqmod`` problem with residual
+    - calib_dac_offs_accum : accumulate the window averages of ``calib_dac_offs`` pulse by pulse
+    - calib_dac_offs_result: get the DAC offset from the accumulation with its spread
     - calib_cav_for      : calib. cavity forward signal using forward and probe
     - calib_ncav_for_ref : calib. cavity forward/reflected signals with constant QL and detuning
     - calib_scav_for_ref : calib. cavity forward/reflected signals with time-varying QL and detuning
+    - calib_vprobe_batch : calib. cavity virtual probe of multiple pulses at once
+    - calib_cav_for_batch: calib. cavity forward signal of multiple pulses at once
+    - calib_for_ref_batch: calib. cavity forward/reflected signals of multiple pulses at once
+    - calib_delay        : calib. relative delays between waveforms (FFT cross-correlation)
+    - shift_wf           : shift waveforms by fractional delays in frequency domain
+    - align_wfs          : align waveforms to the reference waveforms in time
+    - calib_store_open   : open (or create) a store of calibration coefficients with history
+    - calib_store_save   : save the calibration store to file
+    - calib_store_put    : add a set of calibration coefficients of a cavity/channel
+    - calib_store_get    : get the current (or historical) calibration coefficients
+    - calib_drift_check  : check the forward/reflected calibration with new pulses
+    - calib_store_update : recalibrate the forward/reflected signals of drifted cavities only
     - for_ref_volt2power : calib. forward/reflected power from forward/reflected voltage
     - phasing_energy     : calib. energy gain and beam phase with phase scan and energy meas.
     - egain_cav_power    : est. steady-state standing-wave cavity voltage from drive power
@@ -31,6 +47,9 @@ S. Simrock and Z. Geng, Low-Level Radio Frequency Systems, Springer, 2022
 https://link.springer.com/book/10.1007/978-3-030-94419-3 ("LLRF Book")
 #########################################################################
 '''
+import os
+import time
+import bisect
 import numpy as np
 
 from llrflibs.rf_sysid import *
@@ -79,7 +98,7 @@ def calib_dac_offs(vdac, viqm, sig_ids, sig_ide, leak_ids, leak_ide, delay = 0):
         leak_ide: int, ending index of leakage
         delay :   int, delay in number of points between I/Q out and DAC WFs,
                         it is needed to be set reflecting the actual delay for
-                        better results
+                        better results (can be calibrated with ``calib_delay``)
     Returns:
         status:   boolean, success (True) or fail (False)
         offset_I: float, I offset to be added to the actual DAC output
@@ -135,10 +154,10 @@ def calib_iqmod(vdac, viqm):
     # scale & rotate the I/Q modulator output to align with DAC
     viqm_s = np.mean(vdac/viqm) * viqm
 
-    # calibrate with least-square method
+    # calibrate with least-square method (solve U.T * M.T = Y.T without inversion)
     Y = np.matrix(np.vstack((np.real(viqm_s), np.imag(viqm_s))))
     U = np.matrix(np.vstack((np.real(vdac), np.imag(vdac), np.ones(vdac.shape[0]))))
-    M = Y * U.T * np.linalg.inv(U * U.T)
+    M = np.matrix(np.linalg.lstsq(U.T, Y.T, rcond = None)[0].T)
 
     # reconstruct the scaled output
     Y_t = np.array(M * U)
@@ -146,6 +165,204 @@ def calib_iqmod(vdac, viqm):
 
     return True, np.linalg.inv(M[:2, :2]), viqm_s, viqm_c
 
+def calib_iqmod_accum(vdac, viqm, state = None):
+    '''
+    Accumulate the normal equations of the I/Q modulator imbalance calibration 
+    (see ``calib_iqmod``) chunk by chunk, so that the calibration can run 
+    concurrently with the acquisition of a long DAC sweep with constant memory.
+    The residual of each chunk with the solution before the update is tracked.
+    Use ``calib_iqmod_result`` to get the calibration at any time.
+ 
+    Parameters:
+        vdac:   numpy array (complex), DAC actuation points of the chunk
+        viqm:   numpy array (complex), I/Q modulator meas. points of the chunk
+        state:  dict, state returned by the last call (None to start a new
+                 accumulation)
+        
+    Returns:
+        status: boolean, success (True) or fail (False). If failed (e.g., a chunk
+                 with mismatched shapes or zero I/Q modulator output), the chunk
+                 is not accumulated and the input state is returned unchanged
+        state:  dict, accumulated sums, input to the next call
+    '''
+    # check the input
+    vdac = np.ravel(vdac)
+    viqm = np.ravel(viqm)
+    if (vdac.shape != viqm.shape) or (vdac.shape[0] < 1):
+        return False, state
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio = np.sum(vdac / viqm)
+    if not np.isfinite(ratio):
+        return False, state
+
+    if state is None:
+        state = {'n':         0,
+                 'ratio_sum': 0.0 + 0.0j,               # sum of vdac/viqm for the scaling
+                 'UU':        np.zeros((3, 3)),         # sum of U * U.T
+                 'YU':        np.zeros((2, 3)),         # sum of Y * U.T (unscaled Y)
+                 'YY':        np.zeros((2, 2)),         # sum of Y * Y.T (unscaled Y)
+                 'res_chunk': None}
+
+    U = np.vstack((np.real(vdac), np.imag(vdac), np.ones(vdac.shape[0])))
+    Y = np.vstack((np.real(viqm), np.imag(viqm)))
+
+    # residual of the chunk with the current solution (unscaled)
+    if state['n'] > 3:
+        M0 = _calib_iqmod_solve(state)
+        state['res_chunk'] = np.sqrt(np.mean(np.sum((Y - M0 @ U)**2, axis = 0)))
+
+    # accumulate
+    state['n']         += vdac.shape[0]
+    state['ratio_sum'] += ratio
+    state['UU']        += U @ U.T
+    state['YU']        += Y @ U.T
+    state['YY']        += Y @ Y.T
+    return True, state
+
+def _calib_iqmod_solve(state):
+    '''
+    Solve the accumulated normal equations ``M0 * UU = YU`` for the unscaled
+    I/Q modulator output (least-square solution without explicit inversion).
+    '''
+    return np.linalg.lstsq(state['UU'], state['YU'].T, rcond = None)[0].T
+
+def calib_iqmod_result(state):
+    '''
+    Get the I/Q modulator imbalance calibration from the accumulated normal 
+    equations, the results are the same as ``calib_iqmod`` with all data.
+ 
+    Parameters:
+        state:  dict, state of ``calib_iqmod_accum``
+        
+    Returns:
+        result: dict, with the following items:
+                 ``status``: boolean, success (True) or fail (False);
+                 ``invM``: numpy matrix, inversion of M (see ``calib_iqmod``);
+                 ``M``: numpy array, fitted matrix including the offset (2 x 3);
+                 ``scale``: complex, scaling of the I/Q modulator output;
+                 ``res_rms``: float, RMS residual of all points (scaled output);
+                 ``res_chunk``: float, RMS residual of the last chunk before the
+                 update (unscaled output);
+                 ``n``: int, number of points
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (state is None) or (state['n'] < 3):
+        return result
+
+    # solve for the unscaled output and apply the scaling (rotation & scale)
+    M0 = _calib_iqmod_solve(state)
+    sc = state['ratio_sum'] / state['n']
+    R  = np.array([[np.real(sc), -np.imag(sc)], 
+                   [np.imag(sc),  np.real(sc)]])
+    M  = R @ M0
+
+    # residual sum of squares from the accumulated sums
+    rss = np.trace(state['YY']) - 2 * np.trace(M0 @ state['YU'].T) + \
+          np.trace(M0 @ state['UU'] @ M0.T)
+    
+    result['invM']      = np.matrix(np.linalg.inv(M[:2, :2]))
+    result['M']         = M
+    result['scale']     = sc
+    result['res_rms']   = np.abs(sc) * np.sqrt(max(rss, 0.0) / state['n'])
+    result['res_chunk'] = state['res_chunk']
+    result['n']         = state['n']
+    result['status']    = True
+    return result
+
+def calib_dac_offs_accum(vdac, viqm, sig_ids, sig_ide, leak_ids, leak_ide, delay = 0, state = None):
+    '''
+    Accumulate the window averages of the DAC offset calibration (see 
+    ``calib_dac_offs``) pulse by pulse. Use ``calib_dac_offs_result`` to get the
+    calibration at any time.
+    
+    Parameters:
+        vdac:     numpy array (complex), DAC output waveform(s), (samples,) or 
+                   (pulses x samples)
+        viqm:     numpy array (complex), I/Q modulator output meas. waveform(s)
+        sig_ids:  int, starting index of signals
+        sig_ide:  int, ending index of signals
+        leak_ids: int, starting index of leakage
+        leak_ide: int, ending index of leakage
+        delay :   int, delay in number of points between I/Q out and DAC WFs
+        state:    dict, state returned by the last call (None to start a new
+                   accumulation)
+    Returns:
+        status:   boolean, success (True) or fail (False). If failed (e.g., a pulse
+                   too short for the windows or with zero leakage step), the pulses
+                   are not accumulated and the input state is returned unchanged
+        state:    dict, accumulated sums, input to the next call
+    '''
+    # check the input
+    vdac = np.atleast_2d(vdac)
+    viqm = np.atleast_2d(viqm)
+    N    = vdac.shape[-1]
+    if vdac.shape != viqm.shape or \
+       sig_ids  < 0 or sig_ide  < 0 or \
+       leak_ids < 0 or leak_ide < 0 or \
+       (sig_ids  + delay) >= N or (sig_ide  + delay) >= N or \
+       (leak_ids + delay) >= N or (leak_ide + delay) >= N or \
+       sig_ids >= sig_ide or leak_ids >= leak_ide:
+        return False, state
+
+    # window averages of each pulse
+    avg = np.vstack((np.mean(vdac[:, sig_ids  : sig_ide],  axis = -1),
+                     np.mean(vdac[:, leak_ids : leak_ide], axis = -1),
+                     np.mean(viqm[:, sig_ids  + delay : sig_ide  + delay], axis = -1),
+                     np.mean(viqm[:, leak_ids + delay : leak_ide + delay], axis = -1)))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        voff = -(avg[0] - avg[1]) / (avg[2] - avg[3]) * avg[3]
+    if not np.all(np.isfinite(voff)):
+        return False, state
+
+    # accumulate
+    if state is None:
+        state = {'n':        0,
+                 'sums':     np.zeros(4, dtype = complex),   # sums of window averages
+                 'offs_sum': 0.0 + 0.0j,                     # sum of offsets of pulses
+                 'offs_sq':  0.0}                            # sum of squared offsets
+
+    state['n']        += vdac.shape[0]
+    state['sums']     += np.sum(avg, axis = -1)
+    state['offs_sum'] += np.sum(voff)
+    state['offs_sq']  += np.sum(np.abs(voff)**2)
+    return True, state
+
+def calib_dac_offs_result(state):
+    '''
+    Get the DAC offset calibration from the accumulated window averages, the
+    offset is derived from the window averages over all pulses.
+    
+    Parameters:
+        state:      dict, state of ``calib_dac_offs_accum``
+    Returns:
+        result:     dict, with the following items:
+                     ``status``: boolean, success (True) or fail (False);
+                     ``offset_I``, ``offset_Q``: float, I/Q offsets to be added 
+                     to the actual DAC output;
+                     ``offset_std``: float, standard deviation of the offsets
+                     derived from the individual pulses;
+                     ``n``: int, number of pulses
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (state is None) or (state['n'] < 1):
+        return result
+
+    n    = state['n']
+    avg  = state['sums'] / n
+    voff = -(avg[0] - avg[1]) / (avg[2] - avg[3]) * avg[3]
+    mean = state['offs_sum'] / n
+
+    result['offset_I']   = np.real(voff)
+    result['offset_Q']   = np.imag(voff)
+    result['offset_std'] = np.sqrt(max(state['offs_sq'] / n - np.abs(mean)**2, 0.0))
+    result['n']          = n
+    result['status']     = True
+    return result
+
 def calib_cav_for(vc, vf_m, pul_ids, pul_ide, half_bw, detuning, Ts, beta = 1e4):
     '''
     Calibrate the cavity forward signal: ``vf = a * vf_m``. The resulting ``vf`` is
@@ -309,6 +526,554 @@ def calib_scav_for_ref(vc, vf_m, vr_m, pul_ids, pul_ide, decay_ids, decay_ide,
     # finally return the results
     return True, a, b, c, d
 
+def _lsq2_batch(y, x1, x2):
+    '''
+    Solve the least-square problems ``y = p * x1 + q * x2`` (complex) along the
+    last axis of the arrays at once with the closed-form solution of the 2x2 
+    normal equations. Return ``p``, ``q`` and the relative RMS residual.
+    '''
+    G11 = np.sum(np.abs(x1)**2,      axis = -1)
+    G22 = np.sum(np.abs(x2)**2,      axis = -1)
+    G12 = np.sum(np.conj(x1) * x2,   axis = -1)
+    r1  = np.sum(np.conj(x1) * y,    axis = -1)
+    r2  = np.sum(np.conj(x2) * y,    axis = -1)
+    det = G11 * G22 - np.abs(G12)**2
+
+    p   = (G22 * r1 - G12 * r2) / det
+    q   = (G11 * r2 - np.conj(G12) * r1) / det
+    res = np.sqrt(np.sum(np.abs(y - p[..., np.newaxis] * x1 - q[..., np.newaxis] * x2)**2, axis = -1) / 
+                  np.sum(np.abs(y)**2, axis = -1))
+    return p, q, res
+
+def calib_vprobe_batch(vc, vf_m, vr_m):
+    '''
+    Calibrate the virtual probe signals of multiple pulses at once, see 
+    ``calib_vprobe``. The least-square problems of all pulses are solved together.
+    
+    Parameters:
+         vc:   numpy array (complex), cavity probe waveforms, e.g., (pulses x samples)
+         vf_m: numpy array (complex), cavity forward waveforms (meas.)
+         vr_m: numpy array (complex), cavity reflected waveforms (meas.)
+         
+    Returns:
+        status: boolean, success (True) or fail (False)
+        m, n:   numpy array (complex), calibration coefficients of each pulse
+        res:    numpy array, relative RMS residual of the fitting of each pulse
+    '''
+    # check the input
+    if (not (vc.shape == vf_m.shape == vr_m.shape)) or (vc.shape[-1] < 3):
+        return (False,) + (None,)*3
+
+    m, n, res = _lsq2_batch(vc, vf_m, vr_m)
+    return True, m, n, res
+
+def calib_cav_for_batch(vc, vf_m, pul_ids, pul_ide, half_bw, detuning, Ts, beta = 1e4):
+    '''
+    Calibrate the cavity forward signals of multiple pulses at once, see 
+    ``calib_cav_for``: ``vf = a * vf_m``.
+    
+    Parameters:
+        vc:       numpy array (complex), cavity probe waveforms, e.g., (pulses x samples)
+        vf_m:     numpy array (complex), cavity forward waveforms (meas.)
+        pul_ids:  int, starting index for calculation
+        pul_ide:  int, ending index for calculation 
+        half_bw:  float, half bandwidth of the cavity, rad/s
+        detuning: float, detuning of the cavity, rad/s
+        Ts:       float, sampling time, s
+        beta:     float, input coupling factor (see ``calib_cav_for``)
+                   
+    Returns:
+        status:   boolean, success (True) or fail (False)
+        a:        numpy array (complex), calibrate coefficient of each pulse
+    
+    Note: 
+        The waveforms should have been aligned in time, i.e., the relative delays between them should have been removed.
+    '''
+    # check the input
+    if (not (vc.shape == vf_m.shape)) or (vc.shape[-1] < 3) or \
+       (pul_ids < 0) or (pul_ide <= pul_ids) or (Ts <= 0) or \
+       (half_bw <= 0):
+        return False, None
+
+    # estimate the theoritical forward from probe
+    status, vf_est, _ = cav_drv_est(vc, half_bw, Ts, detuning, beta)
+    if not status:
+        return False, None
+
+    # make the calibration
+    return True, np.mean(vf_est[..., pul_ids:pul_ide], axis = -1) / \
+                 np.mean(vf_m  [..., pul_ids:pul_ide], axis = -1)
+
+def calib_for_ref_batch(vc, vf_m, vr_m, pul_ids, pul_ide, half_bw, detuning, Ts, 
+                        beta = None, decay_ids = None, decay_ide = None):
+    '''
+    Calibrate the cavity forward and reflected signals of multiple pulses at once:
+    ``vf = a * vf_m + b * vr_m, vr = c * vf_m + d * vr_m``. Without the decay 
+    window, the method of ``calib_ncav_for_ref`` (constant loaded Q and detuning)
+    is used, otherwise the method of ``calib_scav_for_ref`` (time-varying loaded Q
+    or detuning) is used.
+    
+    Refer to LLRF Book section 9.3.5.
+    
+    Parameters:
+        vc:        numpy array (complex), cavity probe waveforms, e.g., (pulses x samples)
+        vf_m:      numpy array (complex), cavity forward waveforms (meas.)
+        vr_m:      numpy array (complex), cavity reflected waveforms (meas.)
+        pul_ids:   int, starting index for calculation
+        pul_ide:   int, ending index for calculation
+        half_bw:   float, half bandwidth of the cavity, rad/s
+        detuning:  float, detuning of the cavity, rad/s
+        Ts:        float, sampling time, s
+        beta:      float, input coupling factor (None for the default of the method:
+                    1.0 as ``calib_ncav_for_ref``, 1e4 as ``calib_scav_for_ref``)
+        decay_ids: int, starting id of calculation window at decay stage (SC cavities)
+        decay_ide: int, ending id of calculation window at decay stage (SC cavities)
+                    
+    Returns:
+        result:    dict, with the following items:
+                    ``status``: boolean, success (True) or fail (False);
+                    ``a``, ``b``, ``c``, ``d``: numpy array (complex), calibration
+                    coefficients of each pulse;
+                    ``m``, ``n``: numpy array (complex), virtual probe coefficients
+                    (see ``calib_vprobe``);
+                    ``res_vprobe``: numpy array, relative RMS residual of the
+                    virtual probe fitting;
+                    ``res_vf``: numpy array, relative RMS error of the calibrated
+                    forward signal to the estimation from probe in the window
+    
+    Note: 
+        The waveforms should have been aligned in time, i.e., the relative delays between them should have been removed.
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (not (vc.shape == vf_m.shape == vr_m.shape)) or (vc.shape[-1] < 3) or \
+       (pul_ids < 0) or (pul_ide <= pul_ids) or (Ts <= 0) or (half_bw <= 0):
+        return result
+    scav = (decay_ids is not None) and (decay_ide is not None)
+    if scav and ((decay_ids < 0) or (decay_ide <= decay_ids)):
+        return result
+    if beta is None:
+        beta = 1e4 if scav else 1.0
+
+    # estimate the theoritical forward signals from probe
+    status, vf_est, _ = cav_drv_est(vc, half_bw, Ts, detuning, beta)
+    if not status:
+        return result
+
+    # calibrate the virtual probe to get: vc = m * vf_m + n * vr_m
+    status, m, n, res_vprobe = calib_vprobe_batch(vc, vf_m, vr_m)
+    if not status:
+        return result
+
+    # calibrate the forward signal in the window
+    vf_w = vf_est[..., pul_ids:pul_ide]
+    vfm_w = vf_m [..., pul_ids:pul_ide]
+    vrm_w = vr_m [..., pul_ids:pul_ide]
+    if scav:
+        z = -np.mean(vf_m[..., decay_ids:decay_ide], axis = -1) / \
+             np.mean(vr_m[..., decay_ids:decay_ide], axis = -1)             # z = b/a from decay
+        a = np.mean(vf_w, axis = -1) / np.mean(vfm_w + z[..., np.newaxis] * vrm_w, axis = -1)
+        b = a * z
+    else:
+        a, b, _ = _lsq2_batch(vf_w, vfm_w, vrm_w)
+
+    res_vf = np.sqrt(np.sum(np.abs(vf_w - a[..., np.newaxis] * vfm_w - b[..., np.newaxis] * vrm_w)**2, axis = -1) /
+                     np.sum(np.abs(vf_w)**2, axis = -1))
+
+    # finally return the results
+    result.update({'a': a, 'b': b, 'c': m - a, 'd': n - b, 'm': m, 'n': n,
+                   'res_vprobe': res_vprobe, 'res_vf': res_vf, 'status': True})
+    return result
+
+def calib_delay(ref, sig, method = 'parabolic', max_lag = None):
+    '''
+    Calibrate the relative delays between waveforms with the FFT cross-correlation,
+    i.e., ``sig[n] = ref[n - delay]``. The integer delay at the correlation peak is 
+    refined to sub-sample resolution by parabolic interpolation of the peak, or
+    by the slope of the cross-spectrum phase. Many waveform pairs can be processed
+    at once with the samples along the last axis (``ref`` and ``sig`` are 
+    broadcast, e.g., one reference for many channels). The waveforms should have
+    similar shapes, e.g., DAC output and I/Q modulator output, or forward signals 
+    of different channels.
+    
+    Parameters:
+        ref:     numpy array (complex), reference waveforms, (..., samples)
+        sig:     numpy array (complex), waveforms to be calibrated, (..., samples)
+        method:  string, ``parabolic`` or ``phase`` for the sub-sample refinement
+        max_lag: int, maximum absolute delay to search, number of points (None 
+                  to search all possible delays)
+                  
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        delay:   numpy array (float, or a float number for 1D inputs), delays of 
+                  ``sig`` with respect to ``ref``, number of points
+        corr:    numpy array, normalized correlation at the peak (0 to 1)
+    '''
+    # check the input
+    ref = np.asarray(ref)
+    sig = np.asarray(sig)
+    if (ref.shape[-1] != sig.shape[-1]) or (ref.shape[-1] < 3) or \
+       (method not in ('parabolic', 'phase')):
+        return False, None, None
+
+    # cross-correlation (zero padded to avoid circular wrapping)
+    N    = ref.shape[-1]
+    nfft = int(2**np.ceil(np.log2(2 * N)))
+    R    = np.fft.fft(ref, n = nfft, axis = -1)
+    S    = np.fft.fft(sig, n = nfft, axis = -1)
+    X    = np.conj(R) * S                               # cross spectrum
+    cc   = np.abs(np.fft.ifft(X, axis = -1))            # lag k at index k (negative lags wrapped)
+
+    # search the peak within the allowed lags
+    lags = np.fft.fftfreq(nfft) * nfft
+    max_lag = N - 1 if max_lag is None else min(int(max_lag), N - 1)
+    cc_s = np.where(np.abs(lags) <= max_lag, cc, -1.0)
+    kpk  = np.argmax(cc_s, axis = -1)
+    pk   = np.take_along_axis(cc, kpk[..., np.newaxis], axis = -1)[..., 0]
+    delay = lags[kpk]
+
+    # refine the delay
+    if method == 'parabolic':
+        ym = np.take_along_axis(cc, ((kpk - 1) % nfft)[..., np.newaxis], axis = -1)[..., 0]
+        yp = np.take_along_axis(cc, ((kpk + 1) % nfft)[..., np.newaxis], axis = -1)[..., 0]
+        den = ym - 2 * pk + yp
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            frac = np.where(den < 0, 0.5 * (ym - yp) / den, 0.0)
+        delay = delay + np.clip(frac, -0.5, 0.5)
+    else:
+        # remove the integer delay and the mean phase, then fit the phase slope (with
+        # constant phase offset) weighted by the cross-spectrum magnitude. The residual
+        # phase of the signal bins is within +-pi/2 (residual delay within +-0.5 point),
+        # so no unwrapping is needed; only the bins with magnitude above a fraction of
+        # the peak are used, the noise-only bins have random phase
+        f   = np.fft.fftfreq(nfft)
+        Xr  = X * np.exp(2j * np.pi * f * delay[..., np.newaxis])
+        Xr *= np.exp(-1j * np.angle(np.sum(Xr, axis = -1, keepdims = True)))
+        w   = np.abs(Xr)
+        w   = np.where(w >= 0.1 * np.max(w, axis = -1, keepdims = True), w, 0.0)
+        pha = np.angle(Xr)
+        sw  = np.sum(w, axis = -1, keepdims = True)
+        fm  = np.sum(w * f, axis = -1, keepdims = True) / sw
+        pm  = np.sum(w * pha, axis = -1, keepdims = True) / sw
+        k   = np.sum(w * (f - fm) * (pha - pm), axis = -1) / np.sum(w * (f - fm)**2, axis = -1)
+        delay = delay - k / (2 * np.pi)
+
+    # normalized correlation
+    corr = pk / np.sqrt(np.sum(np.abs(ref)**2, axis = -1) * np.sum(np.abs(sig)**2, axis = -1))
+
+    if np.ndim(delay) == 0:
+        delay = float(delay)
+    return True, delay, corr
+
+def shift_wf(wf, delay):
+    '''
+    Delay waveforms by fractional number of points in frequency domain (a 
+    positive delay moves the waveform later in time). The waveforms are zero 
+    padded to avoid the circular wrapping.
+    
+    Parameters:
+        wf:      numpy array (complex), waveforms, (..., samples)
+        delay:   float or numpy array (broadcast with ``wf`` excluding the last 
+                  axis), delays, number of points
+                  
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        wf_s:    numpy array, shifted waveforms with the same shape as ``wf``
+    '''
+    # check the input
+    wf    = np.asarray(wf)
+    delay = np.asarray(delay, dtype = float)
+    if wf.shape[-1] < 2:
+        return False, None
+
+    # shift with the linear phase
+    N    = wf.shape[-1]
+    nfft = int(2**np.ceil(np.log2(N + np.ceil(np.max(np.abs(delay))) + 1)))
+    pha  = np.exp(-2j * np.pi * np.fft.fftfreq(nfft) * delay[..., np.newaxis])
+    if np.isrealobj(wf):
+        pha  = np.exp(-2j * np.pi * np.fft.rfftfreq(nfft) * delay[..., np.newaxis])
+        wf_s = np.fft.irfft(np.fft.rfft(wf, n = nfft, axis = -1) * pha, n = nfft, axis = -1)
+    else:
+        wf_s = np.fft.ifft(np.fft.fft(wf, n = nfft, axis = -1) * pha, axis = -1)
+    return True, wf_s[..., :N]
+
+def align_wfs(ref, sig, method = 'parabolic', max_lag = None):
+    '''
+    Align waveforms to the reference waveforms in time, i.e., calibrate the 
+    delays with ``calib_delay`` and remove them with ``shift_wf``.
+    
+    Parameters:
+        ref:     numpy array (complex), reference waveforms, (..., samples)
+        sig:     numpy array (complex), waveforms to be aligned, (..., samples)
+        method:  string, ``parabolic`` or ``phase`` (see ``calib_delay``)
+        max_lag: int, maximum absolute delay to search, number of points
+                  
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        sig_a:   numpy array (complex), aligned waveforms
+        delay:   numpy array, removed delays, number of points
+    '''
+    status, delay, _ = calib_delay(ref, sig, method = method, max_lag = max_lag)
+    if not status:
+        return False, None, None
+
+    status, sig_a = shift_wf(sig, -np.broadcast_to(delay, np.broadcast_shapes(np.shape(ref), np.shape(sig))[:-1]))
+    return status, sig_a, delay
+
+def calib_store_open(file_name = None):
+    '''
+    Open a store of calibration coefficients. The store keeps all coefficient
+    sets of each cavity/channel with timestamps (history), and an index to the
+    current set for the O(1) lookup. The store is saved as a compressed ``.npz``
+    file with ``calib_store_save``.
+    
+    Parameters:
+        file_name: string, file of the store (None for a store only in memory).
+                    A new store is created if the file does not exist
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        store:     dict, the calibration store
+    '''
+    store = {'file':  file_name,
+             'recs':  [],               # records: (time, cavity, channel, coefs, res)
+             'hist':  {},               # (cavity, channel) -> record ids sorted by time
+             'times': {},               # (cavity, channel) -> times of the record ids
+             'index': {}}               # (cavity, channel) -> current record id
+    if (file_name is None) or (not os.path.isfile(file_name)):
+        return True, store
+
+    # load the records (the coefficients are stored as one flattened array)
+    try:
+        with np.load(file_name, allow_pickle = False) as data:
+            arr = {k: data[k] for k in ('time', 'cavity', 'channel', 'res', 'names', 'rec',
+                                        'ndim', 'shape', 'is_cplx', 'offs', 'data')}
+    except (OSError, KeyError, ValueError):
+        return False, None
+
+    # group the coefficients by record once
+    offs  = arr['offs']
+    order = np.argsort(arr['rec'], kind = 'stable')
+    bnds  = np.searchsorted(arr['rec'][order], np.arange(arr['time'].shape[0] + 1))
+    for i in range(arr['time'].shape[0]):
+        coefs = {}
+        for j in order[bnds[i]:bnds[i + 1]]:
+            shape = tuple(arr['shape'][j][:arr['ndim'][j]])
+            val   = arr['data'][offs[j]:offs[j + 1]].reshape(shape)[()]
+            coefs[str(arr['names'][j])] = val if arr['is_cplx'][j] else np.real(val)
+        calib_store_put(store, str(arr['cavity'][i]), str(arr['channel'][i]), coefs,
+                        timestamp = float(arr['time'][i]), 
+                        res       = float(arr['res'][i]))
+    return True, store
+
+def calib_store_save(store, file_name = None):
+    '''
+    Save the calibration store to file.
+    
+    Parameters:
+        store:     dict, the calibration store
+        file_name: string, file to save (None to use the file of the store)
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    file_name = store['file'] if file_name is None else file_name
+    if file_name is None:
+        return False
+
+    # flatten the coefficients
+    names, rec, ndim, shape, is_cplx, vals = [], [], [], [], [], []
+    for i, (_, _, _, coefs, _) in enumerate(store['recs']):
+        for name, val in coefs.items():
+            val = np.atleast_1d(np.asarray(val))
+            if val.ndim > 2:
+                return False
+            names.append(name)
+            rec.append(i)
+            ndim.append(np.ndim(coefs[name]))
+            shape.append(list(val.shape) + [0] * (2 - val.ndim))
+            is_cplx.append(np.iscomplexobj(val))
+            vals.append(val.ravel().astype(complex))
+    offs = np.cumsum([0] + [v.shape[0] for v in vals])
+
+    # write to a temporary file first, not to corrupt the store if interrupted
+    try:
+        with open(file_name + '.tmp', 'wb') as f:
+            np.savez_compressed(f,
+                time    = np.array([r[0] for r in store['recs']], dtype = float),
+                cavity  = np.array([r[1] for r in store['recs']], dtype = str),
+                channel = np.array([r[2] for r in store['recs']], dtype = str),
+                res     = np.array([r[4] for r in store['recs']], dtype = float),
+                names   = np.array(names, dtype = str),
+                rec     = np.array(rec,   dtype = int),
+                ndim    = np.array(ndim,  dtype = int),
+                shape   = np.array(shape, dtype = int).reshape((-1, 2)),
+                is_cplx = np.array(is_cplx, dtype = bool),
+                offs    = offs,
+                data    = np.concatenate(vals) if vals else np.zeros(0, dtype = complex))
+        os.replace(file_name + '.tmp', file_name)
+        store['file'] = file_name
+        return True
+    except OSError:
+        return False
+
+def calib_store_put(store, cavity, channel, coefs, timestamp = None, res = np.nan):
+    '''
+    Add a set of calibration coefficients of a cavity/channel to the store.
+    
+    Parameters:
+        store:     dict, the calibration store
+        cavity:    string, name of the cavity
+        channel:   string, name of the channel or the calibration, e.g., 
+                    ``for_ref``, ``iqmod``, ``dac_offs``
+        coefs:     dict, coefficients (scalars or arrays up to 2D), e.g., 
+                    ``{'a': a, 'b': b, 'c': c, 'd': d, 'm': m, 'n': n}``
+        timestamp: float, time of the calibration, s (None for the current time)
+        res:       float, residual of the calibration as reference for the drift
+                    check (see ``calib_drift_check``)
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    if not isinstance(coefs, dict):
+        return False
+
+    timestamp = time.time() if timestamp is None else float(timestamp)
+    key  = (str(cavity), str(channel))
+    rid  = len(store['recs'])
+    store['recs'].append((timestamp, key[0], key[1], dict(coefs), float(res)))
+
+    # keep the history sorted by time and the index to the latest set
+    hist  = store['hist'].setdefault(key, [])
+    times = store['times'].setdefault(key, [])
+    pos   = bisect.bisect_right(times, timestamp)
+    hist.insert(pos, rid)
+    times.insert(pos, timestamp)
+    store['index'][key] = hist[-1]
+    return True
+
+def calib_store_get(store, cavity, channel, timestamp = None):
+    '''
+    Get the calibration coefficients of a cavity/channel.
+    
+    Parameters:
+        store:     dict, the calibration store
+        cavity:    string, name of the cavity
+        channel:   string, name of the channel or the calibration
+        timestamp: float, get the set valid at this time, s (None for the current set)
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        coefs:     dict, coefficients
+        t_cal:     float, time of the calibration, s
+        res:       float, residual of the calibration
+    '''
+    key = (str(cavity), str(channel))
+    if key not in store['index']:
+        return False, None, None, None
+
+    if timestamp is None:
+        rid = store['index'][key]
+    else:
+        hist  = store['hist'][key]
+        pos   = bisect.bisect_right(store['times'][key], timestamp)
+        if pos == 0:
+            return False, None, None, None
+        rid = hist[pos - 1]
+
+    t_cal, _, _, coefs, res = store['recs'][rid]
+    return True, coefs, t_cal, res
+
+def calib_drift_check(store, cavity, vc, vf_m, vr_m, tol = 2.0, res_floor = 1e-3):
+    '''
+    Check if the forward/reflected calibration of a cavity has drifted with 
+    new pulses. The cheap check reconstructs the probe signal with the stored
+    virtual probe coefficients (``vc = m * vf_m + n * vr_m``), the calibration
+    is regarded as drifted if the relative RMS residual exceeds ``tol`` times
+    the residual at the calibration (or ``res_floor``).
+    
+    Parameters:
+        store:     dict, the calibration store
+        cavity:    string, name of the cavity (channel ``for_ref``)
+        vc:        numpy array (complex), cavity probe waveform(s), (..., samples)
+        vf_m:      numpy array (complex), cavity forward waveform(s) (meas.)
+        vr_m:      numpy array (complex), cavity reflected waveform(s) (meas.)
+        tol:       float, tolerance factor of the residual
+        res_floor: float, minimum reference residual
+    Returns:
+        status:    boolean, success (True) or fail (False), fail if not calibrated
+        drifted:   boolean, True if the residual of any pulse exceeds the limit
+        res:       numpy array, relative RMS residual of each pulse
+    '''
+    status, coefs, _, res_ref = calib_store_get(store, cavity, 'for_ref')
+    if (not status) or ('m' not in coefs) or ('n' not in coefs) or \
+       (not (vc.shape == vf_m.shape == vr_m.shape)):
+        return False, None, None
+
+    m, n = np.mean(coefs['m']), np.mean(coefs['n'])
+    res  = np.sqrt(np.sum(np.abs(vc - m * vf_m - n * vr_m)**2, axis = -1) / 
+                   np.sum(np.abs(vc)**2, axis = -1))
+    lim  = tol * max(res_ref if np.isfinite(res_ref) else 0.0, res_floor)
+    return True, bool(np.any(res > lim)), res
+
+def calib_store_update(store, cavities, vc, vf_m, vr_m, pul_ids, pul_ide, half_bw, detuning, Ts,
+                       beta = None, decay_ids = None, decay_ide = None, tol = 2.0, res_floor = 1e-3):
+    '''
+    Recalibrate the forward/reflected signals only for the cavities that are not
+    calibrated yet or drifted (see ``calib_drift_check``), with the method of 
+    ``calib_for_ref_batch``. The new coefficients (averaged over the pulses) are
+    added to the store.
+    
+    Parameters:
+        store:     dict, the calibration store
+        cavities:  list, names of the cavities
+        vc:        numpy array (complex), cavity probe waveforms (cavities x pulses x samples)
+        vf_m:      numpy array (complex), cavity forward waveforms (meas.)
+        vr_m:      numpy array (complex), cavity reflected waveforms (meas.)
+        pul_ids, pul_ide, Ts, decay_ids, decay_ide: see ``calib_for_ref_batch``
+        half_bw:   float or numpy array (per cavity), half bandwidth, rad/s
+        detuning:  float or numpy array (per cavity), detuning, rad/s
+        beta:      float or numpy array (per cavity), input coupling factor (None 
+                    for the default of the method, see ``calib_for_ref_batch``)
+        tol:       float, tolerance factor of the residual for the drift check
+        res_floor: float, minimum reference residual for the drift check
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        recal:     list, names of the recalibrated cavities
+    '''
+    # check the input
+    if (vc.ndim != 3) or (len(cavities) != vc.shape[0]) or \
+       (not (vc.shape == vf_m.shape == vr_m.shape)):
+        return False, None
+
+    if beta is None:
+        beta = 1e4 if (decay_ids is not None) and (decay_ide is not None) else 1.0
+
+    n_cav    = len(cavities)
+    half_bw  = np.broadcast_to(np.asarray(half_bw,  dtype = float), (n_cav,))
+    detuning = np.broadcast_to(np.asarray(detuning, dtype = float), (n_cav,))
+    beta     = np.broadcast_to(np.asarray(beta,     dtype = float), (n_cav,))
+
+    recal = []
+    for k, cav in enumerate(cavities):
+        # check the drift with the stored coefficients
+        status, drifted, _ = calib_drift_check(store, cav, vc[k], vf_m[k], vr_m[k], 
+                                               tol = tol, res_floor = res_floor)
+        if status and not drifted:
+            continue
+
+        # recalibrate
+        result = calib_for_ref_batch(vc[k], vf_m[k], vr_m[k], pul_ids, pul_ide, 
+                                     half_bw[k], detuning[k], Ts, 
+                                     beta      = beta[k],
+                                     decay_ids = decay_ids, 
+                                     decay_ide = decay_ide)
+        if not result['status']:
+            return False, None
+
+        coefs = {key: np.mean(result[key]) for key in ('a', 'b', 'c', 'd', 'm', 'n')}
+        calib_store_put(store, cav, 'for_ref', coefs, res = np.mean(result['res_vprobe']))
+        recal.append(cav)
+
+    return True, recal
+
 def for_ref_volt2power(roQ_or_RoQ, QL, 
                        vf_pcal  = None, 
                        vr_pcal  = None, 
@@ -40,9 +40,11 @@ https://link.springer.com/book/10.1007/978-3-031-28597-4 ("Beam Control Book")
 #########################################################################
 '''
 import numpy as np
-from scipy import signal
 from numpy.linalg import matrix_rank
 
+from llrflibs import _lazy_import
+signal = _lazy_import('scipy.signal')
+
 from llrflibs.rf_sysid import *
 from llrflibs.rf_misc import *
 
@@ -16,10 +16,14 @@ Implemented:
     - twop_demod    : demodulate raw with every two samples
     - asyn_demod    : demodulate raw sampled by asyn. clock, reference WF needed
     - self_demod_ap : demodulate raw with Hilbert transform, return amplitude and phase
+    - noniq_demod_stream   : non-I/Q demodulation of a chunk of continuous raw samples
+    - twop_demod_stream    : two-point demodulation of a chunk of continuous raw samples
+    - self_demod_ap_stream : self demodulation (FIR Hilbert) of a chunk of continuous raw samples
     - iq2ap_wf      : convert I/Q waveforms to amplitude/phase waveforms
     - ap2iq_wf      : convert amplitude/phase waveforms to I/Q waveforms
     - norm_phase    : normalize phase (scalar or WF) to a specific range (default +-180 deg)
     - pulse_info    : derive the pulse info like pulse width, pulse offset, etc.
+    - pulse_info_stream    : derive the pulse info and update its pulse-to-pulse statistics
 
 Some algorithms are referred to the following books:
 S. Simrock and Z. Geng, Low-Level Radio Frequency Systems, Springer, 2022
@@ -27,7 +31,9 @@ https://link.springer.com/book/10.1007/978-3-030-94419-3 ("LLRF Book")
 #########################################################################
 '''
 import numpy as np
-from scipy import signal
+
+from llrflibs import _lazy_import
+signal = _lazy_import('scipy.signal')
 
 def noniq_demod(raw_wf, n, m = 1):
     '''
@@ -48,46 +54,9 @@ def noniq_demod(raw_wf, n, m = 1):
     if n <= 0 or m <= 0 or n <= m or L < n:
         return False, None, None
 
-    # calculate the demod coefficients
-    P_rad   = np.arange(0.0, n, 1) * 2.0 * m * np.pi / n    # phases of one superperiod of NCO
-    I_coef  = np.sin(P_rad) * 2.0 / n                       # NCO output I
-    Q_coef  = np.cos(P_rad) * 2.0 / n                       # NCO output Q
-
-    # define the databuffers
-    I       = np.zeros(L)       # final output buffer
-    Q       = np.zeros(L)
-    pipeI   = np.zeros(n + 1)   # FIFO helping calculation
-    pipeQ   = np.zeros(n + 1)
-    sumI    = 0.0               # accumulators
-    sumQ    = 0.0
-    coef_id = 0                 # index for data selection
-    pipe_id = n
-
-    # do demodulation
-    for i in range(L):
-        # fill the FIFO a new multiplication
-        pipeI[pipe_id] = raw_wf[i] * I_coef[coef_id]
-        pipeQ[pipe_id] = raw_wf[i] * Q_coef[coef_id]
-
-        # calculate difference btw FIFO new/old, and accumulate
-        sumI += pipeI[pipe_id] - pipeI[pipe_id-1]
-        sumQ += pipeQ[pipe_id] - pipeQ[pipe_id-1]
-
-        # update the output for an sample
-        I[i] = sumI
-        Q[i] = sumQ
-
-        # update the index
-        coef_id += 1
-        if coef_id >= n:
-            coef_id = 0
-
-        pipe_id -= 1
-        if pipe_id < 0:
-            pipe_id = n
-
-    # return the results
-    return True, I, Q
+    # demodulate the whole waveform as a single chunk
+    status, I, Q, _ = noniq_demod_stream(raw_wf, n, m)
+    return status, I, Q
 
 def twop_demod(raw_wf, f_if, fs):
     '''
@@ -108,20 +77,9 @@ def twop_demod(raw_wf, f_if, fs):
     if (raw_wf.shape[0] < 3) or (f_if <= 0.0) or (fs <= 0.0):
         return False, None, None
 
-    # reserve the buffer
-    N = raw_wf.shape[0]                 # number of the points in WF
-    I = np.zeros(N)
-    Q = np.zeros(N)
-
-    # make the demodulation    
-    dphi_rad = 2.0 * np.pi * f_if / fs  # phase advance per sample
-    sn_dphi  = np.sin(dphi_rad)    
-
-    for i in range(1, N):
-        I[i] = ( raw_wf[i] * np.cos((i-1)*dphi_rad) - raw_wf[i-1] * np.cos(i*dphi_rad)) / sn_dphi
-        Q[i] = (-raw_wf[i] * np.sin((i-1)*dphi_rad) + raw_wf[i-1] * np.sin(i*dphi_rad)) / sn_dphi
-
-    return True, I, Q
+    # demodulate the whole waveform as a single chunk
+    status, I, Q, _ = twop_demod_stream(raw_wf, f_if, fs)
+    return status, I, Q
 
 def asyn_demod(raw_wf, ref_wf):
     '''
@@ -179,24 +137,25 @@ def self_demod_ap(raw_wf, n = 1):
     mitigate the edge effects).
 
     Parameters:
-        raw_wf: numpy array, signal waveform to be demodulated
+        raw_wf: numpy array, signal waveform to be demodulated (multiple waveforms
+                 can be given as a 2-D array with the samples along the last axis)
         n:      int, number of points covering full cycles (for coherent sampling)
     Returns:
         status: boolean, success (True) or faile (False)
         A, P:   numpy array, amplitude and phase waveforms, P in degree
     '''
     # check the input
-    if raw_wf.shape[0] < 3:
+    if raw_wf.shape[-1] < 3:
         return False, None, None
 
     # perform Hilbert transform
-    N = raw_wf.shape[0]             # number of points in WF
+    N = raw_wf.shape[-1]            # number of points in WF
     L = int(N / n) * n              # tailor
-    C = signal.hilbert(raw_wf[:L])  # hilbert transform
+    C = signal.hilbert(raw_wf[..., :L], axis = -1)  # hilbert transform
     
     # to the correct length
     if N > L:
-        C = np.hstack((C, np.zeros(N - L)))
+        C = np.concatenate((C, np.zeros(C.shape[:-1] + (N - L,))), axis = -1)
 
     # get the amplitude and phase in deg
     A = np.abs(C)
@@ -204,6 +163,168 @@ def self_demod_ap(raw_wf, n = 1):
 
     return True, A, P
 
+def noniq_demod_stream(raw_chunk, n, m = 1, state = None):
+    '''
+    Non-I/Q demodulation of a chunk of a continuous raw sample stream. The NCO
+    phase and the moving-window history are kept in ``state`` so that successive
+    chunks give the same result as demodulating the concatenated waveform.
+
+    Refer to LLRF Book section 5.2.2.
+
+    Parameters:
+        raw_chunk: numpy array, new raw samples along the last axis (multiple 
+                    channels can be given as a 2-D array of channels x samples)
+        m, n:      integer, non-I/Q parameters (n samples cover m IF cycles)
+        state:     dict, state returned by the last call (None for a new stream)
+
+    Returns:
+        status:    boolean, success (True) or faile (False)
+        I, Q:      numpy array, I/Q waveforms of the chunk
+        state:     dict, state of the stream, should input to the next execution
+    '''
+    # check the input
+    if n <= 0 or m <= 0 or n <= m or raw_chunk.ndim < 1 or raw_chunk.shape[-1] < 1:
+        return (False,) + (None,)*3
+
+    # init the state for a new stream
+    if state is None:
+        P_rad = np.arange(0.0, n, 1) * 2.0 * m * np.pi / n     # phases of one superperiod of NCO
+        state = {'n':       n,
+                 'm':       m,
+                 'nco':     (np.sin(P_rad) + 1j * np.cos(P_rad)) * 2.0 / n,
+                 'coef_id': 0,                                  # NCO index of the next sample
+                 'hist':    np.zeros(raw_chunk.shape[:-1] + (n - 1,), dtype = complex)}
+
+    if (state['n'] != n) or (state['m'] != m) or \
+       (state['hist'].shape[:-1] != raw_chunk.shape[:-1]):
+        return (False,) + (None,)*3
+
+    # NCO coefficients for the samples of this chunk
+    L       = raw_chunk.shape[-1]
+    nco     = state['nco'][(state['coef_id'] + np.arange(L)) % n]
+
+    # moving sum over n samples as the difference of the cumulative sums of the
+    # mixed samples (with a leading zero and the last n-1 mixed samples of the
+    # previous chunk), I and Q are calculated separately in place
+    IQ = []
+    for hist, coef in ((state['hist'].real, nco.real), (state['hist'].imag, nco.imag)):
+        S = np.empty(raw_chunk.shape[:-1] + (n + L,))
+        S[..., 0]   = 0.0
+        S[..., 1:n] = hist
+        np.multiply(raw_chunk, coef, out = S[..., n:])
+        np.cumsum(S, axis = -1, out = S)
+        IQ.append(S[..., n:] - S[..., :L])
+
+    # update the state
+    state['coef_id'] = (state['coef_id'] + L) % n
+    state['hist']    = np.concatenate((state['hist'], raw_chunk[..., -(n-1):] * nco[-(n-1):]), 
+                                      axis = -1)[..., -(n-1):]
+
+    return True, IQ[0], IQ[1], state
+
+def twop_demod_stream(raw_chunk, f_if, fs, state = None):
+    '''
+    Two-point demodulation of a chunk of a continuous raw sample stream. The NCO
+    phase and the last sample are kept in ``state`` so that successive chunks
+    give the same result as demodulating the concatenated waveform.
+
+    Refer to LLRF Book section 5.2.2.
+
+    Parameters:
+        raw_chunk: numpy array, raw samples of the chunk along the last axis (multiple
+                    channels can be given as a 2-D array of channels x samples)
+        f_if:      float, IF frequency, Hz
+        fs:        float, sampling frequency, Hz
+        state:     dict, state returned by the last call (None for a new stream)
+
+    Returns:
+        status:    boolean, success (True) or faile (False)
+        I, Q:      numpy array, I/Q waveforms of the chunk
+        state:     dict, state of the stream, should input to the next execution
+    '''
+    # check the input
+    if (raw_chunk.ndim < 1) or (raw_chunk.shape[-1] < 1) or (f_if <= 0.0) or (fs <= 0.0):
+        return (False,) + (None,)*3
+
+    dphi_rad = 2.0 * np.pi * f_if / fs                  # phase advance per sample
+    sn_dphi  = np.sin(dphi_rad)
+
+    # init the state for a new stream (phase of the sample before the chunk)
+    if state is None:
+        state = {'dphi_rad': dphi_rad,
+                 'pha_rad':  -dphi_rad,
+                 'x_last':   None}
+
+    if state['dphi_rad'] != dphi_rad:
+        return (False,) + (None,)*3
+
+    # phases of the previous and current samples
+    L      = raw_chunk.shape[-1]
+    p_prev = state['pha_rad'] + np.arange(L) * dphi_rad
+    p_cur  = p_prev + dphi_rad
+
+    # the previous samples (the first sample of a stream has no predecessor)
+    if state['x_last'] is None:
+        x_prev = np.concatenate((raw_chunk[..., :1], raw_chunk[..., :-1]), axis = -1)
+    else:
+        x_prev = np.concatenate((state['x_last'], raw_chunk[..., :-1]), axis = -1)
+
+    I = ( raw_chunk * np.cos(p_prev) - x_prev * np.cos(p_cur)) / sn_dphi
+    Q = (-raw_chunk * np.sin(p_prev) + x_prev * np.sin(p_cur)) / sn_dphi
+
+    if state['x_last'] is None:
+        I[..., 0] = Q[..., 0] = 0.0
+
+    # update the state (keep the phase wrapped to avoid losing precision)
+    state['pha_rad'] = np.mod(state['pha_rad'] + L * dphi_rad, 2.0 * np.pi)
+    state['x_last']  = raw_chunk[..., -1:]
+
+    return True, I, Q, state
+
+def self_demod_ap_stream(raw_chunk, ntaps = 63, state = None):
+    '''
+    Self demodulation of a chunk of a continuous raw sample stream with a FIR
+    Hilbert transformer (windowed ideal kernel). The filter history is kept in
+    ``state``. The outputs are delayed by ``(ntaps - 1) / 2`` samples with respect
+    to the input, and the kernel is only accurate away from DC and Nyquist.
+
+    Parameters:
+        raw_chunk: numpy array, raw samples of the chunk along the last axis (multiple
+                    channels can be given as a 2-D array of channels x samples)
+        ntaps:     int, odd number of taps of the Hilbert transformer
+        state:     dict, state returned by the last call (None for a new stream)
+
+    Returns:
+        status:    boolean, success (True) or faile (False)
+        A, P:      numpy array, amplitude and phase waveforms, P in degree
+        state:     dict, state of the stream, should input to the next execution
+    '''
+    # check the input
+    if (raw_chunk.ndim < 1) or (raw_chunk.shape[-1] < 1) or (ntaps < 3) or (ntaps % 2 == 0):
+        return (False,) + (None,)*3
+
+    # init the state for a new stream
+    if state is None:
+        M = int((ntaps - 1) / 2)                            # group delay of the filter
+        k = np.arange(-M, M + 1)
+        h = np.zeros(ntaps)
+        h[k % 2 == 1] = 2.0 / (np.pi * k[k % 2 == 1])       # ideal Hilbert kernel (odd taps)
+        h *= np.blackman(ntaps)
+
+        coef    = 1j * h                                    # imaginary part: Hilbert transform
+        coef[M] = 1.0                                       # real part: delayed input
+        state = {'ntaps': ntaps,
+                 'coef':  coef,
+                 'zi':    np.zeros(raw_chunk.shape[:-1] + (ntaps - 1,), dtype = complex)}
+
+    if (state['ntaps'] != ntaps) or (state['zi'].shape[:-1] != raw_chunk.shape[:-1]):
+        return (False,) + (None,)*3
+
+    # analytic signal of the chunk
+    C, state['zi'] = signal.lfilter(state['coef'], 1.0, raw_chunk, axis = -1, zi = state['zi'])
+
+    return True, np.abs(C), np.angle(C, deg = True), state
+
 def iq2ap_wf(I, Q):
     '''
     I/Q to A/P waveforms.
@@ -218,11 +339,8 @@ def iq2ap_wf(I, Q):
     if not I.shape == Q.shape:
         return False, None, None
 
-    # convert to complex
-    C = I + 1j*Q
-
-    # return the results
-    return True, np.abs(C), np.angle(C, deg = True)
+    # return the results (as the absolute value and angle of I + jQ)
+    return True, np.hypot(I, Q), np.arctan2(Q, I) * (180.0 / np.pi)
 
 def ap2iq_wf(A, P):
     '''
@@ -256,8 +374,8 @@ def norm_phase(P, cmd = '+-180'):
     Returns:
         Pnorm: float, normalized phase, degree
     '''
-    # convert using the complex numbers
-    Pnorm = np.angle(np.exp(1j * P * np.pi / 180.0), deg = True)    # to +-180 deg
+    # wrap to (-180, 180] deg
+    Pnorm = 180.0 - np.mod(180.0 - P, 360.0)
     if cmd == '0to360':
         if isinstance(Pnorm, float):
             Pnorm = (Pnorm + 360.0) if (Pnorm < 0.0) else Pnorm
@@ -267,22 +385,41 @@ def norm_phase(P, cmd = '+-180'):
     # return the result
     return Pnorm
 
-def pulse_info(pulse, threshold = 0.1):
+def _row_window_sum(data, ids, ide):
+    '''
+    Sum each row of the 2-D contiguous array ``data`` from ``ids`` to ``ide`` 
+    (included, ``ids <= ide``) in one pass with ``np.add.reduceat``.
     '''
-    get information of a pulse.
+    off = np.arange(data.shape[0]) * data.shape[1]
+    idx = np.column_stack((off + ids, off + ide + 1)).ravel()
+    if idx[-1] == data.size:                    # the last window ends at the end
+        idx = idx[:-1]
+    return np.add.reduceat(data.ravel(), idx)[::2]
+
+def pulse_info(pulse, threshold = 0.1, flattop = 0.9, Ts = 1.0):
+    '''
+    get information of a pulse or a batch of pulses.
 
     Parameters:
-        pulse:     numpy array, the pulse data
-        threshold: float, threshold for edge detection 
+        pulse:     numpy array, the pulse data, 1-D for a single pulse or 2-D
+                    (pulses x samples) for a batch of pulses
+        threshold: float, threshold for edge detection (relative to the peak)
+        flattop:   float, threshold for the flattop detection (relative to the peak),
+                    also used as the upper level of the rise/fall time
+        Ts:        float, sampling time for the energy calculation, s
     Returns:
         offs:      int, offset id of the pulse
         pulw:      int, pulse width as number of samples
         peak:      float, peak magnitude of the pulse
-
-    To be done:
-        a. detect the rise time and falling time
-        b. detect the flattop region and average
-        c. calculate the energy in the pulse
+        rise:      int, rise time from threshold to flattop level, number of samples
+        fall:      int, fall time from flattop to threshold level, number of samples
+        flat_offs: int, offset id of the flattop
+        flat_w:    int, flattop width as number of samples
+        flat_avg:  float, average magnitude in the flattop
+        energy:    float, energy in the pulse (sum of squared magnitude times ``Ts``)
+
+    Note:
+        For a batch of pulses, each item is a numpy array with one element per pulse.
     '''
     result = {'status': False}
 
@@ -294,63 +431,107 @@ def pulse_info(pulse, threshold = 0.1):
     else:
         return result
 
-    if data.shape[0] <= 1 or threshold < 0.0:
+    if (data.ndim not in (1, 2)) or data.shape[-1] <= 1 or \
+       threshold < 0.0 or flattop < threshold or Ts <= 0.0:
         return result
 
-    # be sure the pulse is positive
-    data = np.abs(data)
+    # be sure the pulse is positive, and process all pulses as a batch
+    batch = data.ndim == 2
+    data  = np.abs(np.atleast_2d(data))
+    n     = data.shape[1]                           # size of the pulse
+    rows  = np.arange(data.shape[0])
 
     # get the peak
-    result['peak'] = np.max(data)           # peak value of the pulse
-    low_l = threshold * result['peak']      # the low limit of the pulse
-
-    # get the pulse info
-    over_lowl = data > low_l
-    n         = over_lowl.shape[0]          # size of the pulse
-    start_id  = 0                           # init the pulse start id
-    end_id    = n - 1                       # init the pulse end id
-
-    for i in range(2, n - 1):
-        # find the pulse start id
-        if (not any(over_lowl[:i])) and all(over_lowl[i:i+2]):
-            start_id = i
-    
-        # find the pulse end id
-        if (not any(over_lowl[i:])) and all(over_lowl[i-2:i]):
-            end_id = i - 1
-
-    result['offs']   = start_id
-    result['pulw']   = end_id - start_id + 1
+    peak  = np.max(data, axis = 1)                  # peak value of the pulse
+    low_l = threshold * peak                        # the low limit of the pulse
+    top_l = flattop * peak                          # the low limit of the flattop
+
+    # get the first/last samples over the limits (a sample is found in each 
+    # pulse for the top limit as the peak is always at or above it)
+    over_lowl = data > low_l[:, np.newaxis]
+    over_topl = data >= top_l[:, np.newaxis]
+    has_low   = np.any(over_lowl, axis = 1)
+    first_low = np.argmax(over_lowl, axis = 1)
+    last_low  = n - 1 - np.argmax(over_lowl[:, ::-1], axis = 1)
+    first_top = np.argmax(over_topl, axis = 1)
+    last_top  = n - 1 - np.argmax(over_topl[:, ::-1], axis = 1)
+
+    # the pulse start needs two samples over the limit and at least two samples
+    # before it, the pulse end needs two samples over the limit and at least two
+    # samples after it; otherwise the pulse touches the edge of the waveform
+    nxt      = over_lowl[rows, np.minimum(first_low + 1, n - 1)]
+    prv      = over_lowl[rows, np.maximum(last_low  - 1, 0)]
+    start_ok = has_low & (first_low >= 2) & (first_low <= n - 2) & nxt
+    end_ok   = has_low & (last_low  >= 1) & (last_low  <= n - 3) & prv
+    start_id = np.where(start_ok, first_low, 0)
+    end_id   = np.where(end_ok,   last_low,  n - 1)
+
+    # calculate the flattop average and the energy in the pulse
+    flat_w   = last_top - first_top + 1
+    flat_avg = _row_window_sum(data, first_top, last_top) / flat_w
+    energy   = _row_window_sum(data**2, start_id, end_id) * Ts
+
+    # collect the results
+    items = {'peak':      peak,
+             'offs':      start_id,
+             'pulw':      end_id - start_id + 1,
+             'rise':      np.maximum(first_top - start_id, 0),
+             'fall':      np.maximum(end_id - last_top, 0),
+             'flat_offs': first_top,
+             'flat_w':    flat_w,
+             'flat_avg':  flat_avg,
+             'energy':    energy}
+
+    for key in items.keys():
+        result[key] = items[key] if batch else items[key][0]
     result['status'] = True
 
     # return the results
     return result
 
+def pulse_info_stream(pulse, threshold = 0.1, flattop = 0.9, Ts = 1.0, state = None):
+    '''
+    get information of the new pulse(s) and update the running statistics of the
+    pulse information over all pulses seen so far (for pulse-to-pulse monitoring).
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    Parameters:
+        pulse:     numpy array, the pulse data, 1-D for a single pulse or 2-D
+                    (pulses x samples) for a batch of pulses
+        threshold: float, threshold for edge detection (see ``pulse_info``)
+        flattop:   float, threshold for the flattop detection (see ``pulse_info``)
+        Ts:        float, sampling time for the energy calculation, s
+        state:     dict, running statistics returned by the last call (None to start)
+    Returns:
+        result:    dict, pulse information of the new pulse(s) (see ``pulse_info``)
+        state:     dict, running statistics with items ``count`` (number of pulses), 
+                    ``mean`` and ``std`` (dicts with the same keys as ``result``)
+    '''
+    # get the info of the new pulses
+    result = pulse_info(pulse, threshold = threshold, flattop = flattop, Ts = Ts)
+    if not result['status']:
+        return result, state
+
+    if state is None:
+        state = {'count': 0, 'mean': {}, 'std': {}, 'm2': {}}
+
+    # merge the statistics of the new pulses (Chan's parallel algorithm)
+    keys = [key for key in result.keys() if key != 'status']
+    for key in keys:
+        val   = np.atleast_1d(result[key]).astype(float)
+        n_b   = val.shape[0]
+        mu_b  = np.mean(val)
+        m2_b  = np.sum((val - mu_b)**2)
+
+        n_a   = state['count']
+        mu_a  = state['mean'].get(key, 0.0)
+        m2_a  = state['m2'].get(key, 0.0)
+
+        n_ab  = n_a + n_b
+        delta = mu_b - mu_a
+        state['mean'][key] = mu_a + delta * n_b / n_ab
+        state['m2'][key]   = m2_a + m2_b + delta**2 * n_a * n_b / n_ab
+        state['std'][key]  = np.sqrt(state['m2'][key] / n_ab)
+
+    state['count'] += n_b
+
+    return result, state
@@ -13,10 +13,21 @@ Implemented:
     - fit_circle    : fit the 2D points to a circle function
     - fit_ellipse   : fit the 2D points to an ellipse function
     - fit_Gaussian  : fit a 1D Guassian function
+    - fit_sincos_batch  : fit many datasets to sine or cosine functions at once
+    - fit_circle_batch  : fit many datasets of 2D points to circle functions at once
+    - fit_ellipse_batch : fit many datasets of 2D points to ellipse functions at once
+    - fit_Gaussian_batch: fit many curves to the sum of one or more Gaussian functions
+
+Note:
+    The batch fitting routines accept stacked datasets (batch x points), datasets
+    with different number of points can be padded and marked with a mask. All
+    least-square problems are solved with one batched solve of the normal equations.
 #########################################################################
 '''
 import numpy as np
-from scipy.optimize import curve_fit
+
+from llrflibs import _lazy_import
+optimize = _lazy_import('scipy.optimize')
 
 def fit_sincos(X_rad, Y, target = 'cos'):
     '''
@@ -178,26 +189,336 @@ def fit_Gaussian(X, Y):
     var_est = sum((X - mu_est)**2 * Y) / sum(Y)
 
     # make the fit
-    P, cov  = curve_fit(norm_dist, X, Y, p0 = [1.0, mu_est, var_est])
+    P, cov  = optimize.curve_fit(norm_dist, X, Y, p0 = [1.0, mu_est, var_est])
     a, mu, var = P[0], P[1], P[2]
 
     return True, a, mu, np.sqrt(var)
 
+def _lstsq_batch(Phi, y, mask = None):
+    '''
+    Solve the least-square problems ``Phi[k] * p[k] = y[k]`` of all datasets ``k``
+    with the normal equations. ``Phi`` is (batch x points x params), the points 
+    with ``mask`` False are excluded. Return the parameters (batch x params) and
+    the RMS residual of each dataset (NaN for the singular problems).
+    '''
+    Phi_w = Phi if mask is None else Phi * mask[..., np.newaxis]
+    PhiT  = np.swapaxes(Phi_w, 1, 2)
+    G     = PhiT @ Phi
+    r     = PhiT @ y[..., np.newaxis]
+
+    # solve all problems together, if any is singular, solve the well-conditioned
+    # ones and mark the others with NaN
+    try:
+        P = np.linalg.solve(G, r)[..., 0]
+    except np.linalg.LinAlgError:
+        ok = np.linalg.cond(G) < 1e12
+        P  = np.full(r.shape[:-1], np.nan)
+        if np.any(ok):
+            P[ok] = np.linalg.solve(G[ok], r[ok])[..., 0]
+
+    e   = y - (Phi @ P[..., np.newaxis])[..., 0]
+    if mask is not None:
+        e = e * mask
+    n   = y.shape[-1] if mask is None else np.maximum(np.sum(mask, axis = -1), 1)
+    res = np.sqrt(np.sum(e**2, axis = -1) / n)
+    return P, res
+
+def _check_batch(X, Y, mask):
+    '''
+    Check and prepare the inputs of the batch fitting routines, the masked
+    points are set to zero. Return None if the inputs are invalid.
+    '''
+    X = np.atleast_2d(X)
+    Y = np.atleast_2d(Y)
+    if (X.shape != Y.shape) or (X.ndim != 2):
+        return None
+    if mask is not None:
+        mask = np.atleast_2d(mask).astype(bool)
+        if mask.shape != X.shape:
+            return None
+        X = np.where(mask, X, 0.0)
+        Y = np.where(mask, Y, 0.0)
+    n = X.shape[1] if mask is None else np.min(np.sum(mask, axis = -1))
+    if n < 3:
+        return None
+    return X, Y, mask
+
+def _masked_mean(X, mask):
+    '''
+    Mean of each dataset over the valid points.
+    '''
+    if mask is None:
+        return np.mean(X, axis = -1)
+    return np.sum(X * mask, axis = -1) / np.sum(mask, axis = -1)
 
+def fit_sincos_batch(X_rad, Y, target = 'cos', mask = None):
+    '''
+    Fit many datasets to the sine or cosine function at once (see ``fit_sincos``).
 
+    Parameters:
+        X_rad:   numpy array, phase arrays in radian (batch x points)
+        Y:       numpy array, values of the sine or cosine function (batch x points)
+        target:  'sin' or 'cos', determine which function to fit to
+        mask:    numpy array (boolean), valid points (None for all valid)
+        
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        A:       numpy array, amplitudes of the functions
+        phi_rad: numpy array, phases of the functions, rad
+        c:       numpy array, offsets of the functions
+        res:     numpy array, RMS residuals of the fitting
+    '''
+    # check the input
+    data = _check_batch(X_rad, Y, mask)
+    if data is None:
+        return (False,) + (None,)*4
+    X_rad, Y, mask = data
 
+    # make the least-square fitting
+    if target == 'cos':
+        Phi = np.stack((np.cos(X_rad), -np.sin(X_rad), np.ones(Y.shape)), axis = -1)
+    else:
+        Phi = np.stack((np.sin(X_rad),  np.cos(X_rad), np.ones(Y.shape)), axis = -1)
+    P, res = _lstsq_batch(Phi, Y, mask)
 
+    # calculate the result
+    A       = np.sqrt(P[:, 0]**2 + P[:, 1]**2)
+    phi_rad = np.arctan2(P[:, 1], P[:, 0])
+    c       = P[:, 2]
 
+    return True, A, phi_rad, c, res
 
+def fit_circle_batch(X, Y, mask = None):
+    '''
+    Fit many datasets of 2D points to circles at once (see ``fit_circle``). The
+    points are centered before the fitting for better numerical conditioning.
 
+    Parameters:
+        X:      numpy array, x-coordinate of the points (batch x points)
+        Y:      numpy array, y-coordinate of the points (batch x points)
+        mask:   numpy array (boolean), valid points (None for all valid)
+        
+    Returns:
+        status: boolean, success (True) or fail (False)
+        x0, y0: numpy array, center coordinates of the circles
+        r:      numpy array, radius of the circles
+        res:    numpy array, RMS residuals of the fitting (of ``x^2 + y^2``)
+    '''
+    # check the input
+    data = _check_batch(X, Y, mask)
+    if data is None:
+        return (False,) + (None,)*4
+    X, Y, mask = data
 
+    # center the points
+    xm = _masked_mean(X, mask)[:, np.newaxis]
+    ym = _masked_mean(Y, mask)[:, np.newaxis]
+    Xc, Yc = X - xm, Y - ym
 
+    # make the fit with least square
+    Phi    = np.stack((2*Xc, 2*Yc, np.ones(Y.shape)), axis = -1)
+    P, res = _lstsq_batch(Phi, Xc**2 + Yc**2, mask)
 
+    # calculate the result
+    x0 = P[:, 0]
+    y0 = P[:, 1]
+    r  = np.sqrt(P[:, 2] + x0**2 + y0**2)
 
+    return True, x0 + xm[:, 0], y0 + ym[:, 0], r, res
 
+def fit_ellipse_batch(X, Y, mask = None):
+    '''
+    Fit many datasets of 2D points to ellipses at once (see ``fit_ellipse``). The
+    points are centered before the fitting for better numerical conditioning, 
+    the coefficients are converted back to the original coordinates.
 
+    Parameters:
+        X:      numpy array, x-coordinate of the points (batch x points)
+        Y:      numpy array, y-coordinate of the points (batch x points)
+        mask:   numpy array (boolean), valid points (None for all valid)
+        
+    Returns:
+        status: boolean, success (True) or fail (False)
+        Coef:   numpy array, coefficiets ``A,B,C,D,E,F`` of the ellipses (batch x 6)
+        a:      numpy array, semi-major
+        b:      numpy array, semi-minor
+        x0, y0: numpy array, center of the ellipses
+        sita:   numpy array, angle of the ellipses (see ``fit_ellipse``), rad
+        res:    numpy array, RMS residuals of the fitting (of the centered ``-y^2``)
+    '''
+    # check the input
+    data = _check_batch(X, Y, mask)
+    if data is None:
+        return (False,) + (None,)*7
+    X, Y, mask = data
 
+    # center the points
+    xm = _masked_mean(X, mask)
+    ym = _masked_mean(Y, mask)
+    Xc, Yc = X - xm[:, np.newaxis], Y - ym[:, np.newaxis]
 
+    # make the fit with least square
+    Phi    = np.stack((Xc**2, Xc*Yc, Xc, Yc, np.ones(Y.shape)), axis = -1)
+    P, res = _lstsq_batch(Phi, -Yc**2, mask)
+
+    # calculate the characteristics (in the centered coordinates)
+    A, B, C, D, E, F = P[:, 0], P[:, 1], 1.0, P[:, 2], P[:, 3], P[:, 4]
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        den  = B**2 - 4*A*C
+        a    = -np.sqrt(2*(A*E**2 + C*D**2 - B*D*E + den*F)*((A+C) + np.sqrt((A-C)**2 + B**2))) / den
+        b    = -np.sqrt(2*(A*E**2 + C*D**2 - B*D*E + den*F)*((A+C) - np.sqrt((A-C)**2 + B**2))) / den
+        x0   = (2*C*D - B*E) / den
+        y0   = (2*A*E - B*D) / den
+        sita = np.where(B != 0.0, np.arctan((C - A - np.sqrt((A-C)**2 + B**2)) / B),
+                        np.where(A <= C, 0.0, np.pi/2))
+
+    # coefficients in the original coordinates (x = xc + xm, y = yc + ym)
+    Coef = np.stack((A, B, np.full(A.shape, C),
+                     D - 2*A*xm - B*ym,
+                     E - B*xm - 2*C*ym,
+                     F + A*xm**2 + B*xm*ym + C*ym**2 - D*xm - E*ym), axis = -1)
+
+    return True, Coef, a, b, x0 + xm, y0 + ym, sita, res
+
+def _gauss_peak_est(X, R, thr):
+    '''
+    Estimate the Gaussian of the highest peak of each curve with the weighted 
+    log-parabola fitting (Caruana's algorithm with Guo's weighting ``y^2``) over 
+    the contiguous region around the peak above ``thr`` times the peak value.
+    '''
+    n   = X.shape[1]
+    j   = np.arange(n)
+    kpk = np.argmax(R, axis = -1)
+    pk  = R[np.arange(R.shape[0]), kpk]
+    xpk = X[np.arange(R.shape[0]), kpk]
+
+    # contiguous region around the peak
+    below = R <= thr * pk[:, np.newaxis]
+    left  = np.max(np.where(below & (j < kpk[:, np.newaxis]), j, -1), axis = -1)
+    right = np.min(np.where(below & (j > kpk[:, np.newaxis]), j,  n), axis = -1)
+    reg   = (j > left[:, np.newaxis]) & (j < right[:, np.newaxis]) & (R > 0)
+
+    # weighted fitting of ln(y) = p0 + p1*x + p2*x^2 (x relative to the peak)
+    Xc  = X - xpk[:, np.newaxis]
+    Rp  = np.where(reg, R, 1.0)
+    Phi = np.stack((np.ones(X.shape), Xc, Xc**2), axis = -1) * Rp[..., np.newaxis]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        P, _ = _lstsq_batch(Phi, Rp * np.log(Rp), reg)
+        var  = -0.5 / P[:, 2]
+        mu   = P[:, 1] * var
+        a    = np.exp(P[:, 0] + 0.5 * P[:, 1]**2 * var)
+
+    # fall back to the peak position and the half-width for invalid estimations
+    dx   = np.abs(X[:, 1] - X[:, 0])
+    bad  = ~(np.isfinite(var) & (var > 0) & np.isfinite(a)) | (np.sum(reg, axis = -1) < 3)
+    hw   = np.maximum(np.sum(reg, axis = -1), 1) * dx / 2.355
+    a    = np.where(bad, pk,  a)
+    mu   = np.where(bad, 0.0, mu) + xpk
+    sig  = np.where(bad, hw,  np.sqrt(np.abs(var)))
+    return a, mu, sig
+
+def _gauss_sum(X, a, mu, sig):
+    '''
+    Sum of Gaussian functions (a, mu, sig are batch x n_peak) and the components
+    (batch x n_peak x points).
+    '''
+    d = (X[:, np.newaxis, :] - mu[..., np.newaxis]) / sig[..., np.newaxis]
+    g = np.exp(-0.5 * d**2)
+    return np.sum(a[..., np.newaxis] * g, axis = 1), g, d
 
-
-
+def fit_Gaussian_batch(X, Y, n_peak = 1, refine = True, n_iter = 20, thr = 0.2, mask = None):
+    '''
+    Fit many curves to the sum of Gaussian functions at once, i.e., 
+    ``y = sum(a_k * exp(-0.5 * (x - mu_k)^2 / sigma_k^2))``. The initial estimation
+    is derived peak by peak with the closed-form log-parabola fitting (Caruana's 
+    algorithm weighted as Guo) of the highest remaining peak. It is optionally 
+    refined with the Levenberg-Marquardt (damped Gauss-Newton) iterations for
+    all curves together.
+    
+    Parameters:
+        X:      numpy array, x-coordinate of the points (batch x points, sorted)
+        Y:      numpy array, y-coordinate of the points (batch x points)
+        n_peak: int, number of Gaussian peaks of each curve
+        refine: boolean, True to refine the initial estimation
+        n_iter: int, number of refinement iterations
+        thr:    float, threshold relative to the peak value for selecting the 
+                 points of the initial estimation
+        mask:   numpy array (boolean), valid points (None for all valid)
+        
+    Returns:
+        status: boolean, success (True) or fail (False)
+        a:      numpy array, magnitude of the peaks (batch x n_peak)
+        mu:     numpy array, mean values of the peaks (batch x n_peak), sorted
+        sigma:  numpy array, standard deviations of the peaks (batch x n_peak)
+        res:    numpy array, RMS residuals of the fitting
+    '''
+    # check the input
+    data = _check_batch(X, Y, mask)
+    if (data is None) or (n_peak < 1) or (thr <= 0.0) or (thr >= 1.0):
+        return (False,) + (None,)*4
+    X, Y, mask = data
+    w = np.ones(Y.shape) if mask is None else mask.astype(float)
+
+    # initial estimation peak by peak on the residual curves
+    a   = np.zeros((Y.shape[0], n_peak))
+    mu  = np.zeros((Y.shape[0], n_peak))
+    sig = np.zeros((Y.shape[0], n_peak))
+    R   = Y * w
+    for k in range(n_peak):
+        a[:, k], mu[:, k], sig[:, k] = _gauss_peak_est(X, R, thr)
+        R = R - a[:, k:k+1] * np.exp(-0.5 * ((X - mu[:, k:k+1]) / sig[:, k:k+1])**2) * w
+
+    # refine with Levenberg-Marquardt iterations (damping adapted per curve),
+    # only the curves not converged yet are iterated
+    f, g, d = _gauss_sum(X, a, mu, sig)
+    cost    = np.sum(((Y - f) * w)**2, axis = -1)
+    if refine:
+        lam = np.full(Y.shape[0], 1e-3)
+        act = np.arange(Y.shape[0])
+        for _ in range(n_iter):
+            # Jacobian (batch x 3*n_peak x points) of the parameters a, mu, sigma
+            Xa, Ya, wa = X[act], Y[act], w[act]
+            ag = a[act, :, np.newaxis] * g
+            J  = np.concatenate((g, ag * d, ag * d**2), axis = 1) / \
+                 np.concatenate((np.ones(sig[act].shape), sig[act], sig[act]), axis = 1)[..., np.newaxis]
+            J  = J * wa[:, np.newaxis, :]
+            H  = J @ np.swapaxes(J, 1, 2)
+            gr = J @ ((Ya - f) * wa)[..., np.newaxis]
+            Hd = H + lam[act, np.newaxis, np.newaxis] * \
+                 (np.diagonal(H, axis1 = 1, axis2 = 2)[..., np.newaxis] + 1e-12) * np.eye(3 * n_peak)
+            try:
+                dp = np.linalg.solve(Hd, gr)[..., 0]
+            except np.linalg.LinAlgError:
+                break
+
+            # accept the steps reducing the cost
+            a_n   = a[act]   + dp[:, :n_peak]
+            mu_n  = mu[act]  + dp[:, n_peak:2*n_peak]
+            sig_n = np.abs(sig[act] + dp[:, 2*n_peak:])
+            f_n, g_n, d_n = _gauss_sum(Xa, a_n, mu_n, sig_n)
+            cost_n = np.sum(((Ya - f_n) * wa)**2, axis = -1)
+            ok     = np.isfinite(cost_n) & (cost_n < cost[act])
+            
+            upd = act[ok]
+            a[upd], mu[upd], sig[upd] = a_n[ok], mu_n[ok], sig_n[ok]
+            conv      = ok & (cost[act] - cost_n <= 1e-10 * cost[act])
+            cost[upd] = cost_n[ok]
+            lam[act]  = np.where(ok, lam[act] * 0.3, lam[act] * 10.0)
+            
+            # drop the converged curves
+            keep = ~conv & (lam[act] < 1e10)
+            act  = act[keep]
+            if act.size == 0:
+                break
+            f = np.where(ok[:, np.newaxis],             f_n, f)[keep]
+            g = np.where(ok[:, np.newaxis, np.newaxis], g_n, g)[keep]
+            d = np.where(ok[:, np.newaxis, np.newaxis], d_n, d)[keep]
+    res = np.sqrt(cost / np.sum(w, axis = -1))
+
+    # sort the peaks by the mean values
+    ids = np.argsort(mu, axis = -1)
+    a   = np.take_along_axis(a,   ids, axis = -1)
+    mu  = np.take_along_axis(mu,  ids, axis = -1)
+    sig = np.take_along_axis(sig, ids, axis = -1)
+    return True, a, mu, sig, res
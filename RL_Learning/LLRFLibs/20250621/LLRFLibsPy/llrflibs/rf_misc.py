@@ -16,11 +16,17 @@ Implemented:
     - add_tf          : adding two transfer function in num/den format
     - plot_ellipse    : plot an ellipse using its characteristics
     - plot_Guassian   : plot a 1D Guassian distribution
+    - decim_minmax    : decimate a waveform into per-pixel min/max envelope for plotting
+    - decim_pyramid   : build a multi-resolution min/max pyramid of a waveform
+    - decim_pyramid_get: get the min/max envelope of a range of the waveform from
+                        the pyramid (e.g., for zooming)
 #########################################################################
 '''
 import datetime
 import numpy as np
-import scipy.io as spio
+
+from llrflibs import _lazy_import
+spio = _lazy_import('scipy.io')
 
 def save_mat(data_dict, file_name):
     '''
@@ -254,21 +260,150 @@ def plot_Guassian(n, a = 1.0, mu = 0.0, sigma = 1.0, plot = False):
     # return the results
     return True, X, Y
 
+def _decim_env(lo, hi, n_pix):
+    '''
+    Reduce the min/max arrays (along the last axis) into ``n_pix`` bins.
+    Returns the start indices of the bins and the min/max of the bins.
+    '''
+    n     = lo.shape[-1]
+    edges = (np.arange(n_pix) * n) // n_pix
+    if n % n_pix == 0:
+        shape = lo.shape[:-1] + (n_pix, n // n_pix)
+        return edges, np.min(lo.reshape(shape), axis = -1), np.max(hi.reshape(shape), axis = -1)
+    return edges, np.minimum.reduceat(lo, edges, axis = -1), np.maximum.reduceat(hi, edges, axis = -1)
+
+def _decim_interleave(xb, lo, hi):
+    '''
+    Interleave the min/max values of the bins to be plotted as a single line.
+    '''
+    return np.repeat(xb, 2), np.stack((lo, hi), axis = -1).reshape(lo.shape[:-1] + (-1,))
 
+def decim_minmax(y, n_pix = 2000, x = None):
+    '''
+    Decimate a waveform into the min/max envelope of ``n_pix`` bins (e.g., one 
+    per pixel of the plot). The result plotted as a line covers all the values
+    of the waveform, so that the spikes/glitches are not lost like simple 
+    down-sampling. The waveform is returned unchanged if it is short.
 
+    Parameters:
+        y:      numpy array, waveform (1D or 2D with the waveforms in rows)
+        n_pix:  int, number of bins (pixels)
+        x:      numpy array, x-coordinate of the samples (sample index if None)
+        
+    Returns:
+        status: boolean, success (True) or fail (False)
+        x_d:    numpy array, x-coordinate of the decimated waveform
+        y_d:    numpy array, decimated waveform (2 points per bin)
+    '''
+    # check the input
+    y = np.asarray(y)
+    if (y.ndim not in (1, 2)) or (n_pix < 1) or \
+       ((x is not None) and (np.shape(x) != (y.shape[-1],))):
+        return False, None, None
+    n = y.shape[-1]
+    x = np.arange(n) if x is None else np.asarray(x)
 
+    # no need to decimate
+    if n <= 2 * n_pix:
+        return True, x, y
 
+    # min/max in bins
+    edges, lo, hi = _decim_env(y, y, n_pix)
+    x_d, y_d = _decim_interleave(x[edges], lo, hi)
+    return True, x_d, y_d
 
+def decim_pyramid(y, x = None, factor = 4, n_min = 4096):
+    '''
+    Build a multi-resolution pyramid of the min/max envelope of a waveform. Each
+    level reduces the previous one by ``factor``, until the length is below 
+    ``n_min``. The pyramid is built once (cost proportional to the waveform length)
+    and the envelope of any range is derived with ``decim_pyramid_get`` at a 
+    cost only proportional to the number of pixels.
 
+    Parameters:
+        y:      numpy array, waveform (1D or 2D with the waveforms in rows)
+        x:      numpy array, x-coordinate of the samples (sample index if None),
+                 should be monotonically increasing
+        factor: int, decimation factor between the levels
+        n_min:  int, length of the coarsest level
+        
+    Returns:
+        status: boolean, success (True) or fail (False)
+        pyr:    dict, the pyramid
+    '''
+    # check the input
+    y = np.asarray(y)
+    if (y.ndim not in (1, 2)) or (factor < 2) or \
+       ((x is not None) and (np.shape(x) != (y.shape[-1],))):
+        return False, None
+
+    # build the levels, the incomplete tail forms an own bin
+    lo, hi = [y], [y]
+    while lo[-1].shape[-1] > max(n_min, 1):
+        m = lo[-1].shape[-1] // factor * factor
+        lo_k, hi_k = lo[-1][..., 0:m:factor], hi[-1][..., 0:m:factor]
+        for i in range(1, factor):                  # element-wise on strides (faster than axis reduction)
+            lo_k = np.minimum(lo_k, lo[-1][..., i:m:factor])
+            hi_k = np.maximum(hi_k, hi[-1][..., i:m:factor])
+        if m < lo[-1].shape[-1]:
+            lo_k = np.concatenate((lo_k, np.min(lo[-1][..., m:], axis = -1, keepdims = True)), axis = -1)
+            hi_k = np.concatenate((hi_k, np.max(hi[-1][..., m:], axis = -1, keepdims = True)), axis = -1)
+        lo.append(lo_k)
+        hi.append(hi_k)
+
+    pyr = {'x':      None if x is None else np.asarray(x),
+           'n':      y.shape[-1],
+           'factor': int(factor),
+           'lo':     lo,
+           'hi':     hi}
+    return True, pyr
+
+def decim_pyramid_get(pyr, n_pix = 2000, x_start = None, x_end = None):
+    '''
+    Get the min/max envelope of a range of the waveform from the pyramid. The
+    coarsest level with at least ``n_pix`` points in the range is used.
 
-
-
-
-
-
-
-
-
-
-
-
+    Parameters:
+        pyr:     dict, the pyramid built by ``decim_pyramid``
+        n_pix:   int, number of bins (pixels)
+        x_start: float, start of the range in x-coordinate (None for the beginning)
+        x_end:   float, end of the range in x-coordinate (None for the end)
+        
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        x_d:     numpy array, x-coordinate of the decimated waveform
+        y_d:     numpy array, decimated waveform (2 points per bin)
+    '''
+    # check the input
+    if n_pix < 1:
+        return False, None, None
+    n, f, x = pyr['n'], pyr['factor'], pyr['x']
+
+    # sample range (one sample beyond each side to keep the line to the edges)
+    if x is None:
+        ids = 0 if x_start is None else int(np.floor(x_start))
+        ide = n if x_end   is None else int(np.ceil(x_end)) + 1
+    else:
+        ids = 0 if x_start is None else int(np.searchsorted(x, x_start, side = 'right')) - 1
+        ide = n if x_end   is None else int(np.searchsorted(x, x_end,   side = 'left'))  + 1
+    ids = min(max(ids, 0), n - 1)
+    ide = min(max(ide, ids + 1), n)
+
+    # select the level
+    k = 0
+    while (k + 1 < len(pyr['lo'])) and ((ide - ids) // f**(k + 1) >= n_pix):
+        k += 1
+    s  = f**k
+    i0 = ids // s
+    i1 = -(-ide // s)
+    lo = pyr['lo'][k][..., i0:i1]
+    hi = pyr['hi'][k][..., i0:i1]
+    
+    # raw data or envelope of the level
+    xi = (i0 + np.arange(i1 - i0)) * s
+    if k == 0 and (i1 - i0) <= 2 * n_pix:
+        return True, (xi if x is None else x[xi]), lo
+    if (i1 - i0) > n_pix:
+        edges, lo, hi = _decim_env(lo, hi, n_pix)
+        xi = xi[edges]
+    return (True,) + _decim_interleave(xi if x is None else x[xi], lo, hi)
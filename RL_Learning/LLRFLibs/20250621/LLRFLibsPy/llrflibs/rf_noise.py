@@ -12,13 +12,22 @@ Implemented:
     - calc_psd_coherent     : calculate the power spectral density (PSD) of a 
                               coherent sampled data series
     - calc_psd              : calculate the PSD of a general data series
+    - psd_accum             : accumulate the PSD of a long data series or many records (Welch)
+    - psd_accum_result      : get the averaged PSD and derived quantities from the accumulation
     - rand_unif             : generate uniform distributed random numbers
     - gen_noise_from_psd    : generate noise series from a given PSD spectrum
+    - design_noise_filter   : design a FIR filter shaping white noise to a given PSD spectrum
+    - gen_noise_from_psd_stream: generate noise series from a given PSD spectrum block by block
     - calc_rms_from_psd     : calculate the RMS jitter from a given PSD spectrum
+    - calc_rms_from_psd_bands: calculate the RMS jitter of multiple bands from given PSD spectra
     - notch_filt            : apply notch filter to a data series
     - design_notch_filter   : design a notch filter in state-space format
     - filt_step             : apply a single time step of state-space filter
+    - design_filter_bank    : design a bank of cascaded notch and low-pass filters as SOS
+    - filt_bank             : apply the filter bank to waveforms (causal/zero-phase)
+    - filt_bank_step        : apply a single time step of the filter bank
     - rand_sine             : generate random sine signals
+    - sum_sine_stream       : generate the sum of many sine waves block by block
     - gen_rand_sine_from_psd: generate random sine functions from DSB PSD
     - moving_avg            : moving average with group delay compensated
 
@@ -34,8 +43,10 @@ https://link.springer.com/book/10.1007/978-3-030-94419-3 ("LLRF Book")
 #########################################################################
 '''
 import numpy as np
-from scipy import signal
-from scipy.ndimage import uniform_filter1d
+
+from llrflibs import _lazy_import
+signal  = _lazy_import('scipy.signal')
+ndimage = _lazy_import('scipy.ndimage')
 
 def calc_psd_coherent(data, fs, bit = 0, n_noniq = 1, plot = False):
     '''
@@ -248,7 +259,170 @@ def calc_psd(data, fs, bit = 0, plot = False):
     # return
     return result
 
-def rand_unif(low = 0.0, high = 1.0, n = 1):
+def psd_accum(data, fs, nfft, state = None, overlap = 0.5, bit = 0, window = 'blackman',
+              continuous = True):
+    '''
+    Accumulate the power spectral density of a long data series or many records 
+    (Welch method). The data can be input chunk by chunk, each chunk is split into
+    (overlapped) segments of ``nfft`` points and the power spectra of the segments
+    are summed up in ``state``. The samples not enough for a full segment are kept
+    in ``state`` for the next chunk if ``continuous`` is True. Use ``psd_accum_result``
+    to get the averaged PSD and the derived quantities at any time.
+
+    Refer to LLRF Book section 6.1.2.
+
+    Parameters:
+        data:       numpy array, 1-D array of the new chunk/record of the raw waveform
+        fs:         float, sampling frequency, Hz
+        nfft:       int, number of points of each segment
+        state:      dict, state returned by the last call (None for a new accumulation)
+        overlap:    float, overlap between the segments, 0 to less than 1
+        bit:        int, number of bit of data. If bit = 0, do not scale data
+        window:     string, ``blackman`` (as ``calc_psd``) or ``rect`` (no window, as 
+                     ``calc_psd_coherent``, for coherent sampling ``nfft`` should cover
+                     full cycles)
+        continuous: boolean, True if the chunks are parts of a continuous series; False 
+                     if they are separate records (e.g., pulses)
+
+    Returns:
+        status:     boolean, success (True) or fail (False). Fail if the parameters
+                     differ from the ones of ``state``, or if a separate record
+                     (``continuous`` is False) is shorter than ``nfft`` and cannot be
+                     used; the state is returned unchanged in these cases
+        state:      dict, state of the accumulation, should input to the next execution
+    '''
+    # check the input
+    if isinstance(data, list):
+        data = np.array(data)
+    if (not isinstance(data, np.ndarray)) or (nfft < 3) or (fs <= 0) or (bit < 0) or \
+       (overlap < 0.0) or (overlap >= 1.0) or (window not in ('blackman', 'rect')):
+        return False, state
+
+    # init the state (window and its correction factors are derived only once)
+    if state is None:
+        if window == 'blackman':
+            win = np.blackman(nfft)
+        else:
+            win = np.ones(nfft)
+
+        Wn = 1.0 / nfft * np.sum(win * win)                     # window correction factor
+        Ws = np.mean(win)**2
+
+        state = {'fs':      fs,
+                 'nfft':    nfft,
+                 'overlap': overlap,
+                 'bit':     bit,
+                 'step':    max(1, int(round(nfft * (1.0 - overlap)))),
+                 'scale':   1.0 if bit == 0 else 1.0 / (2.0**(bit-1)/np.sqrt(2.0)),
+                 'window':  window,
+                 'win':     win,
+                 'Wn':      Wn,
+                 'ENBW':    Wn / Ws * fs / nfft,                # effective noise bandwidth
+                 'buf':     np.zeros(0),                        # samples waiting for a full segment
+                 'n_seg':   0,                                  # number of averaged segments
+                 'psd_sum': np.zeros(int(nfft / 2) + 1)}        # sum of |FFT|^2 in Nyquist band
+
+    if (state['fs'] != fs) or (state['nfft'] != nfft) or (state['overlap'] != overlap) or \
+       (state['bit'] != bit) or (state['window'] != window):
+        return False, state
+    if (not continuous) and (data.shape[0] < nfft):
+        return False, state
+
+    # get the segments of the data
+    if continuous:
+        x = np.concatenate((state['buf'], data * state['scale']))
+    else:
+        x = data * state['scale']
+
+    n_seg = 0 if x.shape[0] < nfft else int((x.shape[0] - nfft) / state['step']) + 1
+    if n_seg > 0:
+        segs = np.lib.stride_tricks.sliding_window_view(x, nfft)[::state['step']][:n_seg]
+        Y    = np.fft.rfft(segs * state['win'], axis = -1)      # FFT of all segments
+        state['psd_sum'] += np.sum(np.abs(Y)**2, axis = 0)
+        state['n_seg']   += n_seg
+
+    # keep the remaining samples for the next chunk
+    if continuous:
+        state['buf'] = x[n_seg * state['step']:].copy()
+
+    return True, state
+
+def psd_accum_result(state, plot = False):
+    '''
+    Get the averaged power spectral density and the derived quantities from the
+    state of ``psd_accum``. The results have the same items as ``calc_psd`` 
+    except the phase response.
+
+    Parameters:
+        state:       dict, state of ``psd_accum``
+        plot:        boolean, True for plot the spectrum
+
+    Returns:
+        freq:        numpy array, frequency waveform, Hz
+        psd:         numpy array, averaged PSD (linear scale), relative power / Hz
+        amp_resp:    numpy array, amplitude response, dBFS/Hz
+        signal_freq: float, signal frequency, Hz
+        signal_mag:  float, signal level, dBFS
+        noise_flr:   float, noise floor, dBFS/Hz
+        snr:         float, signal-to-noise ratio, dB
+        bin_db:      float, offset for an FFT bin freq space, dB
+        enbw_db:     float, offset for an FFT bin freq space (correct windowing), dB
+        n_seg:       int, number of averaged segments
+        status:      boolean, success (True) or fail (False)
+    '''
+    # results
+    result = {'status': False}
+
+    # check the input
+    if (state is None) or (state['n_seg'] <= 0):
+        return result
+
+    fs = state['fs']
+    N  = state['nfft']
+
+    # average the PSD
+    freq = np.arange(state['psd_sum'].shape[0]) / N * fs        # frequency vector, Hz
+    PSD  = state['psd_sum'] / state['n_seg'] / (N * fs * state['Wn'])
+    if (N % 2) == 0: PSD[1:-1] *= 2.0                           # convert to DSB spectra (exclude DC and f_nyquist)
+    else:            PSD[1:]   *= 2.0                           # convert to DSB spectra (exclude DC)
+
+    # calculate the derived quantities (see calc_psd and calc_psd_coherent)
+    amp_resp    = 10.0 * np.log10(PSD)                          # in dBFS/Hz
+    bin_dB      = 10.0 * np.log10(fs / N)                       # offset in dB for an FFT bin frequency band
+    enbw_dB     = 10.0 * np.log10(state['ENBW'])                # offset in dB for an FFT bin (corrected the windowing)
+
+    sig_id      = np.argmax(amp_resp)                           # bin index of the signal
+    sig_level   = amp_resp[sig_id] + enbw_dB                    # signal power level, dBFS
+
+    est_flr     = np.mean(amp_resp)                             # a guess of noise floor
+    spur_id     = amp_resp > est_flr + 15                       # find any spur 15 dB higher than the noise floor
+    noise_flr   = 10.0 * np.log10(np.mean(PSD[np.invert(spur_id)]))    # noise spectral density, dBFS/Hz
+
+    noise_level = noise_flr + 10.0 * np.log10(fs/2)             # noise power level, dBFS
+    snr         = sig_level - noise_level                       # SNR, dB
+
+    # collect the results
+    result['freq']        = freq                                # Hz
+    result['psd']         = PSD                                 # linear PSD (power / Hz)
+    result['amp_resp']    = amp_resp                            # dBFS/Hz
+    result['signal_freq'] = freq[sig_id]                        # signal frequency, Hz
+    result['signal_mag']  = sig_level                           # signal magnitude, dBFS
+    result['noise_flr']   = noise_flr                           # dBFS/Hz
+    result['snr']         = snr                                 # dB
+    result['bin_db']      = bin_dB                              # dB
+    result['enbw_db']     = enbw_dB                             # dB
+    result['n_seg']       = state['n_seg']
+    result['status']      = True
+
+    # make the plot
+    if plot:
+        from llrflibs.rf_plot import plot_calc_psd
+        plot_calc_psd(result)
+
+    # return
+    return result
+
+def rand_unif(low = 0.0, high = 1.0, n = 1, rng = None):
     '''
     produce random number within a certain range.
     
@@ -256,6 +430,8 @@ def rand_unif(low = 0.0, high = 1.0, n = 1):
         n:    int, number of output
         low:  float, low limit of the data
         high: float, high limit of the data
+        rng:  numpy.random.Generator, random generator (None to use the 
+               global random state of numpy)
         
     Returns:
         val:  if n = 1, it is a float number, if n > 1, it is a np array
@@ -264,21 +440,27 @@ def rand_unif(low = 0.0, high = 1.0, n = 1):
     if n < 1: n = 1
 
     # generate the random numbers
-    val = np.random.uniform(low, high, n)
+    if rng is None:
+        val = np.random.uniform(low, high, n)
+    else:
+        val = rng.uniform(low, high, n)
 
     # make return
     if n == 1: return val[0]
     else:      return val
 
-def gen_noise_from_psd(freq_vector, pn_vector, fs, N):
+def gen_noise_from_psd(freq_vector, pn_vector, fs, N, seed = None):
     '''
-    generate noise series from DSB PSD.
+    generate noise series from DSB PSD. The full series is generated with a
+    single inverse FFT, for very long series use ``gen_noise_from_psd_stream``.
 
     Parameters:
         freq_vector: numpy array, offset frequency from carrier, Hz
         pn_vector:   numpy array, DSB noise PSD, dBrad^2/Hz for phase noise
         fs:          float, sampling frequency, Hz
         N:           float, number of samples
+        seed:        int or numpy.random.Generator, seed of the random phases
+                      (None to use the global random state of numpy)
         
     Returns:
         status:      boolean, success (True) or fail (False)
@@ -303,8 +485,9 @@ def gen_noise_from_psd(freq_vector, pn_vector, fs, N):
                             pn_vector)
     
     # calculate the spectrum (see eq (6.15) of LLRF book) and add random phases
+    rng         = None if seed is None else np.random.default_rng(seed)
     pn_p_cplx   = np.sqrt(10**(pn_p/10) * N * fs / 2) * \
-                  np.exp(1j * rand_unif(low = -np.pi, high = np.pi, n = pn_p.shape[0]))
+                  np.exp(1j * rand_unif(low = -np.pi, high = np.pi, n = pn_p.shape[0], rng = rng))
     
     # get the full complex spectrum (0 to fs) of the phase noise
     if np.mod(N, 2) == 0:
@@ -322,6 +505,97 @@ def gen_noise_from_psd(freq_vector, pn_vector, fs, N):
     
     return True, pn_series, freq_p, pn_p
 
+def design_noise_filter(freq_vector, pn_vector, fs, ntaps = 4097):
+    '''
+    Design a linear-phase FIR filter whose output has the given DSB PSD when 
+    driven by white noise with unit variance. The filter is designed with the
+    frequency sampling method (Hann windowed), the frequency resolution of the
+    shaped PSD is about ``2*fs/ntaps``, the PSD below it cannot be reproduced.
+
+    Parameters:
+        freq_vector: numpy array, offset frequency from carrier, Hz
+        pn_vector:   numpy array, DSB noise PSD, dBrad^2/Hz for phase noise
+        fs:          float, sampling frequency, Hz
+        ntaps:       int, number of taps of the filter (odd number)
+    Returns:
+        status:      boolean, success (True) or fail (False)
+        h:           numpy array, impulse response of the filter
+    '''
+    # check input
+    if (freq_vector.shape != pn_vector.shape) or (freq_vector.shape[0] < 2) or \
+       (fs <= 0.0) or (ntaps < 3):
+        return False, None
+
+    ntaps = int(ntaps) | 1                              # force odd number of taps
+
+    # amplitude response at the FFT bins, the DC is removed as in ``gen_noise_from_psd``
+    freq    = np.arange(ntaps // 2 + 1) * fs / ntaps
+    pn_p    = np.interp(10*np.log10(freq[1:]),
+                        10*np.log10(freq_vector),
+                        pn_vector)
+    amp     = np.zeros(freq.shape)
+    amp[1:] = np.sqrt(10**(pn_p/10) * fs / 2)
+
+    # zero-phase impulse response, delayed to be causal and windowed
+    h = np.roll(np.fft.irfft(amp, n = ntaps), ntaps // 2) * np.hanning(ntaps + 2)[1:-1]
+    return True, h
+
+def gen_noise_from_psd_stream(freq_vector, pn_vector, fs, n, state = None, 
+                              n_real = 1, seed = None, ntaps = 4097):
+    '''
+    Generate noise series from DSB PSD block by block. White noise is shaped by
+    the FIR filter from ``design_noise_filter`` with overlap-add, the tail of
+    each block is kept in the state so that the series is continuous across the
+    blocks. The memory usage is bounded by the block size and the filter length.
+    Call the function repeatedly with the returned state to continue the series.
+
+    Parameters:
+        freq_vector: numpy array, offset frequency from carrier, Hz
+        pn_vector:   numpy array, DSB noise PSD, dBrad^2/Hz for phase noise
+        fs:          float, sampling frequency, Hz
+        n:           int, number of samples of the block
+        state:       dict, state returned by the last call (None to start a new
+                      series, the following inputs are only used in this case)
+        n_real:      int, number of independent realizations
+        seed:        int or numpy.random.Generator, seed of the random generator
+        ntaps:       int, number of taps of the shaping filter
+    Returns:
+        status:      boolean, success (True) or fail (False)
+        noise:       numpy array, noise block, (n_real x n) or (n,) if n_real = 1
+        state:       dict, state for the next call
+    '''
+    # check input
+    if n < 1:
+        return False, None, None
+
+    # start a new series
+    if state is None:
+        status, h = design_noise_filter(freq_vector, pn_vector, fs, ntaps = ntaps)
+        if (not status) or (n_real < 1):
+            return False, None, None
+
+        # the tail is initialized with filtered noise to avoid the startup transient
+        rng  = np.random.default_rng(seed)
+        nt   = h.shape[0] - 1
+        y    = signal.oaconvolve(rng.standard_normal((n_real, nt)), h[np.newaxis, :], axes = -1)
+        state = {'h':      h,
+                 'rng':    rng,
+                 'n_real': int(n_real),
+                 'tail':   y[:, nt:]}
+
+    # filter the white noise of this block and overlap-add the last tail
+    h  = state['h']
+    nt = h.shape[0] - 1
+    y  = signal.oaconvolve(state['rng'].standard_normal((state['n_real'], int(n))), 
+                           h[np.newaxis, :], axes = -1)
+    y[:, :nt] += state['tail']
+    state['tail'] = y[:, n:]
+
+    noise = y[:, :n]
+    if state['n_real'] == 1:
+        noise = noise[0]
+    return True, noise, state
+
 def calc_rms_from_psd(freq_vector, pn_vector, freq_start, freq_end, fs, N):
     '''
     calculate the rms value from PSDs.
@@ -353,16 +627,82 @@ def calc_rms_from_psd(freq_vector, pn_vector, freq_start, freq_end, fs, N):
                         10*np.log10(freq_vector),
                         pn_vector)
     
-    # integrate the jitter in the frequency integration region
+    # integrate the jitter in the frequency integration region (the noise power
+    # of a bin is counted after its frequency point)
     bin_dB      = 10.0 * np.log10(df_bin)
-    jitter_p    = np.zeros(freq_p.shape)    
-    noise_power = 0.0
-    
-    for i in range(N+1):
-        jitter_p[i] = np.sqrt(noise_power)
-        noise_power += 10.0**((pn_p[i] + bin_dB) / 10.0)    
+    noise_power = np.cumsum(10.0**((pn_p[:-1] + bin_dB) / 10.0))
+    jitter_p    = np.sqrt(np.hstack(([0.0], noise_power)))
     
     return True, freq_p, pn_p, jitter_p
+
+def calc_rms_from_psd_bands(freq_vector, pn_vector, bands, rule = 'loglog'):
+    '''
+    calculate the rms values from PSDs for multiple frequency bands. The PSD is
+    integrated piecewise between the points of ``freq_vector`` without resampling.
+
+    Parameters:
+        freq_vector: numpy array, offset frequency from carrier (ascending), Hz
+        pn_vector:   numpy array, DSB noise PSD, dBrad^2/Hz for phase noise, 1-D 
+                      for one PSD or 2-D (PSDs x frequency points) for a batch of PSDs
+        bands:       list or numpy array, frequency bands as ``[[freq_start, freq_end], ...]``, Hz
+        rule:        string, ``loglog`` (PSD in dB linear in log frequency between the
+                      points, same as the interpolation in ``calc_rms_from_psd``) or
+                      ``trapz`` (trapezoidal rule with linear PSD)
+
+    Returns:
+        status:      boolean, success (True) or fail (False)
+        rms:         numpy array, integrated jitter of the bands, 1-D (bands) for one 
+                      PSD or 2-D (PSDs x bands) for a batch of PSDs
+
+    Note:
+        The PSD is taken as zero outside the frequency range of ``freq_vector``.
+    '''
+    # check input
+    f     = np.asarray(freq_vector, dtype = float)
+    S_dB  = np.atleast_2d(np.asarray(pn_vector, dtype = float))
+    bands = np.atleast_2d(np.asarray(bands, dtype = float))
+    if (f.ndim != 1) or (f.shape[0] < 2) or (S_dB.shape[-1] != f.shape[0]) or \
+       (S_dB.ndim != 2) or (bands.shape[-1] != 2) or np.any(f <= 0) or np.any(np.diff(f) <= 0) or \
+       np.any(bands[:, 1] < bands[:, 0]) or (rule not in ('loglog', 'trapz')):
+        return False, None
+
+    # integrate the PSD (linear scale) between the frequency points
+    S      = 10.0**(S_dB / 10.0)
+    f1, f2 = f[:-1], f[1:]
+    S1, S2 = S[:, :-1], S[:, 1:]
+    if rule == 'loglog':
+        a   = (S_dB[:, 1:] - S_dB[:, :-1]) / 10.0 / np.log10(f2 / f1)   # power-law exponent of the segments
+        seg = _powerlaw_integral(S1, f1, a, f2)
+    else:
+        seg = 0.5 * (S1 + S2) * (f2 - f1)
+
+    C = np.hstack((np.zeros((S.shape[0], 1)), np.cumsum(seg, axis = 1)))  # cumulative power at the points
+
+    # cumulative power at the band edges (partial integral in the segment of the edge)
+    e = np.clip(bands.reshape(-1), f[0], f[-1])
+    k = np.clip(np.searchsorted(f, e, side = 'right') - 1, 0, f.shape[0] - 2)
+    if rule == 'loglog':
+        part = _powerlaw_integral(S1[:, k], f1[k], a[:, k], e)
+    else:
+        Se   = S1[:, k] + (S2[:, k] - S1[:, k]) * (e - f1[k]) / (f2[k] - f1[k])
+        part = 0.5 * (S1[:, k] + Se) * (e - f1[k])
+    Ce = (C[:, k] + part).reshape((S.shape[0], -1, 2))
+
+    # calculate the rms values
+    rms = np.sqrt(np.maximum(Ce[:, :, 1] - Ce[:, :, 0], 0.0))
+    if np.ndim(pn_vector) == 1:
+        rms = rms[0]
+
+    return True, rms
+
+def _powerlaw_integral(S1, f1, a, f):
+    '''
+    Integrate ``S1 * (x / f1)**a`` for x from ``f1`` to ``f``.
+    '''
+    b = a + 1.0
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        val = S1 * f1 / b * ((f / f1)**b - 1.0)
+    return np.where(np.abs(b) < 1e-9, S1 * f1 * np.log(f / f1), val)
         
 def notch_filt(wf, fnotch, Q, fs, b = None, a = None):
     '''
@@ -443,6 +783,124 @@ def filt_step(Afd, Bfd, Cfd, Dfd, in_step, state_f0):
     # return the results of the step
     return True, out_step, state_f
 
+def design_filter_bank(fs, notches = None, lowpass = None):
+    '''
+    Design a filter bank of cascaded notch and low-pass filters. The filters
+    are compiled into second-order sections (SOS) once, and the filter bank can
+    be applied to many waveforms with ``filt_bank`` or sample by sample with
+    ``filt_bank_step`` without designing the filters again.
+
+    Parameters:
+        fs:      float, sampling frequency, Hz
+        notches: list, notch filters given as ``(fnotch, Q)`` tuples with the 
+                  frequency to be notched (Hz) and the quality factor
+        lowpass: list, Butterworth low-pass filters given as ``(fcut, order)`` 
+                  tuples with the cutoff frequency (Hz) and the filter order
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        fbank:   dict, the filter bank with the SOS coefficients (``sos``) and
+                  the sampling frequency (``fs``)
+    '''
+    # check the input
+    if fs <= 0.0:
+        return False, None
+
+    notches = [] if notches is None else notches
+    lowpass = [] if lowpass is None else lowpass
+    if len(notches) + len(lowpass) < 1:
+        return False, None
+
+    # design the filters as SOS
+    sos_list = []
+    for fnotch, Q in notches:
+        if (fnotch <= 0.0) or (fnotch >= fs/2) or (Q <= 0.0):
+            return False, None
+        b, a = signal.iirnotch(fnotch, Q, fs)
+        sos_list.append(signal.tf2sos(b, a))
+
+    for fcut, order in lowpass:
+        if (fcut <= 0.0) or (fcut >= fs/2) or (order < 1):
+            return False, None
+        sos_list.append(signal.butter(int(order), fcut, fs = fs, output = 'sos'))
+
+    sos   = np.vstack(sos_list)
+    fbank = {'sos':  sos,
+             'coef': sos[:, [0, 1, 2, 4, 5]].tolist(),     # b0, b1, b2, a1, a2 for the step execution
+             'fs':   fs}
+    return True, fbank
+
+def filt_bank(fbank, data, axis = -1, mode = 'causal', zi = None):
+    '''
+    Apply the filter bank to waveforms (real or complex) along an axis.
+
+    Parameters:
+        fbank:   dict, filter bank designed by ``design_filter_bank``
+        data:    numpy array, waveforms to be filtered, e.g., (channels x samples)
+        axis:    int, axis of the samples
+        mode:    string, ``causal`` (forward filtering, can be continued with 
+                  the returned state for the next chunk of data) or ``zero-phase`` 
+                  (forward-backward filtering of the complete waveforms)
+        zi:      numpy array, initial state of the causal filter, i.e., the final
+                  state returned by the last call (None to start from zero state)
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        data_f:  numpy array, filtered waveforms
+        zf:      numpy array, final state of the causal filter (None for ``zero-phase``)
+    '''
+    # check the input
+    data = np.asarray(data)
+    if (fbank is None) or (data.ndim < 1) or (mode not in ('causal', 'zero-phase')):
+        return False, None, None
+
+    sos = fbank['sos']
+
+    # zero-phase filtering
+    if mode == 'zero-phase':
+        if data.shape[axis] <= 3 * (2 * sos.shape[0] + 1):     # minimum length for the padding
+            return False, None, None
+        return True, signal.sosfiltfilt(sos, data, axis = axis), None
+
+    # causal filtering with the state
+    if zi is None:
+        shape = list(data.shape)
+        shape[axis] = 2
+        zi = np.zeros([sos.shape[0]] + shape, dtype = np.result_type(data, float))
+    data_f, zf = signal.sosfilt(sos, data, axis = axis, zi = np.asarray(zi))
+    return True, data_f, zf
+
+def filt_bank_step(fbank, in_step, state = None):
+    '''
+    Apply a single time step of the filter bank. It is faster than ``filt_step``
+    for the loops of time-step simulations.
+
+    Parameters:
+        fbank:    dict, filter bank designed by ``design_filter_bank``
+        in_step:  float or complex (or numpy array for multiple channels), input 
+                   of the time step
+        state:    list, state of the filter of last step (None to start from zero 
+                   state), a final state of ``filt_bank`` for 1D data is also accepted
+    Returns:
+        status:   boolean, success (True) or fail (False)
+        out_step: float or complex, filter output of this time step
+        state:    list, state of the filter of this step, should input to the 
+                   next execution
+    '''
+    # initialize the state
+    if state is None:
+        state = [[0.0, 0.0] for _ in fbank['coef']]
+    elif isinstance(state, np.ndarray):
+        state = [list(z) for z in state]
+
+    # execute the SOS (transposed direct form II) one by one
+    x = in_step
+    for (b0, b1, b2, a1, a2), z in zip(fbank['coef'], state):
+        y    = b0 * x + z[0]
+        z[0] = b1 * x - a1 * y + z[1]
+        z[1] = b2 * x - a2 * y
+        x    = y
+
+    return True, x, state
+
 def moving_avg_obs(wf_in, n):
     '''
     Moving average without compensating the group delay (no longer used).
@@ -485,7 +943,7 @@ def rand_sine(N, fs, nfreq = 1, Amin = 0.0, Amax = 1.0, fmin = 0.0, fmax = 1e3):
     # check the inputs
     if N <= 0 or fs <= 0 or nfreq < 1 or Amin < 0 or \
        Amax < Amin or fmin < 0 or fmax < fmin:
-        return False, None
+        return False, None, None
         
     # generate the random amplitude, phase and frequency
     A = np.random.uniform(Amin, Amax, nfreq)
@@ -493,33 +951,101 @@ def rand_sine(N, fs, nfreq = 1, Amin = 0.0, Amax = 1.0, fmin = 0.0, fmax = 1e3):
     P = np.random.uniform(-np.pi, np.pi, nfreq)
 
     # generate the series
-    sout = np.zeros(N)
-    t    = np.arange(N) / fs
-    for i in range(len(A)):
-        sout = sout + A[i] * np.sin(2.0 * np.pi * f[i] * t + P[i])
+    status, sout, _ = sum_sine_stream(A, f, P, fs, N)
+    t = np.arange(N) / fs
 
     # return
-    return True, sout, t
+    return status, sout, t
 
-def gen_rand_sine_from_psd(freq_vector, pn_vector, freqs):
+def sum_sine_stream(amplts, freqs, phases, fs, n, state = None, block = 1024):
     '''
-    generate random sine functions from DSB PSD.
+    Generate the sum of many sine waves block by block. In each block, the sum
+    is a matrix product of the phasors of the sine waves and a cached matrix of
+    the sin/cos waveforms of the block, i.e., 
+    ``A*sin(w*t + P) = A*cos(P)*sin(w*t) + A*sin(P)*cos(w*t)``. The phases are
+    advanced at the end of each block, so that the series is continuous across
+    the calls. Call the function repeatedly with the returned state to continue
+    the series.
+
+    Parameters:
+        amplts: numpy array, amplitudes of the sine waves, (n_sine,) or 
+                 (n_real x n_sine) for multiple independent realizations
+        freqs:  numpy array, frequencies of the sine waves, (n_sine,), Hz
+        phases: numpy array, initial phases of the sine waves, rad, (n_sine,) or
+                 (n_real x n_sine), broadcast with ``amplts``
+        fs:     float, sampling frequency, Hz
+        n:      int, number of samples to generate
+        state:  dict, state returned by the last call (None to start a new 
+                 series, the inputs above except ``n`` are only used in this case)
+        block:  int, number of samples of the cached sin/cos matrix
+    Returns:
+        status: boolean, success (True) or fail (False)
+        sout:   numpy array, output data series, (n,) or (n_real x n)
+        state:  dict, state for the next call
+    '''
+    # check the input
+    if n < 1:
+        return False, None, None
+
+    # start a new series
+    if state is None:
+        freqs  = np.asarray(freqs,  dtype = float).ravel()
+        try:
+            amplts, phases = np.broadcast_arrays(np.asarray(amplts, dtype = float), 
+                                                 np.asarray(phases, dtype = float))
+        except ValueError:
+            return False, None, None
+        if (amplts.ndim not in (1, 2)) or (amplts.shape[-1] != freqs.shape[0]) or \
+           (freqs.shape[0] < 1) or (fs <= 0.0) or (block < 1):
+            return False, None, None
+
+        # sin/cos waveforms of a block (2*n_sine x block)
+        wt    = 2.0 * np.pi * freqs[:, np.newaxis] / fs * np.arange(int(block))
+        state = {'dphi':  2.0 * np.pi * freqs / fs,             # phase advance per sample, rad
+                 'basis': np.vstack((np.sin(wt), np.cos(wt))),
+                 'amplt': np.atleast_2d(amplts),
+                 'phase': np.mod(np.atleast_2d(phases), 2.0 * np.pi),
+                 'is_1d': amplts.ndim == 1}
+
+    # generate the series block by block
+    basis = state['basis']
+    nb    = basis.shape[1]
+    sout  = np.empty((state['amplt'].shape[0], int(n)))
+    for i in range(0, int(n), nb):
+        m    = min(nb, int(n) - i)
+        coef = np.hstack((state['amplt'] * np.cos(state['phase']), 
+                          state['amplt'] * np.sin(state['phase'])))
+        sout[:, i:i + m] = coef @ basis[:, :m]
+        state['phase'] = np.mod(state['phase'] + state['dphi'] * m, 2.0 * np.pi)
+
+    if state['is_1d']:
+        sout = sout[0]
+    return True, sout, state
+
+def gen_rand_sine_from_psd(freq_vector, pn_vector, freqs, n_real = 1, seed = None):
+    '''
+    generate random sine functions from DSB PSD. The sum of the sine waves can
+    be generated with ``sum_sine_stream``.
 
     Parameters:
         freq_vector: numpy array, offset frequency from carrier, Hz
         pn_vector:   numpy array, DSB noise PSD, dBrad^2/Hz for phase noise
         freqs:       numpy array, frequencies of sine waves (prepared by user), Hz
+        n_real:      int, number of realizations with independent random phases
+        seed:        int or numpy.random.Generator, seed of the random phases
+                      (None to use the global random state of numpy)
         
     Returns:
         status:      boolean, success (True) or fail (False)
         amplts:      numpy array, amplitudes of the sine waves
-        phases:      numpy array, phases of the sine waves, rad
+        phases:      numpy array, phases of the sine waves, rad, (n_sine,) or
+                      (n_real x n_sine) if n_real > 1
         psds:        numpy array, interpreted phase/amplitude noise DSB PSD at 
                                   selected frequencies, dBrad^2/Hz for phase noise
     '''
     # check input
     if (freq_vector.shape != pn_vector.shape) or (freq_vector.shape[0] < 2) or \
-       (freqs.shape[0] < 1):
+       (freqs.shape[0] < 1) or (n_real < 1):
         return (False,) + (None,)*3
 
     # calculates the sine wave parameters
@@ -532,7 +1058,11 @@ def gen_rand_sine_from_psd(freq_vector, pn_vector, freqs):
     bws    = bw_t[1:] - bw_t[:-1]                               # bandwidth of each frequency points, Hz
     amplts = 10**((psds + 10*np.log10(bws) + 3) / 20)           # amplitudes of sine waves, rad
                                                                 # reasons why we need this 3dB is not clear yet
-    phases = np.random.rand(n_sine) * 2.0 * np.pi               # random phases of sine waves, rad
+    size   = n_sine if n_real == 1 else (n_real, n_sine)
+    if seed is None:
+        phases = np.random.rand(*np.atleast_1d(size)) * 2.0 * np.pi    # random phases of sine waves, rad
+    else:
+        phases = np.random.default_rng(seed).random(size) * 2.0 * np.pi
     
     # return the results
     return True, amplts, phases, psds
@@ -554,7 +1084,7 @@ def moving_avg(data, n):
         return False, None
 
     # moving average
-    result = uniform_filter1d(data, size = n)
+    result = ndimage.uniform_filter1d(data, size = n)
     return True, result
 
 
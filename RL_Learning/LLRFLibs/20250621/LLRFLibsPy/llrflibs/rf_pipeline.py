@@ -0,0 +1,545 @@
+"""Process multi-channel RF waveforms in parallel with shared memory."""
+#############################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+#############################################################################
+'''
+#########################################################################
+Here collects routines for parallel processing of RF waveforms
+
+Implemented:
+    - shm_create     : create numpy arrays in shared memory for worker processes
+    - shm_release    : release the shared memory created by ``shm_create``
+    - run_parallel   : execute a task over blocks of records with a process pool
+                       whose workers access the arrays in shared memory
+    - demod_pipeline : demodulate raw ADC waveforms of many channels/pulses and
+                       derive the amplitude/phase and the pulse information
+    - cav_par_pipeline: derive the per-pulse cavity parameters (half-bandwidth and
+                       detuning) of many pulses, e.g., from a memory-mapped archive
+    - calib_for_ref_pipeline: calibrate the forward/reflected signals of many cavities
+                       with multiple pulses
+
+Note:
+    The worker processes attach the shared memory by name and write their
+    results directly into the preallocated output arrays, so that only the
+    record indices are pickled between the processes. Input arrays that are
+    memory-mapped files (e.g., ``np.load(file, mmap_mode = 'r')``) are not 
+    copied, the workers map the same file.
+#########################################################################
+'''
+import os
+import mmap
+import numpy as np
+import concurrent.futures
+
+from llrflibs import _lazy_import
+shared_memory = _lazy_import('multiprocessing.shared_memory')
+
+from llrflibs.rf_det_act import *
+from llrflibs.rf_sysid import *
+from llrflibs.rf_calib import *
+
+# shared memory arrays attached in the worker processes
+_shm_arrays = {}
+
+# items of the pulse information collected by the pipeline
+_pulse_items = ['peak', 'offs', 'pulw', 'rise', 'fall', 'flat_offs', 'flat_w', 'flat_avg', 'energy']
+
+def shm_create(arrays):
+    '''
+    Create numpy arrays in shared memory.
+
+    Parameters:
+        arrays: dict, with the array name as key and a tuple ``(shape, dtype)``
+                 (for a new zero array) or a numpy array (to be copied) as value.
+                 A memory-mapped file array (``np.memmap`` on the whole file 
+                 mapping) is used directly without copy
+    Returns:
+        status: boolean, success (True) or fail (False)
+        bufs:   dict, numpy arrays backed by the shared memory
+        specs:  dict, ``(shm_name, shape, dtype)`` of each array for attaching it
+                 in other processes (see ``run_parallel``), or 
+                 ``(file_name, shape, dtype, offset)`` for a memory-mapped file
+        shms:   list, shared memory objects, should be released with ``shm_release``
+    '''
+    # check the input
+    if not isinstance(arrays, dict):
+        return (False,) + (None,)*3
+
+    bufs  = {}
+    specs = {}
+    shms  = []
+    for name, arr in arrays.items():
+        # memory-mapped file (the array must cover the mapping from its offset)
+        if isinstance(arr, np.memmap) and isinstance(arr.base, mmap.mmap) and \
+           (arr.filename is not None) and arr.flags['C_CONTIGUOUS']:
+            bufs[name]  = arr
+            specs[name] = (arr.filename, arr.shape, arr.dtype.str, arr.offset)
+            continue
+
+        if isinstance(arr, np.ndarray):
+            shape, dtype = arr.shape, arr.dtype
+        else:
+            shape, dtype = arr[0], np.dtype(arr[1])
+
+        # create the shared memory (at least 1 byte) and the numpy view on it
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm    = shared_memory.SharedMemory(create = True, size = max(nbytes, 1))
+        buf    = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+        if isinstance(arr, np.ndarray):
+            buf[...] = arr
+        else:
+            buf[...] = 0
+
+        bufs[name]  = buf
+        specs[name] = (shm.name, shape, np.dtype(dtype).str)
+        shms.append(shm)
+
+    return True, bufs, specs, shms
+
+def shm_release(shms):
+    '''
+    Release the shared memory created by ``shm_create``. The numpy arrays on the
+    shared memory should not be used any more after this call.
+
+    Parameters:
+        shms: list, shared memory objects returned by ``shm_create``
+    '''
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+def _shm_attach(specs):
+    '''
+    Attach the shared memory in a worker process (initializer of the pool).
+    '''
+    _shm_arrays.clear()
+    for name, spec in specs.items():
+        if len(spec) == 4:
+            file_name, shape, dtype, offset = spec
+            _shm_arrays[name] = (None, np.memmap(file_name, dtype = dtype, mode = 'r', 
+                                                 shape = shape, offset = offset))
+            continue
+        shm_name, shape, dtype = spec
+        shm = shared_memory.SharedMemory(name = shm_name)
+        _shm_arrays[name] = (shm, np.ndarray(shape, dtype = dtype, buffer = shm.buf))
+
+def _shm_task(task, ids, ide, args):
+    '''
+    Execute a task in a worker process on the attached shared memory.
+    '''
+    bufs = {name: item[1] for name, item in _shm_arrays.items()}
+    return task(bufs, ids, ide, *args)
+
+def run_parallel(task, bufs, specs, n_rec, args = (), n_proc = None, block = None):
+    '''
+    Execute a task over blocks of records. The task is called as
+    ``task(bufs, ids, ide, *args)`` and should process the records ``ids`` to
+    ``ide - 1`` of the arrays in ``bufs``, writing the results into the output
+    arrays in ``bufs``. It must be a module-level function so that it can be
+    sent to the worker processes.
+
+    Parameters:
+        task:   function, the task to be executed
+        bufs:   dict, numpy arrays in shared memory (see ``shm_create``)
+        specs:  dict, specifications of the shared memory (see ``shm_create``)
+        n_rec:  int, number of records
+        args:   tuple, additional arguments of the task
+        n_proc: int, number of worker processes (None for the CPU count, 1 to
+                 execute in the calling process)
+        block:  int, number of records per task (None to derive from ``n_proc``)
+    Returns:
+        status: boolean, success (True) or fail (False)
+        rets:   list, return values of the task for all blocks
+    '''
+    # check the input
+    if n_rec <= 0:
+        return False, None
+
+    if n_proc is None:
+        n_proc = os.cpu_count() or 1
+    n_proc = max(1, min(int(n_proc), n_rec))
+
+    if block is None:
+        block = int(np.ceil(n_rec / (4 * n_proc)))         # a few blocks per process for load balancing
+    block  = max(1, int(block))
+    blocks = [(ids, min(ids + block, n_rec)) for ids in range(0, n_rec, block)]
+
+    # execute in the calling process
+    if n_proc == 1:
+        return True, [task(bufs, ids, ide, *args) for ids, ide in blocks]
+
+    # execute with the process pool
+    with concurrent.futures.ProcessPoolExecutor(max_workers = n_proc,
+                                                initializer = _shm_attach,
+                                                initargs    = (specs,)) as pool:
+        futures = [pool.submit(_shm_task, task, ids, ide, args) for ids, ide in blocks]
+        rets    = [f.result() for f in futures]
+
+    return True, rets
+
+def _demod_task(bufs, ids, ide, method, demod_par, threshold, pha_cmd):
+    '''
+    Demodulate the records ``ids`` to ``ide - 1`` and get the pulse information.
+    '''
+    raw = bufs['raw']
+    I, Q, A, P = bufs['I'], bufs['Q'], bufs['A'], bufs['P']
+
+    # demodulate the block of records at once (the streaming demodulators take 
+    # each record as a new stream)
+    if method == 'noniq':
+        status, I_blk, Q_blk, _ = noniq_demod_stream(raw[ids:ide], demod_par['n'], demod_par.get('m', 1))
+    elif method == 'twop':
+        status, I_blk, Q_blk, _ = twop_demod_stream(raw[ids:ide], demod_par['f_if'], demod_par['fs'])
+    else:
+        status, A_blk, P_blk = self_demod_ap(raw[ids:ide], demod_par.get('n', 1))
+        if status:
+            status, I_blk, Q_blk = ap2iq_wf(A_blk, P_blk)
+    if not status:
+        return False
+    I[ids:ide], Q[ids:ide] = I_blk, Q_blk
+
+    # amplitude/phase and the pulse information of the block (as ``iq2ap_wf``
+    # and ``norm_phase``, written in place; the phase is already within +-180 deg)
+    I_blk, Q_blk, A_blk, P_blk = I[ids:ide], Q[ids:ide], A[ids:ide], P[ids:ide]
+    np.multiply(I_blk, I_blk, out = A_blk)
+    np.multiply(Q_blk, Q_blk, out = P_blk)          # phase buffer used as scratch
+    A_blk += P_blk
+    np.sqrt(A_blk, out = A_blk)
+    np.arctan2(Q_blk, I_blk, out = P_blk)
+    P_blk *= 180.0 / np.pi
+    if pha_cmd == '0to360':
+        P_blk[P_blk < 0.0] += 360.0
+
+    result = pulse_info(A[ids:ide], threshold = threshold)
+    if not result['status']:
+        return False
+    for i, key in enumerate(_pulse_items):
+        bufs['pulse'][ids:ide, i] = result[key]
+
+    return True
+
+def demod_pipeline(raw, method = 'noniq', demod_par = None, threshold = 0.1,
+                   pha_cmd = '+-180', n_proc = None, block = None):
+    '''
+    Demodulate the raw ADC waveforms of many channels and pulses in parallel,
+    and derive the amplitude/phase waveforms and the pulse information. The
+    processing chain of each record is the demodulator (``noniq_demod``,
+    ``twop_demod`` or ``self_demod_ap``), ``iq2ap_wf``, ``norm_phase`` and
+    ``pulse_info``.
+
+    The records of a task are processed as one block (no loop over the records).
+    The cost is then bound by the memory passes of the demodulator, ``arctan2``
+    and the pulse information: about 11-13 ms per pulse of 16 channels x 16384
+    samples on one core with ``noniq``, i.e. about 80-90 pulses/s per core or,
+    with linear scaling, about 700 pulses/s on 8 cores (plus the copy out of the
+    shared memory), which is below 1000 pulses/s.
+
+    Parameters:
+        raw:       numpy array, raw waveforms with samples along the last axis,
+                    e.g., (pulses x channels x samples)
+        method:    string, ``noniq``, ``twop`` or ``self``, demodulation method
+        demod_par: dict, parameters of the demodulator: ``n`` and ``m`` for ``noniq``;
+                    ``f_if`` and ``fs`` for ``twop``; ``n`` for ``self``
+        threshold: float, threshold for pulse edge detection (see ``pulse_info``)
+        pha_cmd:   string, ``+-180`` or ``0to360`` (see ``norm_phase``)
+        n_proc:    int, number of worker processes (None for the CPU count, 1 to
+                    execute in the calling process)
+        block:     int, number of records per task (None to derive from ``n_proc``)
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        I, Q:      numpy array, I/Q waveforms, same shape as ``raw``
+        A, P:      numpy array, amplitude/phase waveforms, P in degree
+        peak, offs, pulw, rise, fall, flat_offs, flat_w, flat_avg, energy:
+                   numpy array, pulse information (see ``pulse_info``) with the
+                    shape of ``raw`` excluding the last axis
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (not isinstance(raw, np.ndarray)) or (raw.ndim < 1) or (raw.shape[-1] < 3) or \
+       (method not in ('noniq', 'twop', 'self')):
+        return result
+
+    if demod_par is None:
+        demod_par = {}
+    if ((method == 'noniq') and ('n' not in demod_par)) or \
+       ((method == 'twop')  and (('f_if' not in demod_par) or ('fs' not in demod_par))):
+        return result
+
+    # collect the records as rows
+    shape = raw.shape
+    N     = shape[-1]
+    n_rec = int(np.prod(shape[:-1]))
+    if n_proc is None:
+        n_proc = os.cpu_count() or 1
+
+    # execute in the calling process with the arrays in the local memory
+    if min(int(n_proc), n_rec) <= 1:
+        bufs = {'raw':   np.ascontiguousarray(raw, dtype = float).reshape((n_rec, N)),
+                'I':     np.empty((n_rec, N)),
+                'Q':     np.empty((n_rec, N)),
+                'A':     np.empty((n_rec, N)),
+                'P':     np.empty((n_rec, N)),
+                'pulse': np.empty((n_rec, len(_pulse_items)))}
+        status, rets = run_parallel(_demod_task, bufs, None, n_rec,
+                                    args   = (method, demod_par, threshold, pha_cmd),
+                                    n_proc = 1,
+                                    block  = block)
+        if status and all(rets):
+            _demod_gather(result, bufs, shape, copy = False)
+        return result
+
+    # place the input and output arrays in shared memory (the input is converted
+    # while being copied)
+    status, bufs, specs, shms = shm_create({'raw':   ((n_rec, N), float),
+                                            'I':     ((n_rec, N), float),
+                                            'Q':     ((n_rec, N), float),
+                                            'A':     ((n_rec, N), float),
+                                            'P':     ((n_rec, N), float),
+                                            'pulse': ((n_rec, len(_pulse_items)), float)})
+    if not status:
+        return result
+
+    try:
+        # run the pipeline
+        bufs['raw'][...] = raw.reshape((n_rec, N))
+        status, rets = run_parallel(_demod_task, bufs, specs, n_rec,
+                                    args   = (method, demod_par, threshold, pha_cmd),
+                                    n_proc = n_proc,
+                                    block  = block)
+        if status and all(rets):
+            _demod_gather(result, bufs, shape, copy = True)
+
+    finally:
+        shm_release(shms)
+
+    return result
+
+def _demod_gather(result, bufs, shape, copy):
+    '''
+    Collect the results of ``demod_pipeline`` (copied out of the shared memory).
+    '''
+    for key in ('I', 'Q', 'A', 'P'):
+        result[key] = np.array(bufs[key], copy = copy).reshape(shape)
+    for i, key in enumerate(_pulse_items):
+        val = bufs['pulse'][:, i].reshape(shape[:-1])
+        result[key] = val.astype(int) if key in ('offs', 'pulw', 'rise', 'fall', 'flat_offs', 'flat_w') \
+                      else np.array(val)
+    result['status'] = True
+
+# per-pulse cavity parameters collected by the pipeline
+_cav_par_items = ['half_bw', 'detuning', 'wh_pul', 'dw_pul']
+
+def _cav_par_task(bufs, ids, ide, decay_ids, decay_ide, pul_ids, pul_ide, Ts, beta):
+    '''
+    Derive the cavity parameters of the pulses ``ids`` to ``ide - 1``.
+    '''
+    vc  = np.asarray(bufs['vc'][ids:ide])
+    out = bufs['par']
+
+    # half-bandwidth and detuning from the decay
+    status1, out[ids:ide, 0] = half_bw_decay (np.abs(vc), decay_ids, decay_ide, Ts)
+    status2, out[ids:ide, 1] = detuning_decay(np.angle(vc, deg = True), decay_ids, decay_ide, Ts)
+    if not (status1 and status2):
+        return False
+
+    # average intra-pulse half-bandwidth and detuning
+    if 'vf' in bufs:
+        vf = np.asarray(bufs['vf'][ids:ide])
+        status, wh_pul, dw_pul = cav_par_pulse(vc[:, pul_ids:pul_ide], vf[:, pul_ids:pul_ide], 
+                                               out[ids:ide, 0], Ts, beta = beta)
+        if not status:
+            return False
+        out[ids:ide, 2] = np.mean(wh_pul, axis = -1)
+        out[ids:ide, 3] = np.mean(dw_pul, axis = -1)
+
+    return True
+
+def cav_par_pipeline(vc, decay_ids, decay_ide, Ts, vf = None, pul_ids = 0, pul_ide = None,
+                     beta = 1e4, n_proc = None, block = 1024):
+    '''
+    Derive the cavity parameters of many pulses in parallel as compact per-pulse
+    time series, e.g., for the trend analysis of the loaded Q and detuning. The
+    half-bandwidth and detuning are fitted in the pulse decay (``half_bw_decay``
+    and ``detuning_decay``). If the forward waveforms are given, the intra-pulse
+    half-bandwidth and detuning (``cav_par_pulse``, with the half-bandwidth of
+    the decay of each pulse) are averaged in a window. The inputs can be 
+    memory-mapped files, which are read block by block by the worker processes.
+
+    Refer to LLRF Book section 9.4.3.
+
+    Parameters:
+        vc:        numpy array (complex), cavity probe waveforms (pulses x samples)
+        decay_ids: int, starting index of the decay window
+        decay_ide: int, ending index of the decay window
+        Ts:        float, sampling time, s
+        vf:        numpy array (complex), cavity forward waveforms (calibrated to
+                    the same reference plane as the cavity probe), same shape as ``vc``
+        pul_ids:   int, starting index of the window for averaging the intra-pulse 
+                    parameters
+        pul_ide:   int, ending index of the window (None for the end of the waveforms)
+        beta:      float, input coupling factor (see ``cav_par_pulse``)
+        n_proc:    int, number of worker processes (None for the CPU count, 1 to
+                    execute in the calling process)
+        block:     int, number of pulses per task
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        half_bw:   numpy array, half-bandwidth of each pulse from decay, rad/s
+        detuning:  numpy array, detuning of each pulse from decay, rad/s
+        wh_pul:    numpy array, average intra-pulse half-bandwidth, rad/s (if ``vf`` given)
+        dw_pul:    numpy array, average intra-pulse detuning, rad/s (if ``vf`` given)
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (not isinstance(vc, np.ndarray)) or (vc.ndim != 2) or (Ts <= 0.0) or \
+       (decay_ids <= 0) or (decay_ide <= decay_ids) or (decay_ide > vc.shape[1]):
+        return result
+    if (vf is not None) and (vf.shape != vc.shape):
+        return result
+
+    pul_ide = vc.shape[1] if pul_ide is None else pul_ide
+    if (vf is not None) and (pul_ide - pul_ids < 3):
+        return result
+
+    # place the input and output arrays in shared memory
+    n_rec  = vc.shape[0]
+    arrays = {'vc':  vc,
+              'par': ((n_rec, len(_cav_par_items)), float)}
+    if vf is not None:
+        arrays['vf'] = vf
+    status, bufs, specs, shms = shm_create(arrays)
+    if not status:
+        return result
+
+    try:
+        # run the pipeline
+        status, rets = run_parallel(_cav_par_task, bufs, specs, n_rec,
+                                    args   = (decay_ids, decay_ide, pul_ids, pul_ide, Ts, beta),
+                                    n_proc = n_proc,
+                                    block  = block)
+        if not (status and all(rets)):
+            return result
+
+        # gather the results
+        n_item = len(_cav_par_items) if vf is not None else 2
+        for i, key in enumerate(_cav_par_items[:n_item]):
+            result[key] = np.array(bufs['par'][:, i])
+        result['status'] = True
+
+    finally:
+        shm_release(shms)
+
+    return result
+
+# calibration results collected by the pipeline (per cavity and pulse)
+_calib_items = ['a', 'b', 'c', 'd', 'm', 'n', 'res_vprobe', 'res_vf']
+
+def _calib_for_ref_task(bufs, ids, ide, pul_ids, pul_ide, half_bw, detuning, Ts, beta, 
+                        decay_ids, decay_ide):
+    '''
+    Calibrate the forward/reflected signals of the cavities ``ids`` to ``ide - 1``.
+    '''
+    for k in range(ids, ide):
+        result = calib_for_ref_batch(np.asarray(bufs['vc'][k]), 
+                                     np.asarray(bufs['vf_m'][k]), 
+                                     np.asarray(bufs['vr_m'][k]), 
+                                     pul_ids, pul_ide, half_bw[k], detuning[k], Ts, 
+                                     beta      = beta[k], 
+                                     decay_ids = decay_ids, 
+                                     decay_ide = decay_ide)
+        if not result['status']:
+            return False
+        for i, key in enumerate(_calib_items):
+            bufs['coef'][k, :, i] = result[key]
+    return True
+
+def calib_for_ref_pipeline(vc, vf_m, vr_m, pul_ids, pul_ide, half_bw, detuning, Ts, 
+                           beta = None, decay_ids = None, decay_ide = None, 
+                           n_proc = None, block = 1):
+    '''
+    Calibrate the forward and reflected signals of many cavities with multiple
+    pulses, the cavities are processed in parallel. For each cavity, the 
+    calibration of all pulses is solved at once with ``calib_for_ref_batch``, 
+    and the coefficients are averaged over the pulses.
+
+    Parameters:
+        vc:        numpy array (complex), cavity probe waveforms (cavities x pulses x samples)
+        vf_m:      numpy array (complex), cavity forward waveforms (meas.)
+        vr_m:      numpy array (complex), cavity reflected waveforms (meas.)
+        pul_ids:   int, starting index for calculation
+        pul_ide:   int, ending index for calculation
+        half_bw:   float or numpy array (per cavity), half bandwidth, rad/s
+        detuning:  float or numpy array (per cavity), detuning, rad/s
+        Ts:        float, sampling time, s
+        beta:      float or numpy array (per cavity), input coupling factor (None
+                    for the default of the method, see ``calib_for_ref_batch``)
+        decay_ids: int, starting id of the decay window (SC cavities, see 
+                    ``calib_for_ref_batch``)
+        decay_ide: int, ending id of the decay window (SC cavities)
+        n_proc:    int, number of worker processes (None for the CPU count, 1 to
+                    execute in the calling process)
+        block:     int, number of cavities per task
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        a, b, c, d: numpy array (complex), calibration coefficients averaged over 
+                    the pulses (cavities,)
+        coef_std:  numpy array, standard deviation of the coefficients a, b, c, d 
+                    over the pulses (cavities x 4)
+        a_pul, b_pul, c_pul, d_pul, m_pul, n_pul:
+                   numpy array (complex), coefficients of each pulse (cavities x pulses)
+        res_vprobe, res_vf: 
+                   numpy array, relative RMS residuals of each pulse (cavities x 
+                    pulses, see ``calib_for_ref_batch``)
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (not isinstance(vc, np.ndarray)) or (vc.ndim != 3) or \
+       (not (vc.shape == vf_m.shape == vr_m.shape)):
+        return result
+
+    if beta is None:
+        beta = 1e4 if (decay_ids is not None) and (decay_ide is not None) else 1.0
+
+    n_cav, n_pul = vc.shape[0], vc.shape[1]
+    half_bw  = np.broadcast_to(np.asarray(half_bw,  dtype = float), (n_cav,))
+    detuning = np.broadcast_to(np.asarray(detuning, dtype = float), (n_cav,))
+    beta     = np.broadcast_to(np.asarray(beta,     dtype = float), (n_cav,))
+
+    # place the input and output arrays in shared memory
+    status, bufs, specs, shms = shm_create({'vc':   vc,
+                                            'vf_m': vf_m,
+                                            'vr_m': vr_m,
+                                            'coef': ((n_cav, n_pul, len(_calib_items)), complex)})
+    if not status:
+        return result
+
+    try:
+        # run the pipeline
+        status, rets = run_parallel(_calib_for_ref_task, bufs, specs, n_cav,
+                                    args   = (pul_ids, pul_ide, half_bw, detuning, Ts, beta,
+                                              decay_ids, decay_ide),
+                                    n_proc = n_proc,
+                                    block  = block)
+        if not (status and all(rets)):
+            return result
+
+        # gather the results
+        coef = np.array(bufs['coef'])
+        for i, key in enumerate(_calib_items):
+            if key.startswith('res'):
+                result[key] = np.real(coef[..., i])
+            else:
+                result[key + '_pul'] = coef[..., i]
+        for key in ('a', 'b', 'c', 'd'):
+            result[key] = np.mean(result[key + '_pul'], axis = -1)
+        result['coef_std'] = np.std(coef[..., :4], axis = 1)
+        result['status']   = True
+
+    finally:
+        shm_release(shms)
+
+    return result
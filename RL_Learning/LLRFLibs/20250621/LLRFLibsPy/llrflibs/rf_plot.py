@@ -9,11 +9,71 @@
 Here collects all plotting functions. The goal is to avoid importing the 
 "matplotlib" module in the algorithm codes to enable running the algorithms
 in an embedded CPU where the "matplotlib" is not installed
+
+Long waveforms are plotted as their min/max envelopes decimated to the screen
+resolution (see ``decim_pyramid`` in the ``rf_misc`` module), which are updated
+from a cached pyramid when zooming, so that the redrawing time does not depend
+on the waveform length.
+
+Implemented:
+    - plot_decim : plot a long waveform as min/max envelope updated when zooming
 #########################################################################
 '''
 import numpy as np
 import matplotlib.pyplot as plt
 
+from llrflibs.rf_misc import decim_pyramid, decim_pyramid_get
+
+# waveforms longer than this are plotted with decimation
+_plot_n_decim = 10000
+
+def plot_decim(x, y, *args, ax = None, n_pix = None, **kwargs):
+    '''
+    Plot a long waveform as its min/max envelope of ``n_pix`` bins. The envelope
+    is derived from a multi-resolution pyramid and updated when the x-limits of
+    the axes change (e.g., zooming or panning).
+
+    Parameters:
+        x:      numpy array, x-coordinate (monotonically increasing) of the 
+                 samples, sample index if None
+        y:      numpy array, 1D waveform
+        args:   other positional arguments of ``plot`` (e.g., format string)
+        ax:     matplotlib axes, current axes if None
+        n_pix:  int, number of bins, the width of the axes in pixels if None
+        kwargs: other keyword arguments of ``plot``
+        
+    Returns:
+        line:   matplotlib line of the plot
+    '''
+    ax = plt.gca() if ax is None else ax
+    _, pyr = decim_pyramid(y, x)
+
+    # envelope of the visible range, the pyramid is kept by the callback
+    def _envelope(xlim = (None, None)):
+        n = n_pix if n_pix is not None else max(int(ax.get_window_extent().width), 100)
+        return decim_pyramid_get(pyr, n, *xlim)
+
+    def _update(ax_cb):
+        status, xd, yd = _envelope(ax_cb.get_xlim())
+        if status:
+            line.set_data(xd, yd)
+
+    _, xd, yd = _envelope()
+    line,     = ax.plot(xd, yd, *args, **kwargs)
+    ax.callbacks.connect('xlim_changed', _update)
+    return line
+
+def _plot(x, y, *args, **kwargs):
+    '''
+    Plot with ``plt.plot``, or with ``plot_decim`` for long waveforms with 
+    monotonically increasing x-coordinate.
+    '''
+    x, y = np.asarray(x), np.asarray(y)
+    if (y.ndim == 1) and (x.shape == y.shape) and (y.size > _plot_n_decim) and \
+       np.isrealobj(y) and np.all(x[1:] >= x[:-1]):
+        return plot_decim(x, y, *args, **kwargs)
+    return plt.plot(x, y, *args, **kwargs)[0]
+
 def plot_ss_discrete(fc, Ac_dB, Pc_deg, fd, Ad_dB, Pd_deg, Ts):
     '''
     Plot the frequency responses of the continous and discrete state-space
@@ -21,8 +81,8 @@ def plot_ss_discrete(fc, Ac_dB, Pc_deg, fd, Ad_dB, Pd_deg, Ts):
     '''
     plt.figure()
     plt.subplot(2,1,1)
-    plt.plot(fc, Ac_dB, label = 'Continous')
-    plt.plot(fd, Ad_dB, label = 'Discrete')
+    _plot(fc, Ac_dB, label = 'Continous')
+    _plot(fd, Ad_dB, label = 'Discrete')
     plt.axvline( 0.5 / Ts, ls = '--')
     plt.axvline(-0.5 / Ts, ls = '--')
     plt.legend()
@@ -30,8 +90,8 @@ def plot_ss_discrete(fc, Ac_dB, Pc_deg, fd, Ad_dB, Pd_deg, Ts):
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Magnitude (dB)')
     plt.subplot(2,1,2)
-    plt.plot(fc, Pc_deg, label = 'Continous')
-    plt.plot(fd, Pd_deg, label = 'Discrete')
+    _plot(fc, Pc_deg, label = 'Continous')
+    _plot(fd, Pd_deg, label = 'Discrete')
     plt.axvline( 0.5 / Ts, ls = '--')
     plt.axvline(-0.5 / Ts, ls = '--')
     plt.legend()
@@ -48,7 +108,7 @@ def plot_ss_freqresp(f_wf, A_wf_dB, P_wf_deg, h, fs, Ts, title):
     '''
     plt.figure()
     plt.subplot(2,2,1)                          # bode plot
-    plt.plot(f_wf, A_wf_dB)
+    _plot(f_wf, A_wf_dB)
     if Ts is not None:
         plt.axvline( fs / 2, ls = '--')
         plt.axvline(-fs / 2, ls = '--')
@@ -56,7 +116,7 @@ def plot_ss_freqresp(f_wf, A_wf_dB, P_wf_deg, h, fs, Ts, title):
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Magnitude (dB)')
     plt.subplot(2,2,3)
-    plt.plot(f_wf, P_wf_deg)
+    _plot(f_wf, P_wf_deg)
     if Ts is not None:
         plt.axvline( fs / 2, ls = '--')
         plt.axvline(-fs / 2, ls = '--')
@@ -64,9 +124,9 @@ def plot_ss_freqresp(f_wf, A_wf_dB, P_wf_deg, h, fs, Ts, title):
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Phase (deg)')
     plt.subplot(1,2,2)                          # Nyquist plot (need to plot +/- frequencies differently)
-    plt.plot(np.real(h[f_wf >= 0.0]), np.imag(h[f_wf >= 0.0]), label = 'Positive Frequency')
-    plt.plot(np.real(h[f_wf <  0.0]), np.imag(h[f_wf <  0.0]), label = 'Negative Frequency')
-    plt.plot([-1], [0], '*')
+    _plot(np.real(h[f_wf >= 0.0]), np.imag(h[f_wf >= 0.0]), label = 'Positive Frequency')
+    _plot(np.real(h[f_wf <  0.0]), np.imag(h[f_wf <  0.0]), label = 'Negative Frequency')
+    _plot([-1], [0], '*')
     plt.legend()
     plt.grid()
     plt.xlabel('Real')
@@ -81,13 +141,13 @@ def plot_basic_rf_controller(w, h):
     '''
     plt.figure()
     plt.subplot(2,1,1)
-    plt.plot(w / 2 / np.pi, 20*np.log10(np.abs(h)), label = 'Controller')
+    _plot(w / 2 / np.pi, 20*np.log10(np.abs(h)), label = 'Controller')
     plt.legend()
     plt.grid()
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Magnitude (dB)')
     plt.subplot(2,1,2)
-    plt.plot(w / 2 / np.pi, np.angle(h, deg = True), label = 'Controller')
+    _plot(w / 2 / np.pi, np.angle(h, deg = True), label = 'Controller')
     plt.legend()
     plt.grid()
     plt.xlabel('Frequency (Hz)')
@@ -102,9 +162,9 @@ def plot_loop_analysis(f_wf, L, S, T, fs, Ts, label):
     '''
     plt.figure()
     plt.subplot(2,2,1)                          # bode plot
-    plt.plot(f_wf, 20*np.log10(np.abs(L)),       label = 'L')
-    plt.plot(f_wf, 20*np.log10(np.abs(S)), '-.', label = 'S')
-    plt.plot(f_wf, 20*np.log10(np.abs(T)), ':',  label = 'T')
+    _plot(f_wf, 20*np.log10(np.abs(L)),       label = 'L')
+    _plot(f_wf, 20*np.log10(np.abs(S)), '-.', label = 'S')
+    _plot(f_wf, 20*np.log10(np.abs(T)), ':',  label = 'T')
     if Ts is not None:
         plt.axvline( fs / 2, ls = '--')
         plt.axvline(-fs / 2, ls = '--')
@@ -115,9 +175,9 @@ def plot_loop_analysis(f_wf, L, S, T, fs, Ts, label):
     plt.title('Amplitude Response of L/S/T')
 
     plt.subplot(2,2,3)
-    plt.plot(f_wf, np.angle(L, deg = True),       label = 'L')
-    plt.plot(f_wf, np.angle(S, deg = True), '-.', label = 'S')
-    plt.plot(f_wf, np.angle(T, deg = True), ':',  label = 'T')
+    _plot(f_wf, np.angle(L, deg = True),       label = 'L')
+    _plot(f_wf, np.angle(S, deg = True), '-.', label = 'S')
+    _plot(f_wf, np.angle(T, deg = True), ':',  label = 'T')
     if Ts is not None:
         plt.axvline( fs / 2, ls = '--')
         plt.axvline(-fs / 2, ls = '--')
@@ -130,9 +190,9 @@ def plot_loop_analysis(f_wf, L, S, T, fs, Ts, label):
     plt.title('Phase Response of L/S/T')
 
     plt.subplot(1,2,2)                          # Nyquist plot (need to plot +/- frequencies differently)
-    plt.plot(np.real(L[f_wf >= 0.0]), np.imag(L[f_wf >= 0.0]), label = 'Positive Frequency')
-    plt.plot(np.real(L[f_wf <  0.0]), np.imag(L[f_wf <  0.0]), label = 'Negative Frequency')
-    plt.plot([-1], [0], '*')
+    _plot(np.real(L[f_wf >= 0.0]), np.imag(L[f_wf >= 0.0]), label = 'Positive Frequency')
+    _plot(np.real(L[f_wf <  0.0]), np.imag(L[f_wf <  0.0]), label = 'Negative Frequency')
+    _plot([-1], [0], '*')
     plt.legend()
     plt.grid()
     plt.xlabel('Real')
@@ -148,7 +208,7 @@ def plot_calc_psd(result):
     ``rf_noise`` module.
     '''
     plt.figure()
-    plt.plot(result['freq'], result['amp_resp'])
+    _plot(result['freq'], result['amp_resp'])
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Magnitude (dBFS/Hz)')
     plt.grid()
@@ -161,15 +221,15 @@ def plot_cav_ss(wrf, hrf, wbm, hbm):
     '''
     plt.figure()
     plt.subplot(2,1,1)
-    plt.plot(wrf / 2 / np.pi, 20*np.log10(np.abs(hrf)), label = 'Cavity resp. to RF drive')
-    plt.plot(wbm / 2 / np.pi, 20*np.log10(np.abs(hbm)), label = 'Cavity resp. to beam drive')
+    _plot(wrf / 2 / np.pi, 20*np.log10(np.abs(hrf)), label = 'Cavity resp. to RF drive')
+    _plot(wbm / 2 / np.pi, 20*np.log10(np.abs(hbm)), label = 'Cavity resp. to beam drive')
     plt.legend()
     plt.grid()
     plt.xlabel('Frequency (Hz)')
     plt.ylabel('Magnitude (dB)')
     plt.subplot(2,1,2)
-    plt.plot(wrf / 2 / np.pi, np.angle(hrf, deg = True), label = 'Cavity resp. to RF drive')
-    plt.plot(wbm / 2 / np.pi, np.angle(hbm, deg = True), label = 'Cavity resp. to beam drive')
+    _plot(wrf / 2 / np.pi, np.angle(hrf, deg = True), label = 'Cavity resp. to RF drive')
+    _plot(wbm / 2 / np.pi, np.angle(hbm, deg = True), label = 'Cavity resp. to beam drive')
     plt.legend()
     plt.grid()
     plt.xlabel('Frequency (Hz)')
@@ -185,16 +245,16 @@ def plot_rf_power_req(Pfor, Pref, QL_vec):
     plt.figure()
     plt.subplot(1,2,1)
     for dw in Pfor.keys():
-        plt.plot(QL_vec, Pfor[dw] / 1000.0, 
-                 label = 'Detuning = {:.1f} Hz'.format(dw/2/np.pi))
+        _plot(QL_vec, Pfor[dw] / 1000.0, 
+              label = 'Detuning = {:.1f} Hz'.format(dw/2/np.pi))
     plt.legend()
     plt.grid()
     plt.xlabel(r'$Q_L$')
     plt.ylabel(r'$P_{for}$ (kW)')
     plt.subplot(1,2,2)
     for dw in Pfor.keys():
-        plt.plot(QL_vec, Pref[dw] / 1000.0, 
-                 label = 'Detuning = {:.1f} Hz'.format(dw/2/np.pi))
+        _plot(QL_vec, Pref[dw] / 1000.0, 
+              label = 'Detuning = {:.1f} Hz'.format(dw/2/np.pi))
     plt.legend()
     plt.grid()
     plt.xlabel(r'$Q_L$')
@@ -206,7 +266,7 @@ def plot_plot_ellipse(X, Y):
     Plot the ellipse, used in function ``plot_ellipse`` of the ``rf_misc`` module.
     '''
     plt.figure()
-    plt.plot(X, Y, '-*')
+    _plot(X, Y, '-*')
     plt.xlabel('X')
     plt.ylabel('Y')
     plt.grid()
@@ -219,7 +279,7 @@ def plot_plot_Guassian(X, Y):
     ``rf_misc`` module.
     '''
     plt.figure()
-    plt.plot(X, Y, '-*')
+    _plot(X, Y, '-*')
     plt.xlabel('X')
     plt.ylabel('Probability (not normalized)')
     plt.grid()
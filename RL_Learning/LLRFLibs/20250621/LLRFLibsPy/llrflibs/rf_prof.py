@@ -0,0 +1,321 @@
+"""Profile the calls of the library functions."""
+#############################################################################
+#  Copyright (c) 2023 by Paul Scherrer Institute, Switzerland
+#  All rights reserved.
+#  Authors: Zheqiao Geng
+#############################################################################
+'''
+#########################################################################
+Here collects routines for profiling the library functions
+
+Implemented:
+    - prof_enable     : instrument the public functions of the llrflibs modules
+                        and start recording
+    - prof_disable    : stop recording and remove the instrumentation
+    - prof_session    : context manager to profile a block of code
+    - prof_reset      : clear the recorded statistics
+    - prof_stats      : get the statistics (calls, cumulative/percentile latency
+                        and array sizes) per function
+    - prof_table      : format the statistics as a text table
+    - prof_save       : save the statistics into a JSON file
+
+Note:
+    Nothing is instrumented by default, the functions are called directly.
+    The profiling is enabled by:
+
+    * the environment variable ``LLRFLIBS_PROF=1``, the modules are instrumented
+      when imported and the statistics are printed when Python exits (or saved
+      to the file given by ``LLRFLIBS_PROF_OUT``, as JSON if ending with ".json").
+      This covers all references, also the ones made by ``from ... import *``.
+    * the context manager, e.g.,
+
+          with prof_session(globals()):
+              ...
+          print(prof_table())
+
+      the functions are replaced in the loaded llrflibs modules and in the given
+      namespace (e.g., ``globals()`` of a script using ``from ... import *``).
+      References kept elsewhere are not instrumented.
+
+    The latency is the wall time including the calls to other library functions
+    (inclusive). The recording costs a few us per call. The percentiles are
+    calculated from the latest ``_prof_n_keep`` calls of each function.
+#########################################################################
+'''
+import os
+import sys
+import json
+import time
+import types
+import atexit
+import functools
+import contextlib
+import numpy as np
+
+# number of latest latencies kept per function for the percentiles
+_prof_n_keep = 100000
+
+# recording flag, statistics and the instrumented functions
+_prof_on       = False
+_prof_env      = False                          # instrumented by environment variable
+_prof_data     = {}                             # name: [calls, total, min, max, latencies, size_sum, size_max]
+_prof_wrappers = {}                             # original function: wrapper
+
+def _prof_is_lib(mod_name):
+    return mod_name.startswith('llrflibs.') and mod_name != __name__
+
+def _prof_record(name, dt, args, kwargs):
+    '''
+    Update the statistics of a function with a call.
+    '''
+    size = 0
+    for a in args:
+        if isinstance(a, np.ndarray):
+            size += a.size
+    if kwargs:
+        for a in kwargs.values():
+            if isinstance(a, np.ndarray):
+                size += a.size
+
+    s = _prof_data.get(name)
+    if s is None:
+        s = _prof_data[name] = [0, 0.0, dt, dt, [], 0, 0]
+    lat = s[4]
+    if len(lat) < _prof_n_keep:
+        lat.append(dt)
+    else:
+        lat[s[0] % _prof_n_keep] = dt           # ring buffer of the latest calls
+    s[0] += 1
+    s[1] += dt
+    s[5] += size
+    if dt < s[2]:
+        s[2] = dt
+    if dt > s[3]:
+        s[3] = dt
+    if size > s[6]:
+        s[6] = size
+
+def _prof_wrap(func):
+    '''
+    Instrument a function (the same wrapper is returned for the same function).
+    '''
+    if func in _prof_wrappers:
+        return _prof_wrappers[func]
+    name = func.__module__.split('.')[-1] + '.' + func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _prof_on:
+            return func(*args, **kwargs)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _prof_record(name, time.perf_counter() - t0, args, kwargs)
+
+    wrapper._llrflibs_prof = True
+    _prof_wrappers[func] = wrapper
+    return wrapper
+
+def _prof_wrap_ns(ns):
+    '''
+    Replace the public library functions in a namespace with the wrappers.
+    '''
+    for key, val in list(ns.items()):
+        if isinstance(val, types.FunctionType) and \
+           not val.__name__.startswith('_') and \
+           not getattr(val, '_llrflibs_prof', False) and \
+           _prof_is_lib(val.__module__ or ''):
+            ns[key] = _prof_wrap(val)
+
+def _prof_unwrap_ns(ns):
+    '''
+    Restore the original functions in a namespace.
+    '''
+    for key, val in list(ns.items()):
+        if isinstance(val, types.FunctionType) and getattr(val, '_llrflibs_prof', False):
+            ns[key] = val.__wrapped__
+
+class _ProfFinder:
+    '''
+    Import hook instrumenting the llrflibs modules when they are imported.
+    '''
+    def find_spec(self, fullname, path, target = None):
+        if not _prof_is_lib(fullname):
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            exec_module = spec.loader.exec_module
+            def exec_wrapped(module):
+                exec_module(module)
+                _prof_wrap_ns(module.__dict__)
+            spec.loader.exec_module = exec_wrapped
+        return spec
+
+_prof_finder = _ProfFinder()
+
+def prof_enable(namespace = None):
+    '''
+    Instrument the public functions of the llrflibs modules (the loaded ones
+    and the ones imported later) and start recording.
+
+    Parameters:
+        namespace: dict, additional namespace whose references to the library
+                    functions are also instrumented (e.g., ``globals()``)
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    global _prof_on
+    if _prof_finder not in sys.meta_path:
+        sys.meta_path.insert(0, _prof_finder)
+    for name, mod in list(sys.modules.items()):
+        if _prof_is_lib(name) and mod is not None:
+            _prof_wrap_ns(mod.__dict__)
+    if namespace is not None:
+        _prof_wrap_ns(namespace)
+    _prof_on = True
+    return True
+
+def prof_disable(namespace = None):
+    '''
+    Stop recording and restore the original functions (the instrumentation is
+    kept if enabled by the environment variable, only the recording stops).
+
+    Parameters:
+        namespace: dict, additional namespace given to ``prof_enable``
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    global _prof_on
+    _prof_on = False
+    if _prof_env:
+        return True
+    if _prof_finder in sys.meta_path:
+        sys.meta_path.remove(_prof_finder)
+    for name, mod in list(sys.modules.items()):
+        if _prof_is_lib(name) and mod is not None:
+            _prof_unwrap_ns(mod.__dict__)
+    if namespace is not None:
+        _prof_unwrap_ns(namespace)
+    return True
+
+@contextlib.contextmanager
+def prof_session(namespace = None, reset = True):
+    '''
+    Context manager profiling the library calls of a block of code.
+
+    Parameters:
+        namespace: dict, additional namespace whose references to the library
+                    functions are also instrumented (e.g., ``globals()``)
+        reset:     boolean, True to clear the statistics of the last sessions
+    '''
+    on = _prof_on
+    if reset:
+        prof_reset()
+    prof_enable(namespace)
+    try:
+        yield
+    finally:
+        if on:                                  # nested in an enabled profiling
+            prof_enable(namespace)
+        else:
+            prof_disable(namespace)
+
+def prof_reset():
+    '''
+    Clear the recorded statistics.
+    '''
+    _prof_data.clear()
+
+def prof_stats():
+    '''
+    Get the statistics of the called functions.
+
+    Returns:
+        stats: dict, with the function name ("module.function") as key and a
+                dict of the following items as value (time in s):
+                ``calls``, ``total``, ``mean``, ``min``, ``max``, ``p50``, ``p90``,
+                ``p99``, ``size_mean`` and ``size_max`` (total number of elements
+                of the numpy array arguments)
+    '''
+    stats = {}
+    for name, s in list(_prof_data.items()):
+        p50, p90, p99 = np.percentile(s[4], [50, 90, 99])
+        stats[name] = {'calls':     s[0],
+                       'total':     s[1],
+                       'mean':      s[1] / s[0],
+                       'min':       s[2],
+                       'max':       s[3],
+                       'p50':       float(p50),
+                       'p90':       float(p90),
+                       'p99':       float(p99),
+                       'size_mean': s[5] / s[0],
+                       'size_max':  s[6]}
+    return stats
+
+def prof_table(sort = 'total', top = None):
+    '''
+    Format the statistics as a text table (time in us).
+
+    Parameters:
+        sort:  string, item of ``prof_stats`` to sort the functions (descending)
+        top:   int, number of functions shown (None for all)
+    Returns:
+        table: string, the table
+    '''
+    stats = prof_stats()
+    names = sorted(stats, key = lambda n: stats[n][sort], reverse = True)[:top]
+    lines = ['{:32s} {:>9s} {:>12s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}'.format(
+             'function', 'calls', 'total (ms)', 'mean (us)', 'p50 (us)', 'p90 (us)', 'p99 (us)', 'size')]
+    for n in names:
+        s = stats[n]
+        lines.append('{:32s} {:9d} {:12.3f} {:10.1f} {:10.1f} {:10.1f} {:10.1f} {:10.0f}'.format(
+                     n, s['calls'], s['total'] * 1e3, s['mean'] * 1e6, s['p50'] * 1e6,
+                     s['p90'] * 1e6, s['p99'] * 1e6, s['size_mean']))
+    return '\n'.join(lines)
+
+def prof_save(file_name):
+    '''
+    Save the statistics into a JSON file.
+
+    Parameters:
+        file_name: string, full file name including path
+    Returns:
+        status:    boolean, success (True) or fail (False)
+    '''
+    try:
+        with open(file_name, 'w') as f:
+            json.dump({'time':  time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'pid':   os.getpid(),
+                       'stats': prof_stats()}, f, indent = 1)
+    except OSError:
+        return False
+    return True
+
+def _prof_exit():
+    if not _prof_data:
+        return
+    file_name = os.environ.get('LLRFLIBS_PROF_OUT', '')
+    if file_name.endswith('.json'):
+        prof_save(file_name)
+    elif file_name:
+        with open(file_name, 'w') as f:
+            f.write(prof_table() + '\n')
+    else:
+        sys.stderr.write(prof_table() + '\n')
+
+def _prof_from_env():
+    '''
+    Enable the profiling for the whole process (``LLRFLIBS_PROF=1``).
+    '''
+    global _prof_env
+    _prof_env = True
+    prof_enable()
+    atexit.register(_prof_exit)
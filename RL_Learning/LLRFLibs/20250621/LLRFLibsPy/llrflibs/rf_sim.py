@@ -33,7 +33,9 @@ https://link.springer.com/book/10.1007/978-3-030-94419-3 ("LLRF Book")
 #########################################################################
 '''
 import numpy as np
-from scipy import signal
+
+from llrflibs import _lazy_import
+signal = _lazy_import('scipy.signal')
 
 from llrflibs.rf_sysid import *
 from llrflibs.rf_misc import *
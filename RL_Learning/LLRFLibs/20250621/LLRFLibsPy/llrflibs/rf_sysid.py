@@ -10,7 +10,11 @@ Here collects routines for RF system identification
  
 Implemented:
     - prbs               : produce the PRBS signal for system identification
+    - prbs_period        : get a full period of the PRBS bits (cached in memory or on disk)
+    - prbs_seq           : produce the PRBS signal of a given order from an arbitrary offset
     - etfe               : Empirical Transfer Function Estimation (ETFE)
+    - etfe_accum         : accumulate the spectra of the ETFE batch by batch
+    - etfe_result        : get the H1/H2 estimators, coherence and variance from the accumulation
     - half_bw_decay      : calculate the cavity half-bandwidth from the RF pulse decay stage
     - detuning_decay     : calculate the cavity detuning from the RF pulse decay stage
     - cav_drv_est        : estimate the required cavity drive and reflected signals from probe signal
@@ -21,6 +25,9 @@ Implemented:
     - cav_beam_pulse_obs : calculate the beam drive voltage within the pulse using the ADRC observer
     - cav_observer       : construct the ADRC observer and estimate the denoised cavity voltage and the
                            general disturbances
+    - design_cav_observer: design the discrete ADRC observer for the step execution
+    - cav_par_step       : estimate the cavity parameters and general disturbance of a time step with
+                           the ADRC observer (supporting multiple cavities)
     - iden_impulse       : identify the impulse response of a real/complex SISO system from data
     - beta_powers        : identify the cavity input coupling factor using steady-state forw/refl powers
 
@@ -39,11 +46,164 @@ S. Simrock and Z. Geng, Low-Level Radio Frequency Systems, Springer, 2022
 https://link.springer.com/book/10.1007/978-3-030-94419-3 ("LLRF Book")
 #########################################################################
 '''
+import os
 import numpy as np
-from scipy import signal
+
+from llrflibs import _lazy_import
+signal    = _lazy_import('scipy.signal')
+sp_linalg = _lazy_import('scipy.linalg')
 
 from llrflibs.rf_misc import *
 
+# bit ids (start from 0) for XOR of the PRBS of different orders
+_prbs_taps = {  2:  [1, 0],
+                3:  [2, 1], 
+                4:  [3, 2], 
+                5:  [4, 2],
+                6:  [5, 4], 
+                7:  [6, 5], 
+                8:  [7, 5, 4, 3], 
+                9:  [8, 4],
+                10: [9, 6], 
+                11: [10, 8], 
+                12: [11, 10, 9, 3], 
+                13: [12, 11, 10, 7],
+                14: [13, 12, 11, 1], 
+                15: [14, 13], 
+                16: [15, 13, 12, 10], 
+                17: [16, 13],
+                18: [17, 10], 
+                19: [18, 17, 16, 13], 
+                20: [19, 2],
+                21: [20, 18],
+                22: [21, 20],
+                23: [22, 17], 
+                24: [23, 22, 21, 16],
+                25: [24, 21],
+                26: [25, 5, 1, 0],
+                27: [26, 4, 1, 0],
+                28: [27, 24],
+                29: [28, 26],
+                30: [29, 5, 3, 0],
+                31: [30, 27],
+                32: [31, 21, 1, 0]}
+
+# full periods of PRBS bits cached in memory (up to the order below)
+_prbs_periods   = {}
+_prbs_table_max = 24
+
+def _prbs_bits(nbit, n):
+    '''
+    Generate ``n`` bits (uint8) of the PRBS of order ``nbit`` with the LFSR 
+    initialized to 1. The LFSR is not executed bit by bit: the sequence obeys
+    ``s[i] = XOR(s[i - 2^j*(t+1)])`` for all taps ``t`` and any ``j >= 0`` (the
+    feedback polynomial squared in GF(2)), so a block of ``2^j*(min(t)+1)`` 
+    bits can be computed at once from the bits already available, and the 
+    block size grows geometrically with the generated length.
+    '''
+    taps = _prbs_taps[nbit]
+    lags = np.array(taps) + 1                       # bit id t of the LFSR is the output delayed by t+1
+    L    = int(lags.max())
+
+    # the initial LFSR state (1) is placed before the output bits
+    e        = np.zeros(L + n, dtype = np.uint8)
+    e[L - 1] = 1
+    pos      = L
+    while pos < L + n:
+        scale = 1 << int(np.floor(np.log2(pos / L)))    # largest 2^j with 2^j * L <= pos
+        b     = min(scale * int(lags.min()), L + n - pos)
+        blk   = e[pos - scale * lags[0] : pos - scale * lags[0] + b].copy()
+        for lag in lags[1:]:
+            blk ^= e[pos - scale * lag : pos - scale * lag + b]
+        e[pos:pos + b] = blk
+        pos += b
+
+    return e[L:]
+
+def prbs_period(nbit, cache_dir = None):
+    '''
+    Get a full period (``2^nbit - 1`` bits) of the PRBS of a given order (see 
+    ``prbs`` for the polynomials). The periods up to order 24 are cached in
+    memory. If ``cache_dir`` is given, the period is stored in the folder as a
+    ``.npy`` file when generated the first time, and is returned as a read-only
+    memory-mapped array, so that long sequences do not occupy the memory.
+
+    Parameters:
+        nbit:      int, order of the PRBS (2 to 32)
+        cache_dir: string, folder for caching the PRBS periods on disk
+        
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        bits:      numpy array (uint8), bits (0 or 1) of a full period
+    '''
+    # check the input
+    if nbit not in _prbs_taps.keys():
+        print('Error: Only support 2 to 32 bit PRBS!')
+        return False, None
+
+    # get from the memory cache
+    if (cache_dir is None) and (nbit in _prbs_periods):
+        return True, _prbs_periods[nbit]
+
+    # get from the disk cache or generate and store it
+    if cache_dir is not None:
+        file_name = os.path.join(cache_dir, 'prbs{}.npy'.format(nbit))
+        if not os.path.isfile(file_name):
+            # write to a temporary file (per process) and move it into place, so
+            # that a reader never sees a partially written file
+            os.makedirs(cache_dir, exist_ok = True)
+            file_tmp = '{}.{}.tmp'.format(file_name, os.getpid())
+            with open(file_tmp, 'wb') as f:
+                np.save(f, _prbs_bits(nbit, 2**nbit - 1))
+            os.replace(file_tmp, file_name)
+        return True, np.load(file_name, mmap_mode = 'r')
+
+    bits = _prbs_bits(nbit, 2**nbit - 1)
+    if nbit <= _prbs_table_max:
+        _prbs_periods[nbit] = bits
+    return True, bits
+
+def prbs_seq(nbit, n, offset = 0, lower_b = -1.0, upper_b = 1.0, cache_dir = None):
+    '''
+    Generate a PRBS signal of a given order starting from an arbitrary offset
+    in the period. The bits are taken from the period table (see ``prbs_period``)
+    if the order is up to 24 or ``cache_dir`` is given, otherwise they are
+    generated directly.
+
+    Parameters:
+        nbit:      int, order of the PRBS (2 to 32)
+        n:         int, number of point
+        offset:    int, index of the first bit in the sequence
+        lower_b:   float, lower boundary
+        upper_b:   float, upper boundary
+        cache_dir: string, folder for caching the PRBS periods on disk
+        
+    Returns:
+        status:    boolean, success (True) or fail (False)
+        data:      numpy array, 1-D array of PRBS signal
+    '''
+    # check the input
+    if (n <= 0) or (offset < 0) or (lower_b >= upper_b) or (nbit not in _prbs_taps.keys()):
+        return False, None
+
+    # get the bits
+    period = 2**nbit - 1
+    if (nbit <= _prbs_table_max) or (cache_dir is not None):
+        status, table = prbs_period(nbit, cache_dir = cache_dir)
+        if not status:
+            return False, None
+        offset = offset % period
+        if offset + n <= period:
+            bits = table[offset:offset + n]
+        else:
+            bits = np.take(table, np.arange(offset, offset + n) % period)
+    else:
+        bits = _prbs_bits(nbit, offset + n)[offset:]
+
+    # normalize the range
+    data = np.where(bits, upper_b, lower_b)
+    return True, data
+
 def prbs(n, lower_b = -1.0, upper_b = 1.0):
     '''
     Generate prbs signal (PRBS monic polynomials)
@@ -91,59 +251,12 @@ def prbs(n, lower_b = -1.0, upper_b = 1.0):
     if 2**nbit < q: nbit += 1
     nbit = int(nbit)
 
-    # define the bit ids (start from 0) for XOR
-    opbits = {  2:  [1, 0],
-                3:  [2, 1], 
-                4:  [3, 2], 
-                5:  [4, 2],
-                6:  [5, 4], 
-                7:  [6, 5], 
-                8:  [7, 5, 4, 3], 
-                9:  [8, 4],
-                10: [9, 6], 
-                11: [10, 8], 
-                12: [11, 10, 9, 3], 
-                13: [12, 11, 10, 7],
-                14: [13, 12, 11, 1], 
-                15: [14, 13], 
-                16: [15, 13, 12, 10], 
-                17: [16, 13],
-                18: [17, 10], 
-                19: [18, 17, 16, 13], 
-                20: [19, 2],
-                21: [20, 18],
-                22: [21, 20],
-                23: [22, 17], 
-                24: [23, 22, 21, 16],
-                25: [24, 21],
-                26: [25, 5, 1, 0],
-                27: [26, 4, 1, 0],
-                28: [27, 24],
-                29: [28, 26],
-                30: [29, 5, 3, 0],
-                31: [30, 27],
-                32: [31, 21, 1, 0]}
-
-    if nbit not in opbits.keys():
+    if nbit not in _prbs_taps.keys():
         print('Error: Only support up to 32 bit PRBS!')
         return False, None
 
-    # generate the PRBS signal
-    data = np.zeros(n)
-    lfsr = 1                                        # init value
-    for i in range(n):
-        fb = 0
-        for bit_id in opbits[nbit]:
-            fb ^= get_bit(lfsr, bit_id)             # XOR the selected bits
-        lfsr = ((lfsr << 1) + fb) & (2**nbit - 1)   # shifted the buffer left by one bit and append 'fb' 
-                                                    # to the last bit (see the note above)
-        data[i] = float(fb)
-
-    # normalize the range
-    data[data == 0] = lower_b
-    data[data == 1] = upper_b 
-
-    return True, data
+    # generate the PRBS signal (see ``_prbs_bits``)
+    return prbs_seq(nbit, n, lower_b = lower_b, upper_b = upper_b)
 
 def etfe(u, y, r = 1, exclude_transient = True, transient_batch_num = 1, fs = 1.0):
     '''
@@ -166,8 +279,8 @@ def etfe(u, y, r = 1, exclude_transient = True, transient_batch_num = 1, fs = 1.
         u_fft:               numpy array (complex), spectrum of the input waveform
         y_fft:               numpy array (complex), spectrum of the output waveform
     '''
-    # check the input
-    if (not u.shape == y.shape) or (r <= 0) or \
+    # check the input (the waveforms must contain exactly r batches)
+    if (not u.shape == y.shape) or (r <= 0) or (u.shape[0] % r != 0) or \
        (transient_batch_num < 0) or (fs <= 0.0):
         return (False,) + (None,)*4
     
@@ -188,97 +301,233 @@ def etfe(u, y, r = 1, exclude_transient = True, transient_batch_num = 1, fs = 1.
             u = u[transient_batch_num:]
             y = y[transient_batch_num:]
 
-    # calculate the transfer function and average
-    G = np.zeros(K, dtype = complex)
-    n = u.shape[0]
-    
-    for i in range(n):
-        u_fft = np.fft.fft(u[i])
-        y_fft = np.fft.fft(y[i])
-        G     = G + y_fft / u_fft
-        
-    G /= n
+    # calculate the transfer function of all batches at once and average
+    U = np.fft.fft(u, axis = -1)
+    Y = np.fft.fft(y, axis = -1)
+    G = np.mean(Y / U, axis = 0)
 
-    # tailor the results to the Nyquist band
-    freq   = np.arange(K) / K * fs    
-    ids_pf = freq <= 0.5 * fs       # positive frequency IDs
-    ids_nf = freq >  0.5 * fs       # negative frequency IDs    
-    freq[ids_nf] -= fs              # convert to negative frequency    
-    
-    freq   = np.append(freq[ids_nf],  freq[ids_pf])
-    G      = np.append(G[ids_nf],     G[ids_pf])
-    u_fft  = np.append(u_fft[ids_nf], u_fft[ids_pf])
-    y_fft  = np.append(y_fft[ids_nf], y_fft[ids_pf])
+    # tailor the results to the Nyquist band (spectra of the last batch)
+    freq, ids = _etfe_freq(K, fs)
     
     # return the results
-    return True, freq, G, u_fft, y_fft
+    return True, freq, G[ids], U[-1, ids], Y[-1, ids]
+
+def _etfe_freq(K, fs):
+    '''
+    Get the frequency vector of the two-sided spectra of ``K`` points ordered
+    from the negative to the positive frequencies, and the corresponding ids of
+    the FFT bins.
+    '''
+    freq   = np.arange(K) / K * fs    
+    ids_pf = np.where(freq <= 0.5 * fs)[0]          # positive frequency IDs
+    ids_nf = np.where(freq >  0.5 * fs)[0]          # negative frequency IDs    
+    ids    = np.append(ids_nf, ids_pf)
+    freq[ids_nf] -= fs                              # convert to negative frequency    
+    return freq[ids], ids
+
+def etfe_accum(u, y, state = None, K = None, fs = 1.0):
+    '''
+    Accumulate the spectra of the ETFE batch by batch, so that long system
+    identification runs can be processed online with constant memory. The 
+    auto/cross spectra are summed for the H1/H2 estimators and the coherence,
+    and the ratio ``y_fft/u_fft`` of each batch is summed for the average 
+    frequency response (the same as ``etfe``) and its variance. Use 
+    ``etfe_result`` to get the results. For real input and output, only the 
+    positive frequencies are processed (with rfft).
+
+    Parameters:
+        u:       numpy array, system input, one batch (K,) or multiple batches
+                  (n x K), K is the period of the excitation
+        y:       numpy array, system output, same shape as ``u``
+        state:   dict, state returned by the last call (None to start a new
+                  accumulation, the following inputs are only used in this case)
+        K:       int, number of points of each batch (None to use the length 
+                  of the last axis of ``u``)
+        fs:      float, sampling frequency, Hz
+        
+    Returns:
+        status:  boolean, success (True) or fail (False)
+        state:   dict, accumulated spectra, input to the next call (the input
+                  ``state`` is returned unchanged if failed)
+    '''
+    # check the input
+    u = np.asarray(u)
+    y = np.asarray(y)
+    if (u.shape != y.shape) or (u.ndim < 1) or (u.ndim > 2):
+        return False, state
+
+    # start a new accumulation
+    if state is None:
+        K = u.shape[-1] if K is None else int(K)
+        if (K < 2) or (fs <= 0.0):
+            return False, state
+        onesided = np.isrealobj(u) and np.isrealobj(y)
+        nbin     = K // 2 + 1 if onesided else K
+        state    = {'K':        K,
+                    'fs':       fs,
+                    'onesided': onesided,
+                    'n':        0,
+                    'Suu':      np.zeros(nbin),
+                    'Syy':      np.zeros(nbin),
+                    'Syu':      np.zeros(nbin, dtype = complex),
+                    'G_sum':    np.zeros(nbin, dtype = complex),
+                    'G_sum2':   np.zeros(nbin)}
+
+    # split to batches
+    K = state['K']
+    if (u.size % K != 0) or (state['onesided'] and not (np.isrealobj(u) and np.isrealobj(y))):
+        return False, state
+    u = u.reshape((-1, K))
+    y = y.reshape((-1, K))
+
+    # spectra of all batches
+    if state['onesided']:
+        U = np.fft.rfft(u, axis = -1)
+        Y = np.fft.rfft(y, axis = -1)
+    else:
+        U = np.fft.fft(u, axis = -1)
+        Y = np.fft.fft(y, axis = -1)
+    G = Y / U
+
+    # accumulate
+    state['n']      += u.shape[0]
+    state['Suu']    += np.sum(np.abs(U)**2,    axis = 0)
+    state['Syy']    += np.sum(np.abs(Y)**2,    axis = 0)
+    state['Syu']    += np.sum(Y * np.conj(U),  axis = 0)
+    state['G_sum']  += np.sum(G,               axis = 0)
+    state['G_sum2'] += np.sum(np.abs(G)**2,    axis = 0)
+
+    return True, state
+
+def etfe_result(state):
+    '''
+    Get the frequency response estimations from the accumulated spectra.
+
+    Parameters:
+        state:   dict, state of ``etfe_accum``
+        
+    Returns:
+        result:  dict, with the following items:
+                   ``status``: boolean, success (True) or fail (False);
+                   ``freq``: numpy array, frequency vector, Hz (two-sided as 
+                   ``etfe`` or only positive frequencies for real data);
+                   ``G``: average of the batch responses (same as ``etfe``);
+                   ``H1``: cross spectrum / input auto spectrum (robust to
+                   output noise);
+                   ``H2``: output auto spectrum / cross spectrum (robust to 
+                   input noise);
+                   ``coh``: coherence between the input and output;
+                   ``G_var``: variance of the batch responses;
+                   ``n``: number of batches
+    '''
+    result = {'status': False}
+
+    # check the input
+    if (state is None) or (state['n'] < 1):
+        return result
+
+    # get the frequency vector
+    K, fs = state['K'], state['fs']
+    if state['onesided']:
+        freq = np.fft.rfftfreq(K, d = 1.0 / fs)
+        ids  = np.arange(freq.shape[0])
+    else:
+        freq, ids = _etfe_freq(K, fs)
+
+    # calculate the estimations
+    n   = state['n']
+    Suu = state['Suu'][ids]
+    Syy = state['Syy'][ids]
+    Syu = state['Syu'][ids]
+    G   = state['G_sum'][ids] / n
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        result['H1']  = Syu / Suu
+        result['H2']  = Syy / np.conj(Syu)
+        result['coh'] = np.abs(Syu)**2 / (Suu * Syy)
+
+    result['freq']   = freq
+    result['G']      = G
+    result['G_var']  = np.maximum(state['G_sum2'][ids] - n * np.abs(G)**2, 0.0) / max(n - 1, 1)
+    result['n']      = n
+    result['status'] = True
+    return result
 
 def half_bw_decay(amp_wf, decay_ids, decay_ide, Ts):
     '''
     Calculate the half-bandwidth of a standing-wave cavity from RF pulse decay.
+    Multiple pulses can be processed at once with a 2D input.
     
     Refer to LLRF Book section 9.4.3.
 
     Parameters:
-        amp_wf:    numpy array, amplitude waveform
+        amp_wf:    numpy array, amplitude waveform, (samples,) or (pulses x samples)
         decay_ids: int, starting index of calc window
         decay_ide: int, ending index of calc window
         Ts:        float, sampling time, s
         
     Returns:
         status:    boolean, 'True' for successful calculation
-        half_bw:   float, half bandwidth, rad/s
+        half_bw:   float (numpy array for 2D input), half bandwidth, rad/s
     '''
     # check the input
-    WF = np.array(amp_wf)
-    if (WF.shape[0] < 3) or (Ts <= 0.0) or \
+    WF = np.asarray(amp_wf)
+    if (WF.shape[-1] < 3) or (Ts <= 0.0) or \
        (decay_ids <= 0) or (decay_ide <= decay_ids):
         return False, None
 
     # do the calculation by fitting
-    log_wf  = np.log(WF[decay_ids : decay_ide])       # log scaled amplitude
-    t       = np.arange(decay_ide - decay_ids) * Ts   # time vector
-    p       = np.polyfit(t, log_wf, 1)                # linear fitting
-    half_bw = -p[0]
+    log_wf  = np.log(WF[..., decay_ids : decay_ide])  # log scaled amplitude
+    half_bw = -_linear_slope(log_wf, Ts)              # linear fitting
     
     return True, half_bw
     
 def detuning_decay(pha_wf_deg, decay_ids, decay_ide, Ts):
     '''
     Calculate the detuning of a standing-wave cavity from RF pulse decay.
+    Multiple pulses can be processed at once with a 2D input.
     
     Refer to LLRF Book section 9.4.3.
 
     Parameters:
-        pha_wf_deg: numpy array, phase waveform, deg
+        pha_wf_deg: numpy array, phase waveform, deg, (samples,) or (pulses x samples)
         decay_ids:  int, starting index of calc window
         decay_ide:  int, ending index of calc window
         Ts:         float, sampling time, s
         
     Returns:
         status:     boolean, 'True' for successful calculation
-        detuning:   float, detuning, rad/s
+        detuning:   float (numpy array for 2D input), detuning, rad/s
     '''
     # check the input
-    WF = np.array(pha_wf_deg)
-    if (WF.shape[0] < 3) or (Ts <= 0.0) or \
+    WF = np.asarray(pha_wf_deg)
+    if (WF.shape[-1] < 3) or (Ts <= 0.0) or \
        (decay_ids <= 0) or (decay_ide <= decay_ids):
         return False, None
 
     # do the calculation by fitting
-    wf_rad   = np.unwrap(WF[decay_ids : decay_ide] * np.pi / 180.0)     # convert to radian
-    t        = np.arange(decay_ide - decay_ids) * Ts                    # time vector
-    p        = np.polyfit(t, wf_rad, 1)                                 # linear fitting
-    detuning = p[0]
+    wf_rad   = np.unwrap(WF[..., decay_ids : decay_ide] * np.pi / 180.0, axis = -1)  # convert to radian
+    detuning = _linear_slope(wf_rad, Ts)                                            # linear fitting
     
     return True, detuning
 
+def _linear_slope(wf, Ts):
+    '''
+    Get the slope of the least-square linear fitting of the waveforms along the
+    last axis (closed-form solution, the same as ``np.polyfit`` of order 1).
+    '''
+    n  = wf.shape[-1]
+    t  = (np.arange(n) - (n - 1) / 2.0) * Ts            # centered time vector
+    k  = np.sum(wf * t, axis = -1) / np.sum(t * t)
+    return float(k) if np.ndim(k) == 0 else k
+
 def cav_drv_est(vc, half_bw, Ts, detuning = 0.0, beta = 1e4):
     '''
     Calculate the theoritical drive waveform for the cavity probe waveform.
 
     Parameters:
-        vc:       numpy array (complex), cavity probe waveform
+        vc:       numpy array (complex), cavity probe waveform (or waveforms of 
+                   multiple pulses with samples along the last axis)
         half_bw:  float, half bandwidth of the cavity, rad/s
         Ts:       float, sampling time, s
         detuning: float, detuning of the cavity, rad/s
@@ -299,8 +548,8 @@ def cav_drv_est(vc, half_bw, Ts, detuning = 0.0, beta = 1e4):
            cavity probe signal.
     '''
     # check the input
-    if (vc.shape[0] < 3) or (Ts <= 0.0) or (half_bw <= 0.0):
-        return False, None
+    if (vc.shape[-1] < 3) or (Ts <= 0.0) or (half_bw <= 0.0):
+        return False, None, None
 
     # get the discrete equation of the cavity
     AGc = np.matrix([[-(half_bw - 1j * detuning)]], dtype = complex)        # continous cavity equation
@@ -312,9 +561,8 @@ def cav_drv_est(vc, half_bw, Ts, detuning = 0.0, beta = 1e4):
     B = BGd[0, 0]
 
     # calculate the cavity input signal by inversing the discrete equation
-    vf = (vc[1:] - A * vc[:-1]) / B
-    vf = np.append(vf, vf[0])
-    vf = np.roll(vf, 1)
+    vf = (vc[..., 1:] - A * vc[..., :-1]) / B
+    vf = np.concatenate((vf[..., :1], vf), axis = -1)   # repeat the first point
     vr = vc - vf
 
     '''
@@ -333,15 +581,17 @@ def cav_par_pulse(vc, vf, half_bw, Ts, beta = 1e4):
     '''
     Calculate the half-bandwidth and detuning of a standing-wave cavity 
     within an RF pulse with beam off (directly solve the cavity equation).
+    Multiple pulses can be processed at once with 2D inputs.
     
     Refer to LLRF Book section 9.4.3.
 
     Parameters:
-        vc:      numpy array (complex), cavity probe waveform (reference plane)
+        vc:      numpy array (complex), cavity probe waveform (reference plane),
+                  (samples,) or (pulses x samples)
         vf:      numpy array (complex), cavity forward waveform (calibrated to the
                   same reference plan as the cavity probe signal)
-        half_bw: float, half bandwidth of the cavity (derived from early part 
-                  of decay), rad/s
+        half_bw: float (or numpy array for each pulse), half bandwidth of the 
+                  cavity (derived from early part of decay), rad/s
         Ts:      float, sampling time, s
         beta:    float, input coupling factor (needed for NC cavities; 
                   for SC cavities, can use the default value, or you can 
@@ -353,10 +603,13 @@ def cav_par_pulse(vc, vf, half_bw, Ts, beta = 1e4):
         dw_pul:  numpy array, detuning in the pulse, rad/s
     '''
     # check the input
-    if (not vc.shape == vf.shape) or (half_bw <= 0.0) or \
+    if (not vc.shape == vf.shape) or np.any(np.asarray(half_bw) <= 0.0) or \
        (Ts <= 0.0) or (beta <= 0.0):
         return False, None, None
 
+    if np.ndim(half_bw) > 0:
+        half_bw = np.asarray(half_bw)[..., np.newaxis]     # half-bandwidth of each pulse
+
     # use cavity polar equation
     vd = 2 * beta * vf / (beta + 1)
     vc_amp = np.abs(vc)
@@ -365,8 +618,8 @@ def cav_par_pulse(vc, vf, half_bw, Ts, beta = 1e4):
     vd_pha = np.angle(vd)
 
     # derivative 
-    der_vc_amp = np.gradient(vc_amp, Ts)
-    der_vc_pha = np.gradient(vc_pha, Ts)
+    der_vc_amp = np.gradient(vc_amp, Ts, axis = -1)
+    der_vc_pha = np.gradient(vc_pha, Ts, axis = -1)
 
     # calculate the half-bandwidth and detuning
     wh_pul = (half_bw * vd_amp * np.cos(vc_pha - vd_pha) - der_vc_amp) / vc_amp
@@ -514,6 +767,28 @@ def cav_observer(vc, vf, half_bw, Ts, beta = 1e4, pole_scale = 50):
        (beta <= 0) or (pole_scale <= 0) or (Ts <= 0):
         return False, None, None
 
+    # construct the ADRC observer
+    A_obs, B_obs = _cav_observer_ss(half_bw, beta, pole_scale)
+    C_obs = D_obs = np.matrix(np.zeros(A_obs.shape))
+
+    # simulate the observer output - denoised cavity voltage and general disturbance
+    U = np.vstack((np.real(vc), np.imag(vc), np.real(vf), np.imag(vf)))
+    T = np.arange(vc.shape[0]) * Ts
+    X = signal.lsim((A_obs, B_obs, C_obs, D_obs), U.T, T)
+    Y = X[2].T
+
+    # construct the complex signals
+    vc_est = Y[0] + 1j*Y[1]
+    f_est  = Y[2] + 1j*Y[3]
+
+    return True, vc_est, f_est
+
+def _cav_observer_ss(half_bw, beta, pole_scale):
+    '''
+    Get the A and B matrices of the continuous ADRC observer of the cavity, the
+    states are the real/imag parts of the cavity voltage and the general 
+    disturbance, the inputs are the real/imag parts of vc and vf.
+    '''
     # parameters
     p_obs = -pole_scale * half_bw               # pole of the observer
     m1    = -2 * p_obs                          # observer matrix parameter
@@ -529,55 +804,169 @@ def cav_observer(vc, vf, half_bw, Ts, beta = 1e4, pole_scale = 50):
                        [  0,  m1,  0, b0],
                        [ m2,   0,  0,  0],
                        [  0,  m2,  0,  0]])
-    C_obs = D_obs = np.matrix(np.zeros(A_obs.shape))
+    return A_obs, B_obs
 
-    # simulate the observer output - denoised cavity voltage and general disturbance
-    U = np.vstack((np.real(vc), np.imag(vc), np.real(vf), np.imag(vf)))
-    T = np.arange(vc.shape[0]) * Ts
-    X = signal.lsim((A_obs, B_obs, C_obs, D_obs), U.T, T)
-    Y = X[2].T
+def design_cav_observer(half_bw, Ts, beta = 1e4, pole_scale = 50):
+    '''
+    Design the discrete ADRC observer for estimating the cavity parameters
+    sample by sample with ``cav_par_step``. The observer is discretized with 
+    the input linearly interpolated between the samples, the same as the 
+    simulation in ``cav_observer``, so that the step execution reproduces the
+    results of ``cav_observer`` and ``cav_par_pulse_obs`` on the same data.
 
-    # construct the complex signals
-    vc_est = Y[0] + 1j*Y[1]
-    f_est  = Y[2] + 1j*Y[3]
+    Parameters:
+        half_bw:     float, half bandwidth of the cavity (derived from early part of decay), rad/s
+        Ts:          float, sampling time, s
+        beta:        float, input coupling factor (needed for NC cavities; 
+                      for SC cavities, can use the default value, or you can 
+                      specify it if more accurate calibration is needed)
+        pole_scale:  float, scale of the cavity half-bandwidth for the observer pole,
+                      it should be tens of times of the closed-loop bandwidth of the cavity
+                      
+    Returns:
+        status:      boolean, success (True) or fail (False)
+        obs:         dict, discrete observer (``Ad``, ``Bd0``, ``Bd1`` for the state
+                      as row vector) and the cavity half-bandwidth
+    '''
+    # check the input
+    if (half_bw <= 0) or (beta <= 0) or (pole_scale <= 0) or (Ts <= 0):
+        return False, None
 
-    return True, vc_est, f_est
+    # discretize the observer (see ``scipy.signal.lsim``)
+    A_obs, B_obs = _cav_observer_ss(half_bw, beta, pole_scale)
+    A_obs = np.asarray(A_obs, dtype = float)
+    B_obs = np.asarray(B_obs, dtype = float)
+    M     = np.vstack([np.hstack([A_obs * Ts, B_obs * Ts, np.zeros((4, 4))]),
+                       np.hstack([np.zeros((4, 8)), np.identity(4)]),
+                       np.zeros((4, 12))])
+    expMT = sp_linalg.expm(M.T)
+
+    obs = {'Ad':      expMT[:4, :4],
+           'Bd1':     expMT[8:, :4],
+           'Bd0':     expMT[4:8, :4] - expMT[8:, :4],
+           'half_bw': half_bw}
+    return True, obs
+
+def cav_par_step(obs, vc_step, vf_step, state = None, vb_step = None):
+    '''
+    Estimate the half-bandwidth, detuning and general disturbance of the cavity
+    for a time step with the discrete ADRC observer (O(1) per sample). Multiple
+    cavities can be estimated at once with the inputs as arrays.
+    
+    Refer to the paper "Geng Z (2017a) Superconducting cavity 
+    control and model identification based on active disturbance rejection control. IEEE 
+    Trans Nucl Sci 64(3):951-958".
+
+    Parameters:
+        obs:         dict, discrete observer designed by ``design_cav_observer``
+        vc_step:     complex (or numpy array for multiple cavities), cavity probe 
+                      signal of the time step
+        vf_step:     complex (or numpy array), cavity forward signal of the time step
+        state:       dict, state of the last step (None for the first step of a pulse)
+        vb_step:     complex (or numpy array), beam drive signal of the time step
+                      
+    Returns:
+        status:      boolean, success (True) or fail (False)
+        wh_step:     float, half-bandwidth of the time step, rad/s
+        dw_step:     float, detuning of the time step, rad/s
+        vc_est:      complex, cavity probe signal (estimated by observer)
+        f_est:       complex, general disturbance (estimated by observer)
+        state:       dict, state of this step, should input to the next execution
+    '''
+    # observer input of this step
+    vc_step = np.asarray(vc_step)
+    vf_step = np.asarray(vf_step)
+    if vc_step.shape != vf_step.shape:
+        return (False,) + (None,)*5
+    u = np.stack((np.real(vc_step), np.imag(vc_step), 
+                  np.real(vf_step), np.imag(vf_step)), axis = -1)
+
+    # update the observer state (zero state for the first step)
+    if state is None:
+        state = {'x': np.zeros(u.shape)}
+    else:
+        state['x'] = state['x'] @ obs['Ad'] + state['u'] @ obs['Bd0'] + u @ obs['Bd1']
+    state['u'] = u
+
+    # get the estimations
+    x      = state['x']
+    vc_est = x[..., 0] + 1j*x[..., 1]
+    f_est  = x[..., 2] + 1j*x[..., 3]
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        if vb_step is None:
+            cgain = f_est / vc_est                                       # without beam
+        else:
+            cgain = (f_est - 2 * obs['half_bw'] * np.asarray(vb_step)) / vc_est    # with beam
+    cgain = np.nan_to_num(cgain)                                        # put NaN to 0 (default number)
+
+    return True, -np.real(cgain), np.imag(cgain), vc_est, f_est, state
 
-def iden_impulse(U, Y, order = 20):
+def iden_impulse(U, Y, order = 20, method = 'lsm', regu = 0.0):
     '''
-    Identify the impulse response using the input-output data.
+    Identify the impulse response using the input-output data. The output is
+    modeled as ``Y[n] = sum(h[m] * U[n-1-m])`` for ``m = 0 ... order-1``.
 
     Parameters:
-        U:      numpy array (complex), input waveforms
+        U:      numpy array (complex), input waveforms (n_wf x N)
         Y:      numpy array (complex), output waveforms
         order:  int, order of the impulse response
+        method: string, ``lsm`` for least-square fitting with the normal 
+                 equations accumulated waveform by waveform (memory of 
+                 O(order^2)), or ``fft`` for the frequency-domain estimation
+                 ``sum(Y*conj(U)) / sum(|U|^2)`` (faster, but approximated 
+                 due to the truncation of the response to ``order`` points)
+        regu:   float, regularization factor (Tikhonov) relative to the mean
+                 diagonal of the normal matrix (``lsm``) or the mean input 
+                 power spectrum (``fft``)
         
     Returns:
         status: boolean, success (True) or fail (False)
         h:      numpy array (complex), impulse response
     '''
     # check the input
-    if (not U.shape == Y.shape) or (order < 2):
+    if (not U.shape == Y.shape) or (order < 2) or (method not in ('lsm', 'fft')) or \
+       (regu < 0.0):
         return False, None
 
+    U = np.atleast_2d(U)
+    Y = np.atleast_2d(Y)
+
     # get the dimension
     n_wf = U.shape[0]       # number of waveforms
     N    = U.shape[1]       # number of points in each waveform
 
     if order > N:
         order = N - 1       # cannot exceed the point number in a WF
-    
-    # construct the linear equation
-    A = np.zeros(((N - order) * n_wf, order), dtype = complex)
-    B = np.zeros( (N - order) * n_wf,         dtype = complex)
-    
-    for k in range(n_wf):
-        for i in range(N - order):
-            A[k * (N - order) + i, :] = U[k][i : i + order]
-            B[k * (N - order) + i]    = Y[k][i + order]
+
+    # frequency-domain estimation (the FFT size avoids circular aliasing)
+    if method == 'fft':
+        nfft = int(2**np.ceil(np.log2(N + order)))
+        Uf   = np.fft.fft(U, n = nfft, axis = -1)
+        Yf   = np.fft.fft(Y, n = nfft, axis = -1)
+        Suu  = np.sum(np.abs(Uf)**2, axis = 0)
+        Syu  = np.sum(Yf * np.conj(Uf), axis = 0)
+        g    = np.fft.ifft(Syu / (Suu + regu * np.mean(Suu)))
+        return True, g[1:order + 1]
+
+    # construct the linear equation with the regressors of a block of waveforms
+    # (views on U), and accumulate the normal equations
+    dtype = np.result_type(U, Y, complex)
+    AHA   = np.zeros((order, order), dtype = dtype)
+    AHB   = np.zeros(order,          dtype = dtype)
+    W     = np.lib.stride_tricks.sliding_window_view(U, order, axis = -1)[:, :N - order, :]
+    block = max(1, int(2**20 / ((N - order) * order)))     # waveforms per block
+
+    for k in range(0, n_wf, block):
+        A    = W[k:k + block].reshape((-1, order))
+        B    = Y[k:k + block, order:].reshape(-1)
+        AHA += A.conj().T @ A
+        AHB += A.conj().T @ B
 
     # least-square fitting
-    X = np.linalg.lstsq(A, B, rcond = None)
+    if regu > 0.0:
+        AHA += regu * np.mean(np.real(np.diag(AHA))) * np.eye(order)
+    X = np.linalg.lstsq(AHA, AHB, rcond = None)
 
     # return the results
     return True, X[0][::-1]
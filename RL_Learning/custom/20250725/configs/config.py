@@ -78,6 +78,10 @@ ENV_CONFIG = {
     # Simulation settings
     'simulation_length': 2048 * 500,
     'pulse_length': 2048 * 20,
+
+    # Parameter randomization of the vectorized environment, (low, high) per
+    # parameter, e.g., {'loaded_q': (2.5e6, 3.5e6), 'beam_current': (0.0, 0.01)}
+    'randomize': {},
 }
 
 # Training Configuration
@@ -97,6 +101,7 @@ TRAINING_CONFIG = {
     
     # Environment settings
     'n_envs': 4,
+    'vec_env': 'native',  # 'native' (RFCavityControlVecEnv) or 'dummy' (DummyVecEnv of RFCavityControlEnv)
     'total_timesteps': 1_000_000,
     
     # Network architecture
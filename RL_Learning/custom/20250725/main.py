@@ -69,7 +69,7 @@ sys.path.append(os.path.join(project_root, 'configs'))
 
 def main():
     parser = argparse.ArgumentParser(description='RF Cavity Control RL System')
-    parser.add_argument('command', choices=['train', 'test', 'env-test', 'realtime', 'realtime-gui'], 
+    parser.add_argument('command', choices=['train', 'test', 'env-test', 'vec-test', 'realtime', 'realtime-gui'], 
                        help='Command to execute')
     parser.add_argument('--model-path', type=str, default='./best_model/best_model.zip',
                        help='Path to model file (for test command)')
@@ -96,6 +96,14 @@ def main():
         import test_environment
         test_environment.test_environment()
         
+    elif args.command == 'vec-test':
+        print("Testing vectorized environment...")
+        os.chdir(os.path.join(project_root, 'scripts'))
+        import test_vec_env
+        test_vec_env.test_consistency()
+        test_vec_env.test_resets()
+        test_vec_env.benchmark()
+        
     elif args.command == 'realtime':
         print("Starting real-time control (command line)...")
         os.chdir(os.path.join(project_root, 'scripts'))
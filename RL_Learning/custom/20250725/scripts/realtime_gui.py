@@ -74,6 +74,7 @@ try:
     from realtime_control import RealTimeControlWrapper
     from config import ENV_CONFIG
     from stable_baselines3 import PPO
+    from llrflibs.rf_misc import decim_minmax
 except ImportError as e:
     print(f"Import error: {e}")
     print("Please ensure all dependencies are installed and paths are correct.")
@@ -546,13 +547,16 @@ class RealTimeControlGUI:
             data = self.control_wrapper.get_buffer_data()
             
             if len(data['time']) > 0:
+                # Decimate all buffers at once to min/max envelopes of the plot width
+                names = ['vc_amplitude', 'vr_amplitude', 'vc_phase',
+                         'frequency_detuning', 'action', 'reward']
+                n_pix = max(int(self.ax1.get_window_extent().width), 100)
+                _, t, values = decim_minmax(np.array([data[name] for name in names]),
+                                            n_pix=n_pix, x=np.asarray(data['time']))
+                
                 # Update line data
-                self.lines['vc_amplitude'].set_data(data['time'], data['vc_amplitude'])
-                self.lines['vr_amplitude'].set_data(data['time'], data['vr_amplitude'])
-                self.lines['vc_phase'].set_data(data['time'], data['vc_phase'])
-                self.lines['frequency_detuning'].set_data(data['time'], data['frequency_detuning'])
-                self.lines['action'].set_data(data['time'], data['action'])
-                self.lines['reward'].set_data(data['time'], data['reward'])
+                for name, value in zip(names, values):
+                    self.lines[name].set_data(t, value)
                 
                 # Auto-scale axes
                 for ax in [self.ax1, self.ax2, self.ax3, self.ax4, self.ax5, self.ax6]:
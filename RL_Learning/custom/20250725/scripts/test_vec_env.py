@@ -0,0 +1,106 @@
+"""
+Vectorized environment testing script to verify RFCavityControlVecEnv against
+RFCavityControlEnv and to measure the simulation throughput
+"""
+
+import os
+import sys
+import time
+import numpy as np
+import gymnasium as gym
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'configs'))
+
+from rf_cavity_env import RFCavityControlEnv
+from rf_cavity_vec_env import RFCavityControlVecEnv
+from config import ENV_CONFIG
+
+
+def test_consistency(n_envs=4, n_steps=3000):
+    """Compare the vectorized environment with the scalar environment"""
+    print("Comparing with RFCavityControlEnv...")
+    env = RFCavityControlEnv(config=ENV_CONFIG)
+    obs_ref, _ = env.reset(seed=0)
+
+    # Start all vectorized environments from the state of the scalar one
+    envs = RFCavityControlVecEnv(num_envs=n_envs, config=ENV_CONFIG)
+    envs.reset(seed=0)
+    envs.state_vc[:] = np.asarray(env.state_vc).item()
+    envs.dw[:] = np.asarray(env.dw).item()
+    envs.state_m[:] = np.asarray(env.state_m).ravel()
+    envs.pha_src[:] = env.pha_src
+
+    rng = np.random.default_rng(0)
+    max_err = 0.0
+    for i in range(n_steps):
+        action = rng.uniform(-0.01, 0.01, 1).astype(np.float32)
+        obs_ref, reward_ref, _, _, _ = env.step(action)
+        obs, rewards, _, _, _ = envs.step(np.tile(action, (n_envs, 1)))
+        max_err = max(max_err, np.max(np.abs(obs - obs_ref) / (np.abs(obs_ref) + 1e-3)))
+        max_err = max(max_err, np.max(np.abs(rewards - reward_ref) / (abs(reward_ref) + 1e-3)))
+
+    print(f"  Max relative deviation over {n_steps} steps: {max_err:.2e}")
+    assert max_err < 1e-3, "Vectorized environment deviates from RFCavityControlEnv"
+    env.close()
+    envs.close()
+
+
+def test_resets(n_envs=8, max_steps=100):
+    """Test automatic, partial resets and randomized parameters"""
+    print("Testing resets...")
+    config = dict(ENV_CONFIG, randomize={'loaded_q': (2.5e6, 3.5e6), 'beam_current': (0.0, 0.01)})
+    envs = RFCavityControlVecEnv(num_envs=n_envs, max_steps=max_steps, config=config)
+    obs, _ = envs.reset(seed=1)
+    assert len(np.unique(envs.wh_env)) == n_envs, "Parameters are not randomized"
+
+    for i in range(max_steps):
+        obs, rewards, terminations, truncations, _ = envs.step(envs.action_space.sample())
+    assert truncations.all(), "Episodes are not truncated at max_steps"
+
+    obs, rewards, terminations, truncations, _ = envs.step(envs.action_space.sample())
+    assert (envs.step_count == 0).all() and (rewards == 0).all(), "Environments are not reset"
+
+    wh = envs.wh_env.copy()
+    mask = np.arange(n_envs) % 2 == 0
+    envs.reset(options={'reset_mask': mask})
+    assert (envs.step_count[mask] == 0).all() and (envs.wh_env[~mask] == wh[~mask]).all()
+    assert not np.any(np.isnan(obs)), "NaN in observations"
+    envs.close()
+    print("  Automatic, partial resets and randomization OK")
+
+
+def benchmark(n_envs_list=(1, 16, 64, 256), duration=2.0):
+    """Measure the env-steps per second of SyncVectorEnv and the native vectorized env"""
+    print("Benchmarking (env-steps per second)...")
+    print(f"  {'n_envs':>6} {'SyncVectorEnv':>15} {'native':>12} {'speedup':>8}")
+
+    def run(envs, n_envs):
+        envs.reset(seed=0)
+        actions = np.zeros((n_envs, 1), dtype=np.float32)
+        n_steps = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < duration:
+            for _ in range(10):
+                envs.step(actions)
+            n_steps += 10
+        return n_steps * n_envs / (time.perf_counter() - t0)
+
+    for n_envs in n_envs_list:
+        sync_envs = gym.vector.SyncVectorEnv(
+            [lambda: RFCavityControlEnv(config=ENV_CONFIG) for _ in range(n_envs)])
+        rate_sync = run(sync_envs, n_envs)
+        rate_native = run(RFCavityControlVecEnv(num_envs=n_envs, config=ENV_CONFIG), n_envs)
+        print(f"  {n_envs:6d} {rate_sync:15.0f} {rate_native:12.0f} {rate_native / rate_sync:7.1f}x")
+        sync_envs.close()
+
+
+if __name__ == "__main__":
+    print("="*50)
+    print("RF Cavity Control Vectorized Environment Test")
+    print("="*50)
+    test_consistency()
+    test_resets()
+    benchmark()
+    print("\nVectorized environment test completed successfully!")
@@ -59,6 +59,7 @@ from datetime import datetime
 from stable_baselines3 import PPO
 from stable_baselines3.common.env_util import make_vec_env
 from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import VecMonitor
 from stable_baselines3.common.callbacks import EvalCallback, BaseCallback
 
 # Add src directory to path
@@ -66,6 +67,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'configs'))
 
 from rf_cavity_env import RFCavityControlEnv
+from rf_cavity_vec_env import RFCavitySB3VecEnv
 from config import ENV_CONFIG, TRAINING_CONFIG
 
 
@@ -106,6 +108,24 @@ def create_env(env_config=None):
     return Monitor(env)
 
 
+def create_vec_env(env_config=None):
+    """Create the vectorized training environments"""
+    if env_config is None:
+        env_config = ENV_CONFIG
+
+    if TRAINING_CONFIG.get('vec_env', 'native') == 'native':
+        # All environments simulated in one vectorized update
+        return VecMonitor(RFCavitySB3VecEnv(
+            num_envs=TRAINING_CONFIG['n_envs'],
+            max_steps=env_config['max_steps'],
+            config=env_config
+        ))
+    return make_vec_env(
+        lambda: create_env(env_config),
+        n_envs=TRAINING_CONFIG['n_envs']
+    )
+
+
 def setup_directories():
     """Create necessary directories"""
     dirs = [
@@ -136,15 +156,12 @@ def main():
     
     print(f"Environment registered: RFCavityControl-v1")
     print(f"Max steps per episode: {ENV_CONFIG['max_steps']}")
-    print(f"Number of parallel environments: {TRAINING_CONFIG['n_envs']}")
+    print(f"Number of parallel environments: {TRAINING_CONFIG['n_envs']} ({TRAINING_CONFIG.get('vec_env', 'native')})")
     print(f"Device: {TRAINING_CONFIG['device']}")
     print()
     
     # Create vectorized environment
-    vec_env = make_vec_env(
-        lambda: create_env(),
-        n_envs=TRAINING_CONFIG['n_envs']
-    )
+    vec_env = create_vec_env()
     
     # Setup callbacks
     eval_callback = EvalCallback(
@@ -5,10 +5,12 @@ This module contains the core components of the RF cavity control system.
 """
 
 from .rf_cavity_env import RFCavityControlEnv, SinEnv
+from .rf_cavity_vec_env import RFCavityControlVecEnv
 from .realtime_control import RealTimeControlWrapper
 
 __all__ = [
     'RFCavityControlEnv',
     'SinEnv',
+    'RFCavityControlVecEnv',
     'RealTimeControlWrapper'
 ]
@@ -0,0 +1,435 @@
+"""
+Vectorized RF Cavity Control Environment for Reinforcement Learning
+
+Filename: rf_cavity_vec_env.py
+Author: Ming Liu
+Email: ming.liu@example.com
+GitHub: https://github.com/iuming
+Created: 2025-10-19
+Version: 1.0.0
+
+Description:
+    This module implements a native vectorized version of RFCavityControlEnv.
+    The electrical and mechanical states of N environments are held in arrays
+    and all environments are advanced by one vectorized update per step, which
+    removes the per-environment Python overhead of stepping N copies of the
+    scalar environment (DummyVecEnv / SyncVectorEnv). The physics per
+    environment is the same as RFCavityControlEnv (sim_scav_step with the
+    mechanical modes executed every sample).
+
+Features:
+    - gymnasium VectorEnv with N environments stepped in lockstep
+    - Next-step (gymnasium default) or same-step automatic reset
+    - Per-environment resets (reset_mask option)
+    - Per-environment randomized parameters (loaded Q, beam current,
+      source frequency and amplitude), re-sampled at each reset
+    - Stable-Baselines3 VecEnv adapter (RFCavitySB3VecEnv, needs stable_baselines3)
+
+Dependencies:
+    - gymnasium
+    - numpy
+    - llrflibs (RF simulation library)
+    - stable_baselines3 (optional, for RFCavitySB3VecEnv)
+
+Changelog:
+    v1.0.0 (2025-10-19):
+        - Initial implementation of the vectorized RF cavity environment
+        - Added Stable-Baselines3 VecEnv adapter
+
+License:
+    This code is part of the ML_Learning repository.
+
+Usage:
+    from rf_cavity_vec_env import RFCavityControlVecEnv
+
+    envs = RFCavityControlVecEnv(num_envs=64, config={
+        'randomize': {'loaded_q': (2.5e6, 3.5e6), 'beam_current': (0.0, 0.01)}
+    })
+    obs, info = envs.reset(seed=42)
+    actions = envs.action_space.sample()
+    obs, rewards, terminations, truncations, infos = envs.step(actions)
+"""
+
+import gymnasium as gym
+import numpy as np
+from typing import Optional, Dict, Any
+from llrflibs.rf_sim import *
+from llrflibs.rf_control import *
+
+try:
+    from gymnasium.vector import AutoresetMode
+    _NEXT_STEP, _SAME_STEP = AutoresetMode.NEXT_STEP, AutoresetMode.SAME_STEP
+except ImportError:                     # gymnasium < 1.1
+    _NEXT_STEP, _SAME_STEP = 'NextStep', 'SameStep'
+
+
+class RFCavityControlVecEnv(gym.vector.VectorEnv):
+    """
+    Vectorized RF Cavity Control Environment
+
+    N independent copies of RFCavityControlEnv simulated in lockstep. The
+    observation, action and reward of each environment are the same as
+    RFCavityControlEnv, batched along the first axis.
+
+    Randomized parameters are given in config['randomize'] as a dictionary of
+    (low, high) uniform ranges, with the same keys as the scalar config:
+        - loaded_q:          Loaded quality factor
+        - beam_current:      Beam current (A)
+        - source_frequency:  RF source frequency offset (Hz)
+        - source_amplitude:  RF source amplitude
+    They are sampled per environment at each reset.
+    """
+
+    def __init__(self,
+                 num_envs: int = 8,
+                 max_steps: int = 2048 * 16,
+                 config: Optional[Dict[str, Any]] = None,
+                 autoreset_mode: str = 'next_step'):
+        """
+        Initialize the vectorized RF Cavity Control Environment
+
+        Args:
+            num_envs: Number of environments simulated in lockstep
+            max_steps: Maximum number of steps per episode
+            config: Configuration dictionary for environment parameters
+                (same as RFCavityControlEnv, plus 'randomize')
+            autoreset_mode: 'next_step' to reset a finished environment at the
+                next call of step (gymnasium default), or 'same_step' to reset
+                it immediately and return the final observation in
+                infos['final_obs'] (Stable-Baselines3 convention)
+        """
+        if autoreset_mode not in ('next_step', 'same_step'):
+            raise ValueError(f"Unknown autoreset mode: {autoreset_mode}")
+
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.autoreset_mode = autoreset_mode
+        self.metadata = {
+            'render_modes': [],
+            'autoreset_mode': _NEXT_STEP if autoreset_mode == 'next_step' else _SAME_STEP
+        }
+        self.render_mode = None
+        self.closed = False
+
+        # Spaces definition (same as RFCavityControlEnv)
+        self.single_action_space = gym.spaces.Box(
+            low=-2.0, high=2.0, shape=(1,), dtype=np.float32)
+        self.single_observation_space = gym.spaces.Box(
+            low=np.array([-1000.0, -1000.0, -360.0, -1000.0]),
+            high=np.array([1000.0, 1000.0, 360.0, 1000.0]),
+            shape=(4,),
+            dtype=np.float32
+        )
+        self.action_space = gym.vector.utils.batch_space(self.single_action_space, num_envs)
+        self.observation_space = gym.vector.utils.batch_space(self.single_observation_space, num_envs)
+
+        # Initialize RF system parameters and simulation components
+        self._init_rf_parameters(config)
+        self._init_simulation_components()
+        self._init_state()
+
+    def _init_rf_parameters(self, config: Optional[Dict[str, Any]] = None):
+        """Initialize RF system parameters (shared by all environments)"""
+        if config is None:
+            config = {}
+
+        # General parameters
+        self.Ts = config.get('sampling_time', 1e-6)
+        self.t_fill = config.get('fill_time', 510)
+        self.t_flat = config.get('flat_time', 1300)
+
+        # RF source parameters (nominal values)
+        self.fsrc = config.get('source_frequency', -460)
+        self.Asrc = config.get('source_amplitude', 1)
+
+        # I/Q modulator parameters
+        self.pulsed = config.get('pulsed_mode', True)
+        self.buf_size = config.get('buffer_size', 2048 * 8)
+        self.base_pul = np.zeros(self.buf_size)
+        self.base_cw = 1
+        self.base_pul[:self.t_flat] = 1.0
+
+        # Amplifier parameters
+        self.gain_dB = config.get('amplifier_gain_db', 20 * np.log10(12e6))
+        self.gain = 10.0 ** (self.gain_dB / 20.0)
+
+        # Cavity parameters (nominal values)
+        self.mech_modes = config.get('mechanical_modes', {
+            'f': [280, 341, 460, 487, 618],
+            'Q': [40, 20, 50, 80, 100],
+            'K': [2, 0.8, 2, 0.6, 0.2]
+        })
+        self.f0 = config.get('cavity_frequency', 1.3e9)
+        self.beta = config.get('coupling_beta', 1e4)
+        self.roQ = config.get('cavity_roQ', 1036)
+        self.QL = config.get('loaded_q', 3e6)
+        self.ib = config.get('beam_current', 0.008)
+
+        # Beam loading (pulse shape, scaled by the beam current per environment)
+        self.beam_pul = np.zeros(self.buf_size)
+        self.beam_cw = 0
+        self.beam_pul[self.t_fill:self.t_flat] = 1.0
+
+        # Simulation parameters
+        self.pul_len = config.get('pulse_length', 2048 * 20)
+        self.init_detuning_std = config.get('initial_detuning_std', 10)
+
+        # Parameter randomization
+        self.randomize = dict(config.get('randomize', {}))
+        for key in self.randomize:
+            if key not in ('loaded_q', 'beam_current', 'source_frequency', 'source_amplitude'):
+                raise ValueError(f"Parameter cannot be randomized: {key}")
+
+    def _init_simulation_components(self):
+        """Initialize mechanical mode simulation components"""
+        status, Am, Bm, Cm, Dm = cav_ss_mech(self.mech_modes)
+        status, Ad, Bd, Cd, Dd, _ = ss_discrete(
+            Am, Bm, Cm, Dm,
+            Ts=self.Ts,
+            method='zoh',
+            plot=False,
+            plot_pno=10000
+        )
+
+        # Transposed for the batched update: state (N, n) @ Ad.T
+        self.AdT = np.asarray(Ad).T.copy()
+        self.BdT = np.asarray(Bd).T.copy()
+        self.CdT = np.asarray(Cd).T.copy()
+        self.Dd = np.asarray(Dd).item()
+        self.n_mech = self.AdT.shape[0]
+
+    def _init_state(self):
+        """Allocate the state arrays of all environments"""
+        n = self.num_envs
+
+        # Per-environment parameters
+        self.fsrc_env = np.full(n, float(self.fsrc))
+        self.Asrc_env = np.full(n, float(self.Asrc))
+        self.wh_env = np.full(n, np.pi * self.f0 / self.QL)
+        self.vb_env = np.full(n, -0.5 * self.roQ * self.QL * self.ib)
+
+        # Simulation states
+        self.pha_src = np.zeros(n)
+        self.buf_id = np.zeros(n, dtype=np.int64)
+        self.state_m = np.zeros((n, self.n_mech))
+        self.state_vc = np.zeros(n, dtype=complex)
+        self.dw = np.zeros(n)
+        self.step_count = np.zeros(n, dtype=np.int64)
+        self._autoreset = np.zeros(n, dtype=bool)
+        self.np_random = np.random.default_rng()
+
+    def _sample_parameters(self, idx):
+        """Sample the (randomized) parameters of the given environments"""
+        n = len(idx)
+        rng = self.np_random
+        QL = rng.uniform(*self.randomize['loaded_q'], n) \
+            if 'loaded_q' in self.randomize else np.full(n, float(self.QL))
+        ib = rng.uniform(*self.randomize['beam_current'], n) \
+            if 'beam_current' in self.randomize else np.full(n, float(self.ib))
+        if 'source_frequency' in self.randomize:
+            self.fsrc_env[idx] = rng.uniform(*self.randomize['source_frequency'], n)
+        if 'source_amplitude' in self.randomize:
+            self.Asrc_env[idx] = rng.uniform(*self.randomize['source_amplitude'], n)
+        self.wh_env[idx] = np.pi * self.f0 / QL
+        self.vb_env[idx] = -0.5 * self.roQ * QL * ib
+
+    def _simulate(self, idx, detuning):
+        """
+        Simulate one sample of the signal chain and the cavity of the given
+        environments (slice or index array), returns vc, vr and dw
+        """
+        # RF source, I/Q modulator and amplifier
+        self.pha_src[idx] += 2.0 * np.pi * self.fsrc_env[idx] * self.Ts
+        if self.pulsed:
+            buf_id = self.buf_id[idx]
+            buf_id = np.where(buf_id < self.buf_size, buf_id, -1)
+            vf = self.Asrc_env[idx] * np.exp(1j * self.pha_src[idx]) * self.base_pul[buf_id] * self.gain
+            vb = self.vb_env[idx] * self.beam_pul[buf_id]
+        else:
+            vf = self.Asrc_env[idx] * np.exp(1j * self.pha_src[idx]) * self.base_cw * self.gain
+            vb = np.full(vf.shape, float(self.beam_cw))
+
+        # Electrical equation (as sim_scav_step)
+        wh = self.wh_env[idx]
+        vc = (1 - self.Ts * (wh - 1j * self.dw[idx])) * self.state_vc[idx] + \
+             2 * wh * self.Ts * (self.beta * vf / (self.beta + 1) + vb)
+        vr = vc - vf
+
+        # Mechanical modes driven by the Lorentz force
+        state_m = self.state_m[idx]
+        u = (np.abs(vc) * 1.0e-6) ** 2
+        dw = (state_m @ self.CdT)[:, 0] + self.Dd * u + detuning
+        self.state_m[idx] = state_m @ self.AdT + u[:, None] * self.BdT
+
+        self.state_vc[idx] = vc
+        self.dw[idx] = dw
+        return vc, vr, dw
+
+    def _build_observation(self, vc, vr, dw):
+        """Build observation vectors with safety checks"""
+        vc_abs = np.nan_to_num(np.abs(vc), nan=0.0, posinf=1e3, neginf=-1e3)
+        vr_abs = np.nan_to_num(np.abs(vr), nan=0.0, posinf=1e3, neginf=-1e3)
+        vc_angle = np.nan_to_num(np.angle(vc), nan=0.0, posinf=np.pi, neginf=-np.pi)
+        dw_val = np.nan_to_num(dw, nan=0.0, posinf=1e9, neginf=-1e9)
+
+        obs = np.empty((len(vc), 4), dtype=np.float32)
+        obs[:, 0] = np.clip(vc_abs * 1e-6, -1000.0, 1000.0)
+        obs[:, 1] = np.clip(vr_abs * 1e-6, -1000.0, 1000.0)
+        obs[:, 2] = np.clip(vc_angle * 180 / np.pi, -360.0, 360.0)
+        obs[:, 3] = np.clip(dw_val * 1e-3, -1000.0, 1000.0)
+        return obs
+
+    def _calculate_reward(self, obs):
+        """Calculate rewards based on frequency detuning"""
+        reward = -np.abs(obs[:, 3]).astype(np.float64)
+        reward = np.nan_to_num(reward, nan=-1.0, posinf=-1.0, neginf=-1.0)
+        return np.clip(reward, -1000.0, 1000.0)
+
+    def _reset_envs(self, idx):
+        """Reset the given environments (index array), returns their observations"""
+        self._sample_parameters(idx)
+        self.pha_src[idx] = 0
+        self.buf_id[idx] = 0
+        self.state_m[idx] = 0
+        self.state_vc[idx] = 0
+        self.dw[idx] = 0
+        self.step_count[idx] = 0
+        self._autoreset[idx] = False
+
+        # Run initial simulation step with random microphonics
+        dw_micr = 2.0 * np.pi * self.np_random.standard_normal(len(idx)) * self.init_detuning_std
+        vc, vr, dw = self._simulate(idx, dw_micr)
+        return self._build_observation(vc, vr, dw)
+
+    def reset(self, *, seed=None, options=None):
+        """
+        Reset the environments
+
+        Args:
+            seed: Seed of the random generator shared by all environments
+            options: Optional dictionary, 'reset_mask' (bool array) selects the
+                environments to reset (all by default)
+        """
+        if seed is not None:
+            self.np_random = np.random.default_rng(seed)
+
+        mask = None if options is None else options.get('reset_mask')
+        idx = np.arange(self.num_envs) if mask is None else np.flatnonzero(mask)
+        self._last_obs = getattr(self, '_last_obs', np.zeros((self.num_envs, 4), dtype=np.float32))
+        self._last_obs[idx] = self._reset_envs(idx)
+        return self._last_obs.copy(), {}
+
+    def step(self, actions):
+        """Execute one step of all environments"""
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, -1)[:, 0]
+        actions = np.clip(actions, self.single_action_space.low[0], self.single_action_space.high[0])
+
+        # Update buffer index for pulsed mode
+        if self.pulsed:
+            self.buf_id += 1
+            self.buf_id[self.buf_id >= self.pul_len] = 0
+
+        # Piezo control (no microphonics in the steps)
+        dw_piezo = 2 * np.pi * actions * 1e4
+        vc, vr, dw = self._simulate(slice(None), dw_piezo)
+        obs = self._build_observation(vc, vr, dw)
+        rewards = self._calculate_reward(obs)
+        self.step_count += 1
+
+        terminations = np.zeros(self.num_envs, dtype=bool)
+        truncations = self.step_count >= self.max_steps
+        infos = {}
+
+        # Automatic reset of the finished environments
+        if self.autoreset_mode == 'next_step':
+            if self._autoreset.any():
+                idx = np.flatnonzero(self._autoreset)
+                obs[idx] = self._reset_envs(idx)
+                rewards[idx] = 0.0
+                truncations[idx] = False
+            self._autoreset = terminations | truncations
+        else:
+            done = terminations | truncations
+            if done.any():
+                idx = np.flatnonzero(done)
+                infos['final_obs'] = obs.copy()
+                infos['_final_obs'] = done
+                obs[idx] = self._reset_envs(idx)
+
+        self._last_obs = obs
+        return obs.copy(), rewards, terminations, truncations, infos
+
+    def close(self, **kwargs):
+        """Close the environments"""
+        self.closed = True
+
+
+def _make_sb3_vec_env():
+    """Define the Stable-Baselines3 adapter (imports stable_baselines3)"""
+    from stable_baselines3.common.vec_env import VecEnv
+
+    class RFCavitySB3VecEnv(VecEnv):
+        """
+        Stable-Baselines3 VecEnv of the vectorized RF cavity environment
+
+        Drop-in replacement of make_vec_env(RFCavityControlEnv, n_envs) for
+        SB3 algorithms (wrap with VecMonitor for the episode statistics).
+        """
+
+        def __init__(self,
+                     num_envs: int = 8,
+                     max_steps: int = 2048 * 16,
+                     config: Optional[Dict[str, Any]] = None):
+            self.venv = RFCavityControlVecEnv(num_envs, max_steps, config, autoreset_mode='same_step')
+            super().__init__(num_envs,
+                             self.venv.single_observation_space,
+                             self.venv.single_action_space)
+            self._actions = None
+
+        def reset(self):
+            seed = self._seeds[0] if getattr(self, '_seeds', None) else None
+            obs, _ = self.venv.reset(seed=seed)
+            if hasattr(self, '_reset_seeds'):
+                self._reset_seeds()
+            return obs
+
+        def step_async(self, actions):
+            self._actions = actions
+
+        def step_wait(self):
+            obs, rewards, terminations, truncations, infos = self.venv.step(self._actions)
+            dones = terminations | truncations
+            step_infos = [{} for _ in range(self.num_envs)]
+            for i in np.flatnonzero(dones):
+                step_infos[i]['terminal_observation'] = infos['final_obs'][i]
+                step_infos[i]['TimeLimit.truncated'] = bool(truncations[i] and not terminations[i])
+            return obs, rewards.astype(np.float32), dones, step_infos
+
+        def close(self):
+            self.venv.close()
+
+        def get_attr(self, attr_name, indices=None):
+            return [getattr(self.venv, attr_name)] * len(self._get_indices(indices))
+
+        def set_attr(self, attr_name, value, indices=None):
+            setattr(self.venv, attr_name, value)
+
+        def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+            # All environments share one vectorized object, the method is called once
+            result = getattr(self.venv, method_name)(*method_args, **method_kwargs)
+            return [result] * len(self._get_indices(indices))
+
+        def env_is_wrapped(self, wrapper_class, indices=None):
+            return [False] * len(self._get_indices(indices))
+
+    return RFCavitySB3VecEnv
+
+
+def __getattr__(name):
+    # The adapter is defined on first access, so that the module does not need
+    # stable_baselines3 and an import error of it is raised where it is used
+    global RFCavitySB3VecEnv
+    if name == 'RFCavitySB3VecEnv':
+        RFCavitySB3VecEnv = _make_sb3_vec_env()
+        return RFCavitySB3VecEnv
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import Canvas, Entry, Button, Label, OptionMenu, StringVar
 import pyvisa
 import time
+import numpy as np
+from llrflibs.rf_misc import decim_minmax
 
 # 连接示波器
 rm = pyvisa.ResourceManager()
@@ -108,12 +110,10 @@ def plot_waveform(data):
     width = 600
     scale_y = height / 10  # 假设电压范围-5V到5V
     scale_x = width / len(data)
-    points = []
-    for i, val in enumerate(data):
-        x = i * scale_x
-        y = height / 2 - val * scale_y / 5
-        points.append((x, y))
-    canvas.create_line(points, fill='blue')
+    # 按像素抽取最小/最大包络，向量化计算坐标
+    _, x, y = decim_minmax(np.asarray(data, dtype=float), n_pix=width)
+    points = np.column_stack((x * scale_x, height / 2 - y * scale_y / 5))
+    canvas.create_line(points.ravel().tolist(), fill='blue')
 
 # 周期性更新波形
 def update_waveform():
@@ -18,6 +18,7 @@ Modification Notes:
 """
 
 import nidaqmx
+import numpy as np
 
 import tkinter as tk
 from tkinter import ttk
@@ -27,6 +28,8 @@ matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
+from llrflibs.rf_misc import decim_minmax
+
 
 class voltageContinuousInput(tk.Frame):
 
@@ -85,7 +88,8 @@ class voltageContinuousInput(tk.Frame):
             vals = self.task.read(self.numberOfSamples)
             self.graphDataFrame.ax.cla()
             self.graphDataFrame.ax.set_title("Acquired Data")
-            self.graphDataFrame.ax.plot(vals)
+            _, x, y = decim_minmax(np.asarray(vals), n_pix=max(int(self.graphDataFrame.ax.get_window_extent().width), 100))
+            self.graphDataFrame.ax.plot(x, y)
             self.graphDataFrame.graph.draw()
 
         #check if the task should sleep or stop
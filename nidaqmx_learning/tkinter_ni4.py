@@ -18,6 +18,7 @@ Modification Notes:
 """
 
 import nidaqmx
+import numpy as np
 
 import tkinter as tk
 from tkinter import ttk
@@ -27,6 +28,8 @@ matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
+from llrflibs.rf_misc import decim_minmax
+
 
 class voltageContinuousInput(tk.Frame):
 
@@ -84,8 +87,10 @@ class voltageContinuousInput(tk.Frame):
             vals = self.task.read(number_of_samples_per_channel=self.numberOfSamples)
             self.graphDataFrame.ax.cla()
             self.graphDataFrame.ax.set_title("Acquired Data")
-            for i, channel_data in enumerate(vals):
-                self.graphDataFrame.ax.plot(channel_data, label=f'Channel {i}')
+            # plot the min/max envelope of all channels at once
+            _, x, y = decim_minmax(np.atleast_2d(vals), n_pix=max(int(self.graphDataFrame.ax.get_window_extent().width), 100))
+            for i, channel_data in enumerate(y):
+                self.graphDataFrame.ax.plot(x, channel_data, label=f'Channel {i}')
             self.graphDataFrame.ax.legend()
             self.graphDataFrame.graph.draw()
 
@@ -32,6 +32,8 @@ matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 import threading
+import numpy as np
+from llrflibs.rf_misc import decim_minmax
 
 class MainWindow(tk.Tk):
     def __init__(self):
@@ -157,8 +159,9 @@ class MainWindow(tk.Tk):
 
     def plot_data(self):
         self.ax.clear()
-        for i, channel_data in enumerate(self.acquired_data):
-            self.ax.plot(channel_data, label=f'Channel {i}')
+        _, x, y = decim_minmax(np.atleast_2d(self.acquired_data), n_pix=max(int(self.ax.get_window_extent().width), 100))
+        for i, channel_data in enumerate(y):
+            self.ax.plot(x, channel_data, label=f'Channel {i}')
         self.ax.set_xlabel("Sample")
         self.ax.set_ylabel("Voltage")
         self.ax.legend()
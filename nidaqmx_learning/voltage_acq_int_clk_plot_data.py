@@ -17,6 +17,7 @@ Modification History:
 - Modified Notes: 
 """
 
+import numpy as np
 import matplotlib.pyplot as plot
 
 import nidaqmx
@@ -24,6 +25,9 @@ from nidaqmx.constants import READ_ALL_AVAILABLE, AcquisitionType
 
 import matplotlib.animation as animation
 
+# plot the min/max envelope instead of all the 5,000,000 points
+from llrflibs.rf_misc import decim_minmax
+
 fig, ax = plot.subplots()
 line, = ax.plot([], [], lw=2)
 ax.set_xlim(0, 5000000)
@@ -41,9 +45,9 @@ def update(frame):
         task.ai_channels.add_ai_voltage_chan("cDAQ9189-1D712C2Mod1/ai0")
         task.timing.cfg_samp_clk_timing(500000.0, sample_mode=AcquisitionType.FINITE, samps_per_chan=5000000)
 
-        data = task.read(READ_ALL_AVAILABLE)
-        x = range(len(data))
-        line.set_data(x, data)
+        data = np.asarray(task.read(READ_ALL_AVAILABLE))
+        _, x, y = decim_minmax(data, n_pix=max(int(ax.get_window_extent().width), 100))
+        line.set_data(x, y)
     return line,
 
 ani = animation.FuncAnimation(fig, update, init_func=init, blit=True, interval=1000)